@@ -234,33 +234,34 @@ class SimpleFlowchartGenerator:
 
 # Simple code executor
 class SimpleCodeExecutor:
+    def __init__(self):
+        self.max_output_length = 10000
+    
     def execute_code(self, code):
         """Execute Python code safely"""
+        # Capture output in a buffer owned by this request instead of
+        # swapping the process-wide sys.stdout
+        stdout_capture = io.StringIO()
+        
+        def captured_print(*args, sep=' ', end='\n', file=None, flush=False):
+            if stdout_capture.tell() < self.max_output_length:
+                print(*args, sep=sep, end=end, file=file or stdout_capture)
+        
         try:
-            # Capture output
-            old_stdout = sys.stdout
-            stdout_capture = io.StringIO()
-            sys.stdout = stdout_capture
-            
             # Execute code
-            exec(code)
-            
-            # Get output
-            output = stdout_capture.getvalue()
-            sys.stdout = old_stdout
+            exec(code, {'print': captured_print})
             
             return {
                 'success': True,
-                'output': output,
+                'output': stdout_capture.getvalue()[:self.max_output_length],
                 'error': None,
                 'execution_time': 0.1
             }
             
         except Exception as e:
-            sys.stdout = old_stdout
             return {
                 'success': False,
-                'output': '',
+                'output': stdout_capture.getvalue()[:self.max_output_length],
                 'error': str(e),
                 'execution_time': 0.0
             }
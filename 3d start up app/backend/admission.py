@@ -0,0 +1,151 @@
+# Admission Module - Turn away requests too big to serve before doing any heavy work
+import os
+import threading
+from typing import Dict, List, Any, Optional
+
+from ast_pipeline import measure, parse
+
+# A program has at most about two AST nodes per character of source (``-x``
+# is a UnaryOp, a USub, a Name and a Load), so a source this many times
+# shorter than the node budget is admitted without parsing it
+NODES_PER_CHARACTER = 3
+
+# Analysis time per AST node, and recovery time per line of code with syntax
+# errors, assumed until analyses on this host have been timed
+DEFAULT_SECONDS_PER_NODE = 20e-6
+DEFAULT_SECONDS_PER_RECOVERY_LINE = 0.5e-3
+
+# Weight of each new timing in the running per-node and per-line estimates
+RATE_SMOOTHING = 0.2
+
+
+def _reason(limit: str, value: Any, maximum: Any, message: str) -> Dict[str, Any]:
+    return {'limit': limit, 'value': value, 'max': maximum, 'message': message}
+
+
+class Admission:
+    """The result of checking one program: why it is rejected, if it is, and what was learned on the way"""
+
+    def __init__(self, reasons: List[Dict[str, Any]], tree=None, unit: Optional[str] = None, units: int = 0):
+        self.reasons = reasons  # empty when the program is admitted
+        self.tree = tree  # the parsed program, if the checks parsed it
+        self.unit = unit  # 'node' or 'recovery_line': what the cost estimate counted
+        self.units = units
+
+    @property
+    def admitted(self) -> bool:
+        return not self.reasons
+
+
+class AdmissionControl:
+    """Limits every /api/ request is checked against before it is served.
+
+    The checks run cheapest first and stop at the first that fails: body
+    bytes from the Content-Length header, before the JSON is decoded;
+    source lines; AST nodes, counted only for sources long enough to have
+    too many; and, for analysis requests, the estimated analysis time.
+    That estimate is nodes times seconds per node for code that parses,
+    and lines times seconds per line of syntax-error recovery for code
+    that does not; both rates start from defaults and follow the timings
+    passed to ``record``.
+    """
+
+    def __init__(self, max_body_bytes: Optional[int] = None, max_lines: Optional[int] = None,
+                 max_nodes: Optional[int] = None, max_analysis_seconds: Optional[float] = None):
+        if max_body_bytes is None:
+            max_body_bytes = int(os.environ.get('ADMISSION_MAX_BODY_KB', 512)) * 1024
+        if max_lines is None:
+            max_lines = int(os.environ.get('ADMISSION_MAX_LINES', 10000))
+        if max_nodes is None:
+            max_nodes = int(os.environ.get('ADMISSION_MAX_NODES', 200000))
+        if max_analysis_seconds is None:
+            max_analysis_seconds = float(os.environ.get('ADMISSION_MAX_ANALYSIS_SECONDS', 10))
+        self.max_body_bytes = max_body_bytes
+        self.max_lines = max_lines
+        self.max_nodes = max_nodes
+        self.max_analysis_seconds = max_analysis_seconds
+        self.seconds_per = {'node': DEFAULT_SECONDS_PER_NODE, 'recovery_line': DEFAULT_SECONDS_PER_RECOVERY_LINE}
+        self._lock = threading.Lock()
+        self.rejected: Dict[str, int] = {}
+
+    def check_body(self, content_length: Optional[int]) -> List[Dict[str, Any]]:
+        """Reasons to reject a request body of ``content_length`` bytes unread (empty if none)"""
+        if content_length is None or content_length <= self.max_body_bytes:
+            return []
+        return self._rejected([_reason(
+            'body_bytes', content_length, self.max_body_bytes,
+            f'Request body is {content_length} bytes; at most {self.max_body_bytes} are accepted'
+        )])
+
+    def body_too_large(self) -> List[Dict[str, Any]]:
+        """Reasons for a body found too large while reading it (sent without a Content-Length)"""
+        return self._rejected([_reason(
+            'body_bytes', None, self.max_body_bytes,
+            f'Request body is over {self.max_body_bytes} bytes'
+        )])
+
+    def check_code(self, code: str, analysis: bool = False) -> Admission:
+        """Check a program against the line and node limits, and the cost limit if ``analysis``"""
+        lines = code.count('\n') + 1
+        if lines > self.max_lines:
+            return Admission(self._rejected([_reason(
+                'lines', lines, self.max_lines,
+                f'Code has {lines} lines; at most {self.max_lines} are accepted'
+            )]))
+
+        node_bound = len(code) * NODES_PER_CHARACTER + 1
+        if node_bound <= self.max_nodes and not (analysis and max(
+                node_bound * self.seconds_per['node'],
+                lines * self.seconds_per['recovery_line']) > self.max_analysis_seconds):
+            return Admission([])
+
+        try:
+            tree = parse(code)
+        except SyntaxError:
+            tree = None
+        if tree is not None:
+            nodes = measure(tree, max_nodes=self.max_nodes + 1, max_depth=None).nodes
+            if nodes > self.max_nodes:
+                return Admission(self._rejected([_reason(
+                    'nodes', nodes, self.max_nodes,
+                    f'Code has more than {self.max_nodes} syntax nodes'
+                )]))
+            check = Admission([], tree, 'node', nodes)
+        else:
+            check = Admission([], None, 'recovery_line', lines)
+
+        if analysis:
+            estimate = check.units * self.seconds_per[check.unit]
+            if estimate > self.max_analysis_seconds:
+                check.reasons = self._rejected([_reason(
+                    'analysis_seconds', round(estimate, 2), self.max_analysis_seconds,
+                    f'Analyzing this code would take about {estimate:.1f}s; '
+                    f'at most {self.max_analysis_seconds:.1f}s is allowed'
+                )])
+        return check
+
+    def record(self, check: Admission, seconds: float):
+        """Fold the time an admitted analysis took into the per-node or per-line estimate"""
+        if not check.units:
+            return
+        with self._lock:
+            rate = self.seconds_per[check.unit]
+            self.seconds_per[check.unit] = rate + RATE_SMOOTHING * (seconds / check.units - rate)
+
+    def _rejected(self, reasons: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            for reason in reasons:
+                self.rejected[reason['limit']] = self.rejected.get(reason['limit'], 0) + 1
+        return reasons
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_body_bytes': self.max_body_bytes,
+                'max_lines': self.max_lines,
+                'max_nodes': self.max_nodes,
+                'max_analysis_seconds': self.max_analysis_seconds,
+                'seconds_per_node': self.seconds_per['node'],
+                'seconds_per_recovery_line': self.seconds_per['recovery_line'],
+                'rejected': dict(self.rejected)
+            }
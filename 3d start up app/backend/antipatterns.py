@@ -0,0 +1,388 @@
+# Antipatterns Module - Correct but slow code: linear work repeated inside loops
+import ast
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from ast_pipeline import safe_unparse
+
+# Methods that change the object they are called on
+MUTATING_METHODS = {
+    'append', 'extend', 'insert', 'pop', 'remove', 'clear', 'sort', 'reverse',
+    'add', 'discard', 'update', 'popitem', 'setdefault', 'appendleft', 'popleft'
+}
+
+
+def _issue(kind: str, node: ast.AST, message: str, suggestion: str, severity: str = 'warning') -> Dict[str, Any]:
+    return {
+        'type': kind,
+        'line': node.lineno,
+        'column': node.col_offset,
+        'message': message,
+        'severity': severity,
+        'suggestion': suggestion
+    }
+
+
+def _value_kind(node: Optional[ast.AST]) -> Optional[str]:
+    """Best guess at the type of an assigned value: list, str, set, dict, deque or None"""
+    if isinstance(node, (ast.List, ast.ListComp)):
+        return 'list'
+    if isinstance(node, (ast.Set, ast.SetComp)):
+        return 'set'
+    if isinstance(node, (ast.Dict, ast.DictComp)):
+        return 'dict'
+    if isinstance(node, ast.JoinedStr) or (isinstance(node, ast.Constant) and isinstance(node.value, str)):
+        return 'str'
+    if isinstance(node, ast.Call):
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if name in ('list', 'sorted', 'split', 'readlines'):
+            return 'list'
+        if name in ('set', 'frozenset'):
+            return 'set'
+        if name == 'dict':
+            return 'dict'
+        if name in ('str', 'join', 'format', 'strip', 'lower', 'upper', 'replace'):
+            return 'str'
+        if name == 'deque':
+            return 'deque'
+    return None
+
+
+class AntipatternSummary:
+    """What one module (or one top-level segment of it) found, and what it leaves for later code.
+
+    Variable types are guessed from assignments, so a finding can hinge on
+    what code before the segment assigned. ``issues`` are the findings the
+    segment decides alone; ``pending`` those that hold only if a name has
+    a given kind (or is an imported module) where the segment starts, as
+    ``(issue, name, kind)``. ``kinds`` holds the kinds of the module-level
+    names the segment assigns, as it leaves them (None where unknown), and
+    ``modules`` the names it imports.
+    """
+
+    def __init__(self):
+        self.issues: List[Dict[str, Any]] = []
+        self.pending: List[Tuple[Dict[str, Any], str, str]] = []
+        self.kinds: Dict[str, Optional[str]] = {}
+        self.modules = set()
+
+
+class _Loop:
+    """A loop being visited and what its body has done so far"""
+
+    def __init__(self, iterables: List[str]):
+        self.iterables = iterables  # ast.dump of what the loop iterates over
+        self.len_calls: Dict[str, ast.AST] = {}  # name -> first len(name) node
+        self.changed = set()  # names assigned or mutated in the body
+        self.lookups = set()  # dotted call targets already reported
+
+
+class _AntipatternFinder(ast.NodeVisitor):
+    """One pass over a module, tracking enclosing loops and rough variable types"""
+
+    def __init__(self):
+        self.summary = AntipatternSummary()
+        self.issues = self.summary.issues
+        self.loops: List[_Loop] = []
+        self.kinds: List[Dict[str, str]] = [{}]  # per function scope: name -> value kind
+        self.locals: List[set] = [set()]  # per function scope: parameters and assigned names
+        self.modules = self.summary.modules  # names bound by import statements
+        self.assigned = set()  # module-level names assigned so far
+
+    def _kind(self, name: str) -> Optional[str]:
+        return self.kinds[-1].get(name)
+
+    def _inherited(self, name: str) -> bool:
+        """Whether a name's kind here is whatever code before this module part left it"""
+        return len(self.kinds) == 1 and name not in self.assigned
+
+    def _report(self, issue: Dict[str, Any], name: str, kind: str):
+        """Report an issue that holds if ``name`` has ``kind``: now, later, or not at all"""
+        if self._kind(name) == kind:
+            self.issues.append(issue)
+        elif self._inherited(name):
+            self.summary.pending.append((issue, name, kind))
+
+    def _changed(self, name: str):
+        for loop in self.loops:
+            loop.changed.add(name)
+
+    def _assigned(self, target: ast.AST, value: Optional[ast.AST]):
+        if isinstance(target, (ast.Subscript, ast.Attribute)):
+            # Changes the object, not what the name refers to
+            if isinstance(target.value, ast.Name):
+                self._changed(target.value.id)
+            return
+        if isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self._assigned(element, None)
+            return
+        if isinstance(target, ast.Starred):
+            self._assigned(target.value, None)
+            return
+        if not isinstance(target, ast.Name):
+            return
+        kind = _value_kind(value)
+        if kind:
+            self.kinds[-1][target.id] = kind
+        else:
+            self.kinds[-1].pop(target.id, None)
+        if len(self.kinds) == 1:
+            self.assigned.add(target.id)
+        else:
+            self.locals[-1].add(target.id)
+        self._changed(target.id)
+
+    # Scopes: a function body is not part of the loop it is defined in
+
+    def visit_FunctionDef(self, node):
+        for expression in node.decorator_list + node.args.defaults:
+            self.visit(expression)
+        loops, self.loops = self.loops, []
+        self.kinds.append({})
+        args = node.args
+        params = args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]
+        self.locals.append({arg.arg for arg in params if arg is not None})
+        for statement in node.body:
+            self.visit(statement)
+        self.locals.pop()
+        self.kinds.pop()
+        self.loops = loops
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        loops, self.loops = self.loops, []
+        self.visit(node.body)
+        self.loops = loops
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.modules.add(alias.asname or alias.name.split('.')[0])
+
+    # Loops
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        iterable = ast.dump(node.iter)
+        if any(iterable in loop.iterables for loop in self.loops):
+            self.issues.append(_issue(
+                'nested_loop_same_sequence', node,
+                f'Nested loop over {safe_unparse(node.iter)} again: the work grows with the square of its length',
+                'If the inner loop searches for a match, build a set or dict once before the outer loop; '
+                'for pairs, use itertools.combinations'
+            ))
+
+        self._enter([iterable])
+        self._assigned(node.target, None)
+        for statement in node.body:
+            self.visit(statement)
+        self._exit()
+        for statement in node.orelse:
+            self.visit(statement)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        self._enter([])
+        self.visit(node.test)
+        for statement in node.body:
+            self.visit(statement)
+        self._exit()
+        for statement in node.orelse:
+            self.visit(statement)
+
+    def _comprehension(self, node, *elements):
+        generators = node.generators
+        self.visit(generators[0].iter)
+        self._enter([])
+        for i, generator in enumerate(generators):
+            iterable = ast.dump(generator.iter)
+            if i:
+                self.visit(generator.iter)
+                if iterable in self.loops[-1].iterables:
+                    self.issues.append(_issue(
+                        'nested_loop_same_sequence', generator.iter,
+                        f'Comprehension loops over {safe_unparse(generator.iter)} twice: '
+                        f'the work grows with the square of its length',
+                        'For pairs, use itertools.combinations; to find matches, use a set or dict'
+                    ))
+            self.loops[-1].iterables.append(iterable)
+            self._assigned(generator.target, None)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for element in elements:
+            self.visit(element)
+        self._exit()
+
+    def visit_ListComp(self, node):
+        self._comprehension(node, node.elt)
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._comprehension(node, node.key, node.value)
+
+    def _enter(self, iterables: List[str]):
+        self.loops.append(_Loop(iterables))
+
+    def _exit(self):
+        loop = self.loops.pop()
+        for name, node in loop.len_calls.items():
+            if name not in loop.changed:
+                self.issues.append(_issue(
+                    'repeated_len_in_loop', node,
+                    f'len({name}) is recomputed on every iteration although {name} does not change in the loop',
+                    f'Compute it once before the loop (n = len({name})) and use n',
+                    severity='info'
+                ))
+
+    # Assignments
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+            self._assigned(target, node.value)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.visit(node.value)
+            self._assigned(node.target, node.value)
+
+    def visit_AugAssign(self, node):
+        self.visit(node.value)
+        target = node.target
+        if self.loops and isinstance(target, ast.Name) and isinstance(node.op, ast.Add):
+            issue = _issue(
+                'string_concat_in_loop', node,
+                f'{target.id} += ... in a loop copies the whole string every time',
+                f'Append the pieces to a list and build the string once after the loop: "".join(parts)'
+            )
+            if _value_kind(node.value) == 'str':
+                self.issues.append(issue)
+            else:
+                self._report(issue, target.id, 'str')
+        self.visit(target)
+        if isinstance(target, ast.Name):
+            if self._inherited(target.id):
+                # += keeps the type, whatever earlier code made it
+                self._changed(target.id)
+                return
+            kind = self._kind(target.id)
+            self._assigned(target, None)
+            if kind:
+                self.kinds[-1][target.id] = kind  # += keeps the type
+
+    # Work inside loops
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if not self.loops:
+            return
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)) and isinstance(right, ast.Name):
+                self._report(_issue(
+                    'membership_test_in_loop', node,
+                    f"'in {right.id}' inside a loop scans the whole list every time",
+                    f'Build a set once before the loop ({right.id}_set = set({right.id})) and test against that'
+                ), right.id, 'list')
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if not self.loops:
+            return
+        func = node.func
+
+        if isinstance(func, ast.Name) and func.id == 'len' and len(node.args) == 1 \
+                and isinstance(node.args[0], ast.Name):
+            self.loops[-1].len_calls.setdefault(node.args[0].id, node)
+            return
+        if not isinstance(func, ast.Attribute):
+            return
+
+        receiver = func.value.id if isinstance(func.value, ast.Name) else None
+        if receiver and func.attr in MUTATING_METHODS:
+            self._changed(receiver)
+
+        # Only lists shift their elements; dict.pop(0) and deque.pop(0) are fine
+        front = (node.args and isinstance(node.args[0], ast.Constant) and node.args[0].value == 0)
+        if front and receiver:
+            if func.attr == 'insert' and len(node.args) == 2:
+                self._report(_issue(
+                    'list_insert_front', node,
+                    f'{receiver}.insert(0, ...) in a loop shifts every element each time',
+                    'Use collections.deque and appendleft(), or append() and reverse once after the loop'
+                ), receiver, 'list')
+            elif func.attr == 'pop' and len(node.args) == 1:
+                self._report(_issue(
+                    'list_pop_front', node,
+                    f'{receiver}.pop(0) in a loop shifts every element each time',
+                    'Use collections.deque and popleft(), or iterate over the list instead'
+                ), receiver, 'list')
+
+        # Module attributes (math.sqrt, os.path.join) looked up on every iteration of an
+        # innermost loop; methods of objects (self.items.append) are left alone
+        root = func.value
+        while isinstance(root, ast.Attribute):
+            root = root.value
+        if not isinstance(root, ast.Name) or root.id in self.locals[-1]:
+            return
+        if root.id in self.modules:
+            module = None
+        elif len(self.kinds) > 1 or self._inherited(root.id):
+            module = root.id  # Perhaps imported by earlier code
+        else:
+            return
+        loop = self.loops[-1]
+        name = safe_unparse(func)
+        if name in loop.lookups:
+            return
+        loop.lookups.add(name)
+        local = func.attr
+        issue = _issue(
+            'repeated_attribute_lookup', node,
+            f'{name} is looked up again on every iteration',
+            f'Bind it to a local name before the loop ({local} = {name}) and call {local}(...)',
+            severity='info'
+        )
+        if module:
+            self.summary.pending.append((issue, module, 'module'))
+        else:
+            self.issues.append(issue)
+
+
+def collect_antipatterns(tree: ast.Module) -> AntipatternSummary:
+    """Find the antipatterns in a parsed module (or segment) in one pass"""
+    finder = _AntipatternFinder()
+    for statement in tree.body:
+        finder.visit(statement)
+    finder.summary.kinds = {name: finder.kinds[0].get(name) for name in finder.assigned}
+    return finder.summary
+
+
+def resolve_antipatterns(summaries: Iterable[Tuple[AntipatternSummary, int]]) -> List[Dict[str, Any]]:
+    """Turn the summaries of a module's parts, in source order, into issues.
+
+    Each summary comes with the line offset of its part. A pending finding
+    holds if the name has the kind it needs once the parts before it have
+    run, as far as their assignments and imports tell.
+    """
+    kinds: Dict[str, Optional[str]] = {}
+    modules = set()
+    issues = []
+    for summary, offset in summaries:
+        found = list(summary.issues)
+        for issue, name, kind in summary.pending:
+            if (name in modules) if kind == 'module' else kinds.get(name) == kind:
+                found.append(issue)
+        issues.extend(dict(issue, line=issue['line'] + offset) for issue in found)
+        kinds.update(summary.kinds)
+        modules |= summary.modules
+    issues.sort(key=lambda issue: issue['line'])
+    return issues
+
+
+def find_antipatterns(tree: ast.Module) -> List[Dict[str, Any]]:
+    """Return performance findings for a parsed module, each with a suggestion"""
+    return resolve_antipatterns([(collect_antipatterns(tree), 0)])
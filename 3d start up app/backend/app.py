@@ -1,5 +1,5 @@
 # Flask Backend for Interactive Python Learning Web App
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
 import json
 import sys
@@ -8,6 +8,8 @@ import traceback
 import subprocess
 import tempfile
 import os
+import uuid
+import time
 from datetime import datetime
 
 app = Flask(__name__, template_folder='../frontend/templates', static_folder='../frontend/static')
@@ -19,19 +21,84 @@ try:
     from flowchart_generator import FlowchartGenerator
     from code_executor import CodeExecutor
     from chatbot import Chatbot
+    from grader import Grader
+    from complexity import ComplexityEstimator
+    from job_queue import JobQueue, QueueFull
+    from kernels import KernelManager, KernelLimitReached
+    from incremental import IncrementalAnalyzer, VersionMismatch, DocumentRejected
+    from response_cache import ResponseCache
+    from recovery import recover
+    from ast_pipeline import parse
+    from admission import AdmissionControl
+    from sandbox_pool import HEARTBEAT_INTERVAL
 
     # Initialize components
     flowchart_gen = FlowchartGenerator()
     code_exec = CodeExecutor()
     chatbot = Chatbot()
+    grader = Grader(code_exec)
+    complexity = ComplexityEstimator(code_exec)
+    job_queue = JobQueue(code_exec)
+    kernels = KernelManager(code_exec)
+    incremental = IncrementalAnalyzer(code_exec)
+    response_cache = ResponseCache(rules=[rule.name for rule in code_exec.rules.rules])
+    admission = AdmissionControl()
+    # Bodies sent without a Content-Length are cut off one byte past the limit while they are read
+    app.config['MAX_CONTENT_LENGTH'] = admission.max_body_bytes + 1
     modules_loaded = True
 except ImportError as e:
     print(f"Warning: Could not import custom modules: {e}")
     flowchart_gen = None
     code_exec = None
     chatbot = None
+    grader = None
+    complexity = None
+    job_queue = None
+    kernels = None
+    incremental = None
+    response_cache = None
+    admission = None
     modules_loaded = False
 
+def _rejected(reasons: list):
+    """413 response listing every admission limit the request is over"""
+    return jsonify({
+        'success': False,
+        'error': reasons[0]['message'],
+        'reasons': reasons,
+        'message': 'Request is over the server limits'
+    }), 413
+
+@app.before_request
+def admit_request():
+    """Turn away oversized /api/ bodies by their Content-Length, before anything decodes them,
+    and bodies that are not a JSON object, which every /api/ route expects"""
+    if admission is None or not request.path.startswith('/api/'):
+        return None
+    reasons = admission.check_body(request.content_length)
+    if reasons:
+        return _rejected(reasons)
+    if request.method != 'POST':
+        return None
+    # Read the body (the routes reuse it); sent chunked, it may have reached the cut-off
+    body = request.get_data(cache=True)
+    if request.content_length is None and len(body) > admission.max_body_bytes:
+        return _rejected(admission.body_too_large())
+    if body and not isinstance(request.get_json(silent=True), dict):
+        return jsonify({'success': False, 'error': 'Request body must be a JSON object'}), 400
+    return None
+
+def _invalid_code(code):
+    """400 response for a ``code`` field that is not a string, or None if it is one"""
+    if isinstance(code, str):
+        return None
+    return jsonify({'success': False, 'error': 'code must be a string'}), 400
+
+@app.errorhandler(413)
+def body_too_large(error):
+    """Werkzeug versions that refuse an oversized body while reading it, instead of cutting it off"""
+    return _rejected(admission.body_too_large())
+
 @app.route('/')
 def home():
     """Render the home page"""
@@ -64,12 +131,14 @@ def generate_flowchart():
         if not problem:
             return jsonify({'error': 'No problem description provided'}), 400
 
-        flowchart_data = flowchart_gen.generate_from_problem(problem)
-        return jsonify({
-            'success': True,
-            'flowchart': flowchart_data,
-            'message': 'Flowchart generated successfully'
-        })
+        def generate():
+            return {
+                'success': True,
+                'flowchart': flowchart_gen.generate_from_problem(problem),
+                'message': 'Flowchart generated successfully'
+            }
+
+        return _cached_json('generate_flowchart', {'problem': problem}, generate)
 
     except Exception as e:
         return jsonify({
@@ -92,22 +161,92 @@ def analyze_code():
         data = request.get_json()
         code = data.get('code', '')
 
+        invalid = _invalid_code(code)
+        if invalid:
+            return invalid
         if not code:
             return jsonify({'error': 'No code provided'}), 400
 
-        # Generate flowchart from code
-        flowchart_data = flowchart_gen.generate_from_code(code)
+        check = admission.check_code(code, analysis=True)
+        if not check.admitted:
+            return _rejected(check.reasons)
+
+        def analyze():
+            start = time.perf_counter()
+            # Parse once (admission may have already); the flowchart and the rules share one walk,
+            # cached by program structure
+            tree = check.tree
+            if tree is None:
+                try:
+                    tree = parse(code)
+                except SyntaxError:
+                    tree = None
 
-        # Analyze for errors
-        errors = code_exec.analyze_code(code)
+            if tree is not None:
+                flowchart_data, errors = code_exec.analyze_with_flowchart(code, tree)
+            else:
+                # Every syntax error, and a flowchart of the statements that do parse
+                recovery = recover(code)
+                flowchart_data = flowchart_gen.generate_from_code(code, recovery=recovery)
+                errors = code_exec.analyze_code(code, recovery=recovery)
 
+            admission.record(check, time.perf_counter() - start)
+            return {
+                'success': True,
+                'flowchart': flowchart_data,
+                'errors': errors,
+                'message': 'Code analyzed successfully'
+            }
+
+        return _cached_json('analyze_code', {'code': code}, analyze)
+
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'flowchart': flowchart_data,
-            'errors': errors,
-            'message': 'Code analyzed successfully'
-        })
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to analyze code'
+        }), 500
 
+@app.route('/api/analyze_code/incremental', methods=['POST'])
+def analyze_code_incremental():
+    """Re-analyze only the statements changed since the client's last version"""
+    if not modules_loaded or not incremental:
+        return jsonify({
+            'success': False,
+            'error': 'Code analyzer not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    try:
+        data = request.get_json() or {}
+        version = data.get('version')
+        code = data.get('code')
+        edits = data.get('edits')
+
+        if not isinstance(version, int):
+            return jsonify({'error': 'version must be an integer'}), 400
+        if code is not None and not isinstance(code, str):
+            return _invalid_code(code)
+        if code is None and not isinstance(edits, list):
+            return jsonify({'error': 'Send either code or a list of edits'}), 400
+
+        # Checked with the edits applied, so a document cannot grow past the limits one edit at a time
+        delta = incremental.analyze(_client_id(), version, code=code, edits=edits,
+                                    base_version=data.get('base_version'),
+                                    admit=lambda text: admission.check_code(text, analysis=True).reasons)
+        return jsonify({'success': True, **delta})
+
+    except DocumentRejected as e:
+        return _rejected(e.reasons)
+    except VersionMismatch as e:
+        return jsonify({
+            'success': False,
+            'resync': True,
+            'error': str(e),
+            'message': 'Send the full code'
+        }), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -115,6 +254,19 @@ def analyze_code():
             'message': 'Failed to analyze code'
         }), 500
 
+@app.route('/api/analyze_code/rules')
+def analysis_rules():
+    """List the analysis rules with the time spent in each so far"""
+    if not modules_loaded or not code_exec:
+        return jsonify({
+            'success': False,
+            'error': 'Code analyzer not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    return jsonify({'success': True, **code_exec.rules.stats(), 'response_cache': response_cache.stats(),
+                    'admission': admission.stats()})
+
 @app.route('/api/execute_code', methods=['POST'])
 def execute_code():
     """Execute Python code safely"""
@@ -122,10 +274,19 @@ def execute_code():
         data = request.get_json()
         code = data.get('code', '')
         
+        invalid = _invalid_code(code)
+        if invalid:
+            return invalid
         if not code:
             return jsonify({'error': 'No code provided'}), 400
         
-        result = code_exec.execute_code(code)
+        check = admission.check_code(code)
+        if not check.admitted:
+            return _rejected(check.reasons)
+        
+        result = code_exec.execute_code(code, profile=bool(data.get('profile')),
+                                        coverage=bool(data.get('coverage')) or None,
+                                        trace_memory=bool(data.get('trace_memory')))
         return jsonify({
             'success': True,
             'result': result,
@@ -139,6 +300,306 @@ def execute_code():
             'message': 'Failed to execute code'
         }), 500
 
+def _sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/execute_code/stream', methods=['POST'])
+def execute_code_stream():
+    """Execute Python code, streaming output as Server-Sent Events"""
+    if not modules_loaded or not code_exec:
+        return jsonify({
+            'success': False,
+            'error': 'Code executor not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    data = request.get_json()
+    code = data.get('code', '') if data else ''
+
+    invalid = _invalid_code(code)
+    if invalid:
+        return invalid
+    if not code:
+        return jsonify({'error': 'No code provided'}), 400
+
+    check = admission.check_code(code)
+    if not check.admitted:
+        return _rejected(check.reasons)
+
+    def generate():
+        # Closing this generator (client went away) kills the running program
+        events = code_exec.execute_code_stream(code)
+        try:
+            for kind, payload in events:
+                if kind == 'stdout':
+                    yield _sse_event('stdout', {'text': payload})
+                elif kind == 'heartbeat':
+                    # Comment line: keeps proxies open and detects dropped clients
+                    yield ': keep-alive\n\n'
+                elif kind == 'result':
+                    yield _sse_event('done', {
+                        'result': payload,
+                        'execution_time': payload.get('execution_time', 0)
+                    })
+        finally:
+            events.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _cached_json(endpoint: str, payload: dict, compute) -> Response:
+    """Answer a deterministic request from the response cache, with an ETag.
+
+    A client that sends the tag back in If-None-Match gets 304 without the
+    work being redone. ``compute`` returns the response dict on a miss;
+    only successful responses are cached and tagged.
+    """
+    etag = response_cache.etag(endpoint, payload)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    body = response_cache.get(etag)
+    cached = body is not None
+    if not cached:
+        data = compute()
+        body = app.json.dumps(data)
+        if not data.get('success'):
+            return Response(body, mimetype='application/json')
+        response_cache.put(etag, body)
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+    return response
+
+def _client_id() -> str:
+    """Identify the browser session a job belongs to, for fair scheduling"""
+    if 'client_id' not in session:
+        session['client_id'] = uuid.uuid4().hex
+    return session['client_id']
+
+def _job_payload(job) -> dict:
+    payload = job.to_dict()
+    payload['position'] = job_queue.position(job)
+    return payload
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue code for execution and return a job id right away"""
+    if not modules_loaded or not job_queue:
+        return jsonify({
+            'success': False,
+            'error': 'Job queue not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    data = request.get_json()
+    code = data.get('code', '') if data else ''
+
+    invalid = _invalid_code(code)
+    if invalid:
+        return invalid
+    if not code:
+        return jsonify({'error': 'No code provided'}), 400
+
+    check = admission.check_code(code)
+    if not check.admitted:
+        return _rejected(check.reasons)
+
+    try:
+        job = job_queue.submit(code, _client_id())
+    except QueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Job queue is full'
+        }), 429
+
+    return jsonify({
+        'success': True,
+        'job': _job_payload(job),
+        'message': 'Job queued'
+    }), 202
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Poll a job for its status and result"""
+    job = job_queue.get(job_id) if job_queue else None
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+
+    return jsonify({
+        'success': True,
+        'job': _job_payload(job)
+    })
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Subscribe to a job's output and result as Server-Sent Events"""
+    job = job_queue.get(job_id) if job_queue else None
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+
+    def generate():
+        # Disconnecting only ends the subscription; the job keeps running
+        for kind, payload in job_queue.events(job, heartbeat=HEARTBEAT_INTERVAL):
+            if kind == 'stdout':
+                yield _sse_event('stdout', {'text': payload})
+            elif kind == 'heartbeat':
+                yield ': keep-alive\n\n'
+            elif kind == 'result':
+                yield _sse_event('done', {
+                    'result': payload,
+                    'execution_time': payload.get('execution_time', 0)
+                })
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/kernel/execute', methods=['POST'])
+def execute_cell():
+    """Run a cell in the session's kernel, keeping globals from earlier cells"""
+    if not modules_loaded or not kernels:
+        return jsonify({
+            'success': False,
+            'error': 'Kernels not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    data = request.get_json()
+    code = data.get('code', '') if data else ''
+
+    invalid = _invalid_code(code)
+    if invalid:
+        return invalid
+    if not code:
+        return jsonify({'error': 'No code provided'}), 400
+
+    check = admission.check_code(code)
+    if not check.admitted:
+        return _rejected(check.reasons)
+
+    try:
+        result = kernels.execute(_client_id(), code)
+    except KernelLimitReached as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'No kernel available'
+        }), 429
+
+    return jsonify({
+        'success': True,
+        'result': result,
+        'message': 'Cell executed successfully'
+    })
+
+@app.route('/api/kernel/reset', methods=['POST'])
+def reset_kernel():
+    """Discard the session's kernel and everything defined in it"""
+    if not modules_loaded or not kernels:
+        return jsonify({
+            'success': False,
+            'error': 'Kernels not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    existed = kernels.reset(_client_id())
+    return jsonify({
+        'success': True,
+        'message': 'Kernel reset' if existed else 'No kernel to reset'
+    })
+
+@app.route('/api/grade', methods=['POST'])
+def grade_code():
+    """Run one submission against a list of test cases"""
+    if not modules_loaded or not grader:
+        return jsonify({
+            'success': False,
+            'error': 'Grader not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    try:
+        data = request.get_json()
+        code = data.get('code', '')
+        test_cases = data.get('test_cases')
+
+        invalid = _invalid_code(code)
+        if invalid:
+            return invalid
+        if not code:
+            return jsonify({'error': 'No code provided'}), 400
+
+        check = admission.check_code(code)
+        if not check.admitted:
+            return _rejected(check.reasons)
+
+        problem = grader.validate(test_cases)
+        if problem:
+            return jsonify({'error': problem}), 400
+
+        report = grader.grade(code, test_cases)
+        return jsonify({
+            'success': True,
+            'grade': report,
+            'message': f"{report['passed']}/{report['total']} test cases passed"
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to grade code'
+        }), 500
+
+@app.route('/api/complexity', methods=['POST'])
+def estimate_complexity():
+    """Time a function at growing input sizes and fit its complexity class"""
+    if not modules_loaded or not complexity:
+        return jsonify({
+            'success': False,
+            'error': 'Complexity estimator not available',
+            'message': 'Backend modules not loaded properly'
+        }), 500
+
+    try:
+        data = request.get_json()
+        code = data.get('code', '')
+
+        invalid = _invalid_code(code)
+        if invalid:
+            return invalid
+        if not code:
+            return jsonify({'error': 'No code provided'}), 400
+
+        check = admission.check_code(code)
+        if not check.admitted:
+            return _rejected(check.reasons)
+
+        problem = complexity.validate(data)
+        if problem:
+            return jsonify({'error': problem}), 400
+
+        result = complexity.estimate(code, data)
+        if result['success']:
+            result['message'] = f"{result['function']} looks {result['best_fit']}"
+        return jsonify(result)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to estimate complexity'
+        }), 500
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chatbot interactions"""
@@ -0,0 +1,142 @@
+# AST Pipeline Module - Parse once, walk once, feed every consumer
+import ast
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+# Most nodes one walk visits and most levels it descends; past either the
+# walk stops and its consumers get a partial result. The depth limit keeps
+# recursive code run on the tree (ast.unparse, the scope and antipattern
+# visitors) well inside Python's recursion limit.
+MAX_NODES = 500000
+MAX_DEPTH = 150
+
+# Largest expression safe_unparse turns back into source, and the longest text it returns
+MAX_UNPARSE_NODES = 2000
+MAX_UNPARSE_LENGTH = 200
+
+
+class TooComplex(SyntaxError):
+    """Code nested too deeply for Python to build or compile its AST.
+
+    Python reports some of these as a SyntaxError itself (too many nested
+    parentheses); the rest hit the recursion limit or overflow the
+    parser's stack. Subclassing SyntaxError lets every caller handle them
+    as the syntax errors they effectively are.
+    """
+
+
+def parse(code: str, filename: str = '<unknown>') -> ast.Module:
+    """ast.parse, raising TooComplex instead of RecursionError or MemoryError"""
+    try:
+        return ast.parse(code, filename=filename)
+    except (RecursionError, MemoryError):
+        raise TooComplex('code is nested too deeply to parse') from None
+
+
+class TreeSize:
+    """How much of a tree a walk covered, and why it stopped short"""
+
+    def __init__(self):
+        self.nodes = 0
+        self.depth = 0
+        self.truncated: Optional[str] = None  # 'nodes' or 'depth' if budgets ran out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'nodes': self.nodes, 'depth': self.depth, 'truncated': self.truncated}
+
+
+def _levels(tree: ast.AST, size: TreeSize, max_nodes: Optional[int],
+            max_depth: Optional[int]) -> Iterator[List[ast.AST]]:
+    """Yield the tree one level at a time, in ``ast.walk`` order, within the budgets.
+
+    The next level is only gathered once the consumer is done with the
+    current one, so a walk holds two levels at most and uses no recursion.
+    ``None`` lifts a budget.
+    """
+    level = [tree]
+    while level:
+        if max_nodes is not None and size.nodes + len(level) > max_nodes:
+            level = level[:max_nodes - size.nodes]
+            size.truncated = 'nodes'
+        size.nodes += len(level)
+        size.depth += 1
+        yield level
+        if size.truncated:
+            return
+
+        children = []
+        for node in level:
+            children.extend(ast.iter_child_nodes(node))
+        if children and max_depth is not None and size.depth >= max_depth:
+            size.truncated = 'depth'
+            return
+        level = children
+
+
+def iter_nodes(tree: ast.AST, size: Optional[TreeSize] = None, max_nodes: Optional[int] = MAX_NODES,
+               max_depth: Optional[int] = MAX_DEPTH) -> Iterator[ast.AST]:
+    """Like ``ast.walk``, but stops at the budgets; pass ``size`` to learn whether it did"""
+    for level in _levels(tree, size or TreeSize(), max_nodes, max_depth):
+        yield from level
+
+
+def measure(tree: ast.AST, max_nodes: Optional[int] = MAX_NODES,
+            max_depth: Optional[int] = MAX_DEPTH) -> TreeSize:
+    """Count the nodes and levels of a tree, up to the budgets"""
+    size = TreeSize()
+    for _ in _levels(tree, size, max_nodes, max_depth):
+        pass
+    return size
+
+
+def safe_unparse(node: ast.AST, max_length: int = MAX_UNPARSE_LENGTH) -> str:
+    """ast.unparse for labels and messages: '...' for expressions too big to show, long text cut short"""
+    if measure(node, max_nodes=MAX_UNPARSE_NODES).truncated:
+        return '...'
+    text = ast.unparse(node)
+    if len(text) > max_length:
+        text = text[:max_length - 3] + '...'
+    return text
+
+
+class NodeVisitor:
+    """One consumer of the shared AST walk.
+
+    Subclasses list the node classes they care about in ``node_types``
+    (subclasses count, as with isinstance) and get ``visit`` called for
+    each of them.
+    """
+
+    node_types: Tuple[Type[ast.AST], ...] = ()
+
+    def visit(self, node: ast.AST):
+        raise NotImplementedError
+
+
+def walk(tree: ast.AST, visitors: Iterable[NodeVisitor], max_nodes: Optional[int] = MAX_NODES,
+         max_depth: Optional[int] = MAX_DEPTH) -> TreeSize:
+    """Walk the tree once, handing every node to the visitors that want it.
+
+    Nodes are visited in the same breadth-first order as ``ast.walk`` and,
+    for each node, visitors run in the order given. Which visitors want a
+    node class is worked out once per class, so the per-node cost is a
+    dict lookup plus the calls that actually do work.
+
+    The walk keeps an explicit queue, so nesting depth costs no stack. It
+    stops after ``max_nodes`` nodes or ``max_depth`` levels, leaving the
+    visitors with what they saw so far; the returned TreeSize says whether
+    it did.
+    """
+    visitors = list(visitors)
+    handlers: Dict[type, List] = {}
+    size = TreeSize()
+    for level in _levels(tree, size, max_nodes, max_depth):
+        for node in level:
+            node_class = node.__class__
+            node_handlers = handlers.get(node_class)
+            if node_handlers is None:
+                node_handlers = handlers[node_class] = [
+                    visitor.visit for visitor in visitors if issubclass(node_class, visitor.node_types)
+                ]
+            for handler in node_handlers:
+                handler(node)
+    return size
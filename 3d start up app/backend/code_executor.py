@@ -1,28 +1,181 @@
 # Code Executor Module - Safe Python code execution
-import sys
-import io
 import ast
 import traceback
-import subprocess
-import tempfile
 import os
-import signal
-import time
-from contextlib import contextmanager
-from typing import Dict, List, Any
+import re
+import json
+import hashlib
+import marshal
+import multiprocessing
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Tuple
+
+from cache import LRUCache
+from sandbox import run_code, ExecutionBudget, STUDENT_FILENAME
+from sandbox_pool import SandboxPool, HEARTBEAT_INTERVAL
+from flowchart_generator import FlowchartGenerator, CodeFlowchartBuilder
+from fingerprint import Fingerprint
+from recovery import Recovery, recover
+from ast_pipeline import NodeVisitor, TooComplex, parse, walk
+from rules import RuleEngine
+
+class CompiledCode:
+    """Validated student code, ready to run in-process or ship to a worker"""
+    
+    def __init__(self, code_object, deterministic: bool = False):
+        self.code_object = code_object
+        self.marshalled = marshal.dumps(code_object)
+        # True when the program's output depends only on its source
+        self.deterministic = deterministic
+        # (flowchart, tree) once a run has been charted; see CodeExecutor._chart
+        self.chart = None
+    
+    @property
+    def size(self) -> int:
+        return len(self.marshalled)
+
+# Cached marker for source that failed validation
+_REJECTED = 'rejected'
+
+# Names whose use can make a program's output differ between runs: input,
+# object identity, hash randomization (which also drives set ordering) and
+# anything clock- or randomness-based
+NONDETERMINISTIC_NAMES = {
+    'input', 'id', 'hash', 'set', 'frozenset', 'random', 'time', 'datetime',
+    'globals', 'locals', 'vars', 'open', 'memoryview'
+}
+
+# Modules student code may not import
+DANGEROUS_MODULES = {
+    'os', 'sys', 'subprocess', 'shutil', 'glob', 'tempfile',
+    'pickle', 'marshal', 'shelve', 'dbm', 'sqlite3',
+    'socket', 'urllib', 'http', 'ftplib', 'smtplib',
+    'threading', 'multiprocessing', 'asyncio',
+    'ctypes', 'importlib', '__import__'
+}
+
+# Default object reprs (e.g. "<function f at 0x7f3a...>") embed memory addresses
+_ADDRESS_PATTERN = re.compile(r'0x[0-9a-fA-F]{4,}')
+
+def _result_size(result: Dict[str, Any]) -> int:
+    """Approximate memory held by a cached result dict"""
+    return sum(len(value) for value in result.values() if isinstance(value, str)) + 256
+
+class _ImportCheck(NodeVisitor):
+    """Flags imports of DANGEROUS_MODULES"""
+    
+    node_types = (ast.Import, ast.ImportFrom)
+    
+    def __init__(self):
+        self.dangerous = False
+    
+    def visit(self, node):
+        if isinstance(node, ast.Import):
+            if any(alias.name in DANGEROUS_MODULES for alias in node.names):
+                self.dangerous = True
+        elif node.module in DANGEROUS_MODULES:
+            self.dangerous = True
+
+class _DeterminismCheck(NodeVisitor):
+    """Conservatively decides whether a program's output depends only on its source"""
+    
+    node_types = (ast.Import, ast.ImportFrom, ast.Set, ast.SetComp, ast.Name, ast.Attribute)
+    
+    def __init__(self):
+        self.deterministic = True
+    
+    def visit(self, node):
+        if isinstance(node, ast.Name):
+            if node.id in NONDETERMINISTIC_NAMES:
+                self.deterministic = False
+        elif isinstance(node, ast.Attribute):
+            if node.attr in NONDETERMINISTIC_NAMES:
+                self.deterministic = False
+        else:
+            self.deterministic = False
 
 class CodeExecutor:
     """Safely execute and analyze Python code"""
     
-    def __init__(self):
-        self.timeout = 10  # 10 seconds timeout
-        self.max_output_length = 10000  # Maximum output length
+    def __init__(self, pool_size: Optional[int] = None, max_runs_per_worker: Optional[int] = None,
+                 cache_results: Optional[bool] = None, max_instructions: Optional[int] = None):
+        self.timeout = float(os.environ.get('CODE_TIMEOUT', 10))  # Wall-clock seconds
+        self.max_output_length = int(os.environ.get('MAX_OUTPUT_LENGTH', 10000))  # Output bytes
+        if max_instructions is None:
+            # Lines of student code per run; a reproducible limit, unlike wall-clock time (0 = off)
+            max_instructions = int(os.environ.get('CODE_MAX_INSTRUCTIONS', 0))
+        self.budget = ExecutionBudget(
+            wall_time=self.timeout,
+            cpu_time=float(os.environ.get('CODE_CPU_TIME', self.timeout)),
+            memory_bytes=int(os.environ.get('CODE_MEMORY_MB', 256)) * 1024 * 1024,
+            output_bytes=self.max_output_length,
+            # STOP_ON_OUTPUT_LIMIT=0 lets programs run on, keeping the head and tail of their output
+            stop_on_output_limit=os.environ.get('STOP_ON_OUTPUT_LIMIT', '1').lower() in ('1', 'true'),
+            instructions=max_instructions or None
+        )
+        
+        # Branch and loop counts in each result (opt-in with CODE_COVERAGE=1, or per run)
+        self.coverage = os.environ.get('CODE_COVERAGE', '0').lower() in ('1', 'true')
+        
+        # Pool of pre-started sandbox processes (SANDBOX_POOL_SIZE=0 runs in-process)
+        if pool_size is None:
+            pool_size = int(os.environ.get('SANDBOX_POOL_SIZE', os.cpu_count() or 2))
+        if max_runs_per_worker is None:
+            max_runs_per_worker = int(os.environ.get('SANDBOX_MAX_RUNS', 100))
+        
+        # Results of deterministic programs (opt-in with RESULT_CACHE=1)
+        if cache_results is None:
+            cache_results = os.environ.get('RESULT_CACHE', '0').lower() in ('1', 'true')
+        self.result_cache = None
+        if cache_results:
+            self.result_cache = LRUCache(
+                max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 1024)),
+                max_bytes=int(os.environ.get('RESULT_CACHE_MB', 16)) * 1024 * 1024,
+                sizeof=_result_size,
+                ttl=float(os.environ.get('RESULT_CACHE_TTL', 300))
+            )
+        
+        # Analysis rules, timed per rule
+        self.rules = RuleEngine()
+        
+        # Flowcharts and AST rule issues keyed by program structure, so reformatted code hits
+        self.analysis_cache = LRUCache(max_entries=int(os.environ.get('ANALYSIS_STRUCTURE_CACHE_SIZE', 1024)))
+        
+        # Validated code objects keyed by source hash; students re-run the same code a lot
+        self.code_cache = LRUCache(
+            max_entries=int(os.environ.get('CODE_CACHE_SIZE', 512)),
+            max_bytes=int(os.environ.get('CODE_CACHE_MB', 32)) * 1024 * 1024,
+            sizeof=lambda entry: entry.size if isinstance(entry, CompiledCode) else 0
+        )
+        
+        self.pool = None
+        # Spawned workers re-import the main module; never start a pool from inside one
+        if pool_size > 0 and multiprocessing.parent_process() is None:
+            try:
+                self.pool = SandboxPool(size=pool_size, max_runs_per_worker=max_runs_per_worker)
+            except OSError as e:
+                print(f"Warning: Could not start sandbox pool, running code in-process: {e}")
     
-    def execute_code(self, code: str) -> Dict[str, Any]:
-        """Execute Python code safely with timeout and output limits"""
+    def execute_code(self, code: str, stdin: Optional[str] = None,
+                     call: Optional[Dict[str, Any]] = None, profile: bool = False,
+                     coverage: Optional[bool] = None, trace_memory: bool = False) -> Dict[str, Any]:
+        """Execute Python code safely with timeout and output limits
+        
+        ``stdin`` feeds ``input()``; ``call`` names a function to call after
+        the program has run (see sandbox.run_code). ``profile`` adds per-line
+        hit counts and times, and ``coverage`` (off by default) branch and
+        loop counts; both are also mapped onto the flowchart nodes from
+        FlowchartGenerator.generate_from_code. ``trace_memory`` adds the
+        lines that allocated most to ``usage``, at the cost of a slower run.
+        """
+        if coverage is None:
+            coverage = self.coverage
         try:
-            # Basic security checks
-            if self._has_dangerous_imports(code):
+            # Basic security checks (cached together with the compiled code)
+            try:
+                compiled = self.compile_code(code)
+            except SyntaxError as e:
+                return self._compile_error_result(e)
+            if compiled is None:
                 return {
                     'success': False,
                     'error': 'Code contains potentially dangerous imports',
@@ -30,91 +183,23 @@ class CodeExecutor:
                     'execution_time': 0
                 }
             
-            # Capture stdout and stderr
-            old_stdout = sys.stdout
-            old_stderr = sys.stderr
+            # Profiles, allocation traces and benchmarks describe one run, so they are never served from the cache
+            timed = profile or trace_memory or bool(call and 'benchmark' in call)
+            cache_key = None if timed else self._result_cache_key(compiled, stdin, call, coverage)
+            if cache_key:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return dict(cached, cached=True)
             
-            stdout_capture = io.StringIO()
-            stderr_capture = io.StringIO()
+            if self.pool:
+                result = self.pool.run(self._make_job(compiled, stdin, call, profile, coverage, trace_memory))
+            else:
+                result = run_code(compiled.code_object, budget=self.budget, stdin=stdin, call=call,
+                                  profile=profile, coverage=coverage)
             
-            start_time = time.time()
-            
-            try:
-                sys.stdout = stdout_capture
-                sys.stderr = stderr_capture
-                
-                # Create a restricted execution environment
-                exec_globals = {
-                    '__builtins__': {
-                        'print': print,
-                        'len': len,
-                        'range': range,
-                        'str': str,
-                        'int': int,
-                        'float': float,
-                        'list': list,
-                        'dict': dict,
-                        'tuple': tuple,
-                        'set': set,
-                        'bool': bool,
-                        'abs': abs,
-                        'max': max,
-                        'min': min,
-                        'sum': sum,
-                        'sorted': sorted,
-                        'reversed': reversed,
-                        'enumerate': enumerate,
-                        'zip': zip,
-                        'map': map,
-                        'filter': filter,
-                        'any': any,
-                        'all': all,
-                        'round': round,
-                        'pow': pow,
-                        'divmod': divmod,
-                        'isinstance': isinstance,
-                        'type': type,
-                        'hasattr': hasattr,
-                        'getattr': getattr,
-                        'setattr': setattr,
-                        'chr': chr,
-                        'ord': ord,
-                    }
-                }
-                
-                # Execute the code
-                exec(code, exec_globals)
-                
-                execution_time = time.time() - start_time
-                
-                # Get output
-                stdout_output = stdout_capture.getvalue()
-                stderr_output = stderr_capture.getvalue()
-                
-                # Limit output length
-                if len(stdout_output) > self.max_output_length:
-                    stdout_output = stdout_output[:self.max_output_length] + "\n... (output truncated)"
-                
-                return {
-                    'success': True,
-                    'output': stdout_output,
-                    'error': stderr_output if stderr_output else None,
-                    'execution_time': round(execution_time, 3)
-                }
-                
-            except Exception as e:
-                execution_time = time.time() - start_time
-                return {
-                    'success': False,
-                    'error': str(e),
-                    'output': stdout_capture.getvalue(),
-                    'execution_time': round(execution_time, 3),
-                    'traceback': traceback.format_exc()
-                }
-            
-            finally:
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
+            self._annotate_flowchart(compiled, code, result)
+            self._store_result(cache_key, result)
+            return result
                 
         except Exception as e:
             return {
@@ -124,117 +209,224 @@ class CodeExecutor:
                 'execution_time': 0
             }
     
-    def analyze_code(self, code: str) -> List[Dict[str, Any]]:
-        """Analyze code for potential errors and issues"""
-        errors = []
+    def execute_code_stream(self, code: str) -> Iterator[Tuple[str, Any]]:
+        """Execute Python code, yielding output chunks as the program produces them.
         
+        Yields ``('stdout', text)`` and ``('heartbeat', None)`` events, then a
+        final ``('result', dict)`` with the same result dict as execute_code.
+        Closing the generator early stops the program.
+        """
         try:
-            # Parse the code to check for syntax errors
-            tree = ast.parse(code)
-            
-            # Check for common issues
-            errors.extend(self._check_syntax_issues(tree))
-            errors.extend(self._check_logic_issues(tree))
-            errors.extend(self._check_style_issues(code))
-            
+            compiled = self.compile_code(code)
         except SyntaxError as e:
-            errors.append({
-                'type': 'syntax_error',
-                'line': e.lineno,
-                'message': str(e),
-                'severity': 'error'
-            })
+            yield 'result', self._compile_error_result(e)
+            return
+        if compiled is None:
+            yield 'result', {
+                'success': False,
+                'error': 'Code contains potentially dangerous imports',
+                'output': '',
+                'execution_time': 0
+            }
+            return
         
-        return errors
+        cache_key = self._result_cache_key(compiled, coverage=self.coverage)
+        cached = self.result_cache.get(cache_key) if cache_key else None
+        
+        if cached is not None or not self.pool:
+            # Cached or in-process results arrive in one piece
+            if cached is not None:
+                result = dict(cached, cached=True)
+            else:
+                result = run_code(compiled.code_object, budget=self.budget, coverage=self.coverage)
+                self._annotate_flowchart(compiled, code, result)
+                self._store_result(cache_key, result)
+            if result.get('output'):
+                yield 'stdout', result['output']
+            yield 'result', result
+            return
+        
+        job = self._make_job(compiled, coverage=self.coverage)
+        job['stream'] = True
+        for kind, payload in self.pool.stream(job, heartbeat=HEARTBEAT_INTERVAL):
+            if kind == 'result':
+                self._annotate_flowchart(compiled, code, payload)
+                self._store_result(cache_key, payload)
+            yield kind, payload
     
-    def _has_dangerous_imports(self, code: str) -> bool:
-        """Check for potentially dangerous imports"""
-        dangerous_modules = [
-            'os', 'sys', 'subprocess', 'shutil', 'glob', 'tempfile',
-            'pickle', 'marshal', 'shelve', 'dbm', 'sqlite3',
-            'socket', 'urllib', 'http', 'ftplib', 'smtplib',
-            'threading', 'multiprocessing', 'asyncio',
-            'ctypes', 'importlib', '__import__'
+    def compile_code(self, code: str, tree: Optional[ast.AST] = None) -> Optional[CompiledCode]:
+        """Validate and compile code, reusing cached results by source hash.
+        
+        Pass ``tree`` when the caller has already parsed ``code``. Returns
+        None when the code is rejected by the security checks and raises
+        SyntaxError for code that parses but does not compile (such as
+        ``return`` outside a function), or TooComplex for code nested too
+        deeply to parse or compile.
+        """
+        key = hashlib.sha256(code.encode('utf-8', 'surrogatepass')).hexdigest()
+        entry = self.code_cache.get(key)
+        
+        if entry is None:
+            if tree is None:
+                try:
+                    tree = parse(code, filename=STUDENT_FILENAME)
+                except TooComplex:
+                    raise
+                except SyntaxError:
+                    tree = None
+            
+            if tree is None:
+                entry = _REJECTED
+            else:
+                # Both checks share one walk, which must see every node
+                imports, determinism = _ImportCheck(), _DeterminismCheck()
+                walk(tree, [imports, determinism], max_nodes=None, max_depth=None)
+                if imports.dangerous:
+                    entry = _REJECTED
+                else:
+                    try:
+                        code_object = compile(tree, STUDENT_FILENAME, 'exec')
+                    except (RecursionError, MemoryError):
+                        raise TooComplex('code is nested too deeply to compile') from None
+                    entry = CompiledCode(code_object, deterministic=determinism.deterministic)
+            self.code_cache.put(key, entry)
+        
+        return None if entry is _REJECTED else entry
+    
+    def _result_cache_key(self, compiled: CompiledCode, stdin: Optional[str] = None,
+                          call: Optional[Dict[str, Any]] = None, coverage: bool = False) -> Optional[Tuple]:
+        """Result cache key for a program, or None if its result must not be cached"""
+        if self.result_cache is None or not compiled.deterministic:
+            return None
+        return (hashlib.sha256(compiled.marshalled).hexdigest(),
+                tuple(sorted(self.budget.to_dict().items())),
+                stdin,
+                json.dumps(call, sort_keys=True) if call else None,
+                coverage)
+    
+    def _store_result(self, cache_key: Optional[Tuple], result: Dict[str, Any]):
+        """Cache a finished run unless it depended on timing or memory addresses"""
+        if not cache_key or 'usage' not in result or result.get('limit_exceeded'):
+            return
+        if _ADDRESS_PATTERN.search(result.get('output') or '') or \
+                _ADDRESS_PATTERN.search(result.get('error') or ''):
+            return
+        self.result_cache.put(cache_key, result)
+    
+    def _compile_error_result(self, error: SyntaxError) -> Dict[str, Any]:
+        """Result dict for code that failed to compile"""
+        return {
+            'success': False,
+            'error': str(error),
+            'output': '',
+            'execution_time': 0,
+            'traceback': ''.join(traceback.format_exception_only(type(error), error))
+        }
+    
+    def _make_job(self, compiled: CompiledCode, stdin: Optional[str] = None,
+                  call: Optional[Dict[str, Any]] = None, profile: bool = False,
+                  coverage: bool = False, trace_memory: bool = False) -> Dict[str, Any]:
+        """Build a worker job; code objects travel as marshal bytes"""
+        return {
+            'code': compiled.marshalled,
+            'budget': self.budget,
+            'stdin': stdin,
+            'call': call,
+            # tracemalloc slows every allocation, which would skew benchmark timings
+            'trace_memory': trace_memory and not (call and 'benchmark' in call),
+            'profile': profile,
+            'coverage': coverage
+        }
+    
+    def _chart(self, compiled: CompiledCode, code: str) -> Tuple[Dict[str, Any], ast.AST]:
+        """The code's flowchart and tree, built on its first charted run and kept with its code object"""
+        if compiled.chart is None:
+            tree = parse(code)
+            # Only the chart is needed, so the rules are not run (or counted in their stats)
+            builder = CodeFlowchartBuilder()
+            walk(tree, [builder])
+            compiled.chart = (builder.flowchart(), tree)
+        return compiled.chart
+    
+    def _annotate_flowchart(self, compiled: CompiledCode, code: str, result: Dict[str, Any]):
+        """Map profile and coverage line data onto the code's flowchart nodes"""
+        if 'profile' not in result and 'coverage' not in result:
+            return
+        generator = FlowchartGenerator()
+        flowchart, tree = self._chart(compiled, code)
+        if 'profile' in result:
+            result['profile']['nodes'] = generator.map_line_profile(
+                flowchart, result['profile']['lines'], result.get('execution_time', 0))
+        if 'coverage' in result:
+            result['coverage']['flowchart'] = generator.annotate_coverage(code, flowchart, result['coverage'], tree=tree)
+    
+    def analyze_with_flowchart(self, code: str, tree: ast.AST) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Return the flowchart and the issues for parsed code
+        
+        The flowchart and the AST rules' issues depend only on the program's
+        structure, so they are cached by its fingerprint and moved to the
+        current line numbers on a hit: reformatting the code or adding
+        comments and blank lines reuses them. The line rules read the raw
+        text and always run.
+        """
+        flowchart, issues = self._analyze_structure(tree)
+        return flowchart, issues + self.rules.run_lines(code)
+    
+    def _analyze_structure(self, tree: ast.AST) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        fingerprint = Fingerprint(tree)
+        cached = self.analysis_cache.get(fingerprint.key) if fingerprint.key else None
+        if cached is None:
+            builder = CodeFlowchartBuilder()
+            issues = self.rules.run_tree(tree, [builder], size=fingerprint.size)
+            if fingerprint.key is None:
+                # Past the walk's budgets: a partial result, not worth keeping
+                return builder.flowchart(title='Code Flow Diagram (partial)'), issues
+            flowchart = builder.flowchart()
+            self.analysis_cache.put(fingerprint.key, (flowchart, issues, fingerprint.positions,
+                                                      fingerprint.issue_nodes(issues)))
+            return flowchart, issues
+        
+        flowchart, issues, positions, issue_nodes = cached
+        if positions == fingerprint.positions:
+            return flowchart, issues
+        starts, ends = fingerprint.line_map(positions)
+        nodes = [
+            dict(node, line=starts.get(node['line'], node['line']),
+                 end_line=ends.get(node['end_line'], node['end_line']))
+            if 'line' in node else node
+            for node in flowchart['nodes']
         ]
+        moved = []
+        for issue, index in zip(issues, issue_nodes):
+            if index is None:
+                moved.append(dict(issue, line=starts.get(issue['line'], issue['line'])))
+            else:
+                line, column, _ = fingerprint.positions[index]
+                moved.append(dict(issue, line=line, column=column))
+        return dict(flowchart, nodes=nodes), moved
+    
+    def analyze_code(self, code: str, tree: Optional[ast.AST] = None,
+                     visitors: Sequence[NodeVisitor] = (),
+                     recovery: Optional[Recovery] = None) -> List[Dict[str, Any]]:
+        """Analyze code for potential errors and issues
+        
+        Pass ``tree`` when the caller has already parsed ``code``; any
+        ``visitors`` (such as a flowchart builder) ride along on the same
+        walk as the rules (see rules.RuleEngine). Code that does not parse
+        gets every syntax error recovery.recover finds, or those of the
+        ``recovery`` passed in.
+        """
+        errors = []
         
         try:
-            tree = ast.parse(code)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        if alias.name in dangerous_modules:
-                            return True
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module in dangerous_modules:
-                        return True
-        except:
-            # If we can't parse, assume it's dangerous
-            return True
-        
-        return False
-    
-    def _check_syntax_issues(self, tree: ast.AST) -> List[Dict[str, Any]]:
-        """Check for syntax-related issues"""
-        issues = []
-        
-        for node in ast.walk(tree):
-            # Check for undefined variables (basic check)
-            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-                # This is a simplified check - in a real implementation,
-                # you'd want to track variable definitions and scopes
-                pass
-        
-        return issues
-    
-    def _check_logic_issues(self, tree: ast.AST) -> List[Dict[str, Any]]:
-        """Check for logical issues"""
-        issues = []
-        
-        for node in ast.walk(tree):
-            # Check for infinite loops (basic patterns)
-            if isinstance(node, ast.While):
-                if isinstance(node.test, ast.Constant) and node.test.value is True:
-                    issues.append({
-                        'type': 'potential_infinite_loop',
-                        'line': node.lineno,
-                        'message': 'Potential infinite loop detected (while True without break)',
-                        'severity': 'warning'
-                    })
+            # Parse the code to check for syntax errors
+            if tree is None:
+                tree = parse(code)
             
-            # Check for division by zero patterns
-            if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div):
-                if isinstance(node.right, ast.Constant) and node.right.value == 0:
-                    issues.append({
-                        'type': 'division_by_zero',
-                        'line': node.lineno,
-                        'message': 'Division by zero detected',
-                        'severity': 'error'
-                    })
-        
-        return issues
-    
-    def _check_style_issues(self, code: str) -> List[Dict[str, Any]]:
-        """Check for style issues"""
-        issues = []
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            # Check line length
-            if len(line) > 100:
-                issues.append({
-                    'type': 'line_too_long',
-                    'line': i,
-                    'message': f'Line too long ({len(line)} characters)',
-                    'severity': 'style'
-                })
+            # Check for common issues
+            errors.extend(self.rules.run(code, tree, visitors))
             
-            # Check for trailing whitespace
-            if line.endswith(' ') or line.endswith('\t'):
-                issues.append({
-                    'type': 'trailing_whitespace',
-                    'line': i,
-                    'message': 'Trailing whitespace detected',
-                    'severity': 'style'
-                })
-        
-        return issues
+        except SyntaxError:
+            errors.extend((recovery or recover(code)).errors)
+        
+        return errors
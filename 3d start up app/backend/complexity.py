@@ -0,0 +1,250 @@
+# Complexity Module - Estimate a function's time complexity by timing it at growing input sizes
+import gc
+import math
+import time
+import random
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+# Input sizes tried when the request does not list its own
+DEFAULT_SIZES = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072]
+
+# Limits on what one request may ask for
+MAX_SIZES = 20
+MAX_SIZE = 1000000
+MAX_REPEAT = 10
+
+# Fewest timed sizes a fit is made from
+MIN_POINTS = 4
+
+# A timing is repeated in a loop until it takes at least this long, so tiny sizes are not lost in timer noise
+MIN_SAMPLE_TIME = 0.002
+
+# Most calls in one sample, and most argument items copied for one sample of a function that modifies them
+MAX_NUMBER = 100000
+MAX_COPIED_ITEMS = 1000000
+
+# A slower-growing class is preferred unless a faster-growing one fits this much better
+SIMPLER_FIT_TOLERANCE = 1.5
+
+# Share of the executor's wall-clock budget the timings may use; the rest is for running the program
+BENCHMARK_BUDGET_SHARE = 0.5
+
+# Complexity classes from slowest- to fastest-growing, as f(n)
+COMPLEXITY_CLASSES: List[Tuple[str, Callable[[float], float]]] = [
+    ('O(1)', lambda n: 1.0),
+    ('O(log n)', lambda n: math.log2(n)),
+    ('O(n)', lambda n: n),
+    ('O(n log n)', lambda n: n * math.log2(n)),
+    ('O(n^2)', lambda n: n * n),
+]
+
+INPUT_TYPES = ('int', 'list', 'string', 'value')
+LIST_ORDERS = ('random', 'sorted', 'reversed')
+
+
+def validate_input_spec(spec: Any) -> Optional[str]:
+    """Return an error message if an argument spec is malformed"""
+    if not isinstance(spec, dict) or spec.get('type') not in INPUT_TYPES:
+        return f"Each input needs a type: one of {', '.join(INPUT_TYPES)}"
+    if spec['type'] == 'list' and spec.get('order', 'random') not in LIST_ORDERS:
+        return f"List order must be one of {', '.join(LIST_ORDERS)}"
+    if spec['type'] == 'value' and 'value' not in spec:
+        return 'A value input needs a value'
+    return None
+
+
+def make_input(spec: Dict[str, Any], n: int, rng: random.Random) -> Any:
+    """Build one argument of size ``n`` from its spec.
+
+    ``int`` is n itself, ``list`` n random ints (``order``: random, sorted
+    or reversed), ``string`` n random lowercase letters and ``value`` a
+    fixed value that does not grow.
+    """
+    kind = spec['type']
+    if kind == 'int':
+        return n
+    if kind == 'list':
+        values = [rng.randrange(max(n, 1) * 4) for _ in range(n)]
+        order = spec.get('order', 'random')
+        if order != 'random':
+            values.sort(reverse=order == 'reversed')
+        return values
+    if kind == 'string':
+        return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(n))
+    return spec['value']
+
+
+def run_benchmark(function: Callable, benchmark: Dict[str, Any]) -> Dict[str, Any]:
+    """Time ``function`` at each size; runs inside the sandbox, under its limits.
+
+    A first, untimed call shows whether the function modifies its
+    arguments; if it does, every timed call gets its own copy, made outside
+    the timed region, so functions that sort or consume their input are
+    timed fairly. Each size is timed ``repeat`` times with the garbage
+    collector off and the fastest is kept. Sizes stop growing before they
+    would run past ``time_budget`` seconds, assuming the cost grows no
+    faster than n^2.
+    """
+    inputs = benchmark['inputs']
+    repeat = benchmark.get('repeat', 3)
+    deadline = time.perf_counter() + benchmark['time_budget']
+    rng = random.Random(0)
+
+    timings = []
+    stopped = None
+    previous = None  # (n, seconds spent on it)
+    for n in benchmark['sizes']:
+        size_start = time.perf_counter()
+        if previous and size_start + previous[1] * (n / previous[0]) ** 2 > deadline:
+            stopped = 'time_budget'
+            break
+        base = [make_input(spec, n, rng) for spec in inputs]
+        warm_up = [list(arg) if isinstance(arg, list) else arg for arg in base]
+        function(*warm_up)
+        mutates = warm_up != base
+
+        best = None
+        number = 1
+        for _ in range(repeat):
+            while True:
+                if mutates:
+                    calls = [[list(arg) if isinstance(arg, list) else arg for arg in base] for _ in range(number)]
+                else:
+                    calls = [base] * number
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    start = time.perf_counter()
+                    for args in calls:
+                        function(*args)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+                # Too quick to measure: call it more times per sample
+                if elapsed >= MIN_SAMPLE_TIME or number >= MAX_NUMBER or \
+                        (mutates and number * 10 * n > MAX_COPIED_ITEMS):
+                    break
+                number *= 10
+            per_call = elapsed / number
+            best = per_call if best is None else min(best, per_call)
+            if time.perf_counter() > deadline:
+                break
+        timings.append([n, best])
+        previous = (n, time.perf_counter() - size_start)
+    return {'timings': timings, 'stopped': stopped}
+
+
+def fit_complexity(timings: List[List[float]]) -> Dict[str, Any]:
+    """Fit t = a + b * f(n) for every complexity class and pick the best.
+
+    Each fit is a closed-form weighted least-squares solve over the whole
+    curve at once; points are weighted by 1 / t^2 so the error is relative
+    and the fast small sizes count as much as the slow large ones. ``b`` is
+    kept non-negative, since a cost that shrinks as n grows is no fit. The
+    best class has the smallest residual, except that a slower-growing
+    class wins unless the faster-growing one fits clearly better.
+    """
+    ns = [float(n) for n, _ in timings]
+    ts = [max(float(t), 1e-9) for _, t in timings]
+    weights = [1.0 / (t * t) for t in ts]
+    total_weight = sum(weights)
+    t_mean = sum(w * t for w, t in zip(weights, ts)) / total_weight
+
+    fits = []
+    for name, f in COMPLEXITY_CLASSES:
+        xs = [f(n) for n in ns]
+        x_mean = sum(w * x for w, x in zip(weights, xs)) / total_weight
+        sxx = sum(w * (x - x_mean) ** 2 for w, x in zip(weights, xs))
+        sxt = sum(w * (x - x_mean) * (t - t_mean) for w, x, t in zip(weights, xs, ts))
+        slope = max(sxt / sxx, 0.0) if sxx > 0 else 0.0
+        intercept = t_mean - slope * x_mean
+        residual = sum(w * (t - intercept - slope * x) ** 2 for w, x, t in zip(weights, xs, ts))
+        fits.append({
+            'class': name,
+            'coefficient': slope,
+            'intercept': intercept,
+            'residual': residual
+        })
+
+    # The O(1) fit is the weighted mean, so its residual is the total spread of the timings
+    spread = fits[0]['residual']
+    best = fits[0]
+    for fit in fits:
+        fit['r_squared'] = round(1 - fit['residual'] / spread, 4) if spread else 1.0
+        if fit['residual'] * SIMPLER_FIT_TOLERANCE < best['residual']:
+            best = fit
+    return {'best_fit': best['class'], 'fits': fits}
+
+
+class ComplexityEstimator:
+    """Time a submitted function at growing input sizes and name its complexity class"""
+
+    def __init__(self, code_executor):
+        self.code_executor = code_executor
+
+    def validate(self, spec: Any) -> Optional[str]:
+        """Return an error message if the benchmark request is malformed"""
+        if not isinstance(spec, dict) or not isinstance(spec.get('function'), str):
+            return 'function must name a function defined by the code'
+        inputs = spec.get('inputs')
+        if not isinstance(inputs, list) or not inputs:
+            return 'inputs must be a non-empty list of argument specs'
+        for argument in inputs:
+            problem = validate_input_spec(argument)
+            if problem:
+                return problem
+        if not any(argument['type'] != 'value' for argument in inputs):
+            return 'At least one input must grow with n'
+
+        sizes = spec.get('sizes', DEFAULT_SIZES)
+        if not isinstance(sizes, list) or not all(isinstance(n, int) and not isinstance(n, bool) for n in sizes):
+            return 'sizes must be a list of integers'
+        if not MIN_POINTS <= len(sizes) <= MAX_SIZES:
+            return f'Give between {MIN_POINTS} and {MAX_SIZES} sizes'
+        if any(not 1 <= n <= MAX_SIZE for n in sizes):
+            return f'Sizes must be between 1 and {MAX_SIZE}'
+        repeat = spec.get('repeat', 3)
+        if not isinstance(repeat, int) or not 1 <= repeat <= MAX_REPEAT:
+            return f'repeat must be between 1 and {MAX_REPEAT}'
+        return None
+
+    def estimate(self, code: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the benchmark in the sandbox and fit the timings"""
+        benchmark = {
+            'inputs': spec['inputs'],
+            'sizes': sorted(set(spec.get('sizes', DEFAULT_SIZES))),
+            'repeat': spec.get('repeat', 3),
+            'time_budget': self.code_executor.budget.wall_time * BENCHMARK_BUDGET_SHARE
+        }
+        result = self.code_executor.execute_code(
+            code, call={'function': spec['function'], 'benchmark': benchmark}, coverage=False
+        )
+        if not result.get('success'):
+            return {
+                'success': False,
+                'error': result.get('error'),
+                'limit_exceeded': result.get('limit_exceeded'),
+                'output': result.get('output', '')
+            }
+
+        timings = result['benchmark']['timings']
+        curve = [{'n': n, 'time': t} for n, t in timings]
+        if len(timings) < MIN_POINTS:
+            return {
+                'success': False,
+                'error': f'Only {len(timings)} sizes finished within the time budget; '
+                         f'at least {MIN_POINTS} are needed for a fit. Try smaller sizes.',
+                'curve': curve
+            }
+
+        fit = fit_complexity(timings)
+        return {
+            'success': True,
+            'function': spec['function'],
+            'best_fit': fit['best_fit'],
+            'fits': fit['fits'],
+            'curve': curve,
+            'stopped': result['benchmark']['stopped'],
+            'execution_time': result.get('execution_time', 0)
+        }
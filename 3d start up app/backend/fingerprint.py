@@ -0,0 +1,79 @@
+# Fingerprint Module - Canonical hash of a program's structure, blind to formatting
+import ast
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from ast_pipeline import TreeSize, iter_nodes
+
+
+def _describe(node: ast.AST, parts: List[str]):
+    """Add a node's class and plain fields to ``parts``, with its child nodes as placeholders.
+
+    The descriptions of all nodes in ``ast.walk`` order describe the tree
+    exactly: each one says how many children follow and in which fields.
+    """
+    parts.append(node.__class__.__name__)
+    for name in node._fields:
+        value = getattr(node, name, None)
+        if isinstance(value, ast.AST):
+            parts.append('.')
+        elif isinstance(value, list):
+            parts.append('[' + ','.join(['.' if isinstance(item, ast.AST) else repr(item) for item in value]) + ']')
+        else:
+            parts.append(repr(value))
+
+
+class Fingerprint:
+    """Hash of a parsed program that ignores comments, whitespace and blank lines.
+
+    Two programs get the same ``key`` when their ASTs match node for node,
+    whatever their layout. ``positions`` records where each node sits, so
+    results computed for one layout can be moved to another with
+    ``line_map`` and ``issue_nodes``. The tree is read in one bounded walk
+    (see ast_pipeline.walk); ``size`` tells how far it got, and a tree
+    past the walk's budgets has no ``key``, since two such trees may
+    differ only where the walk did not look.
+    """
+
+    def __init__(self, tree: ast.AST):
+        self.size = TreeSize()
+        parts: List[str] = []
+        # First line and column, and last line, of every positioned node, in ast.walk order
+        self.positions: List[Tuple[int, int, int]] = []
+        for node in iter_nodes(tree, self.size):
+            _describe(node, parts)
+            if hasattr(node, 'lineno'):
+                self.positions.append((node.lineno, node.col_offset, node.end_lineno or node.lineno))
+        # repr() escapes newlines, so they only ever separate parts
+        dump = '\n'.join(parts)
+        self.key: Optional[str] = None if self.size.truncated else \
+            hashlib.sha256(dump.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def line_map(self, old_positions: List[Tuple[int, int, int]]) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Map start and end lines recorded for the same structure to this layout.
+
+        Returns ``(starts, ends)``: where a node that started (ended) on an
+        old line starts (ends) now. Nodes match by position in the walk;
+        when several share an old line, the first one decides. That is
+        right for statements that open a block, which always start their
+        own line, but not for expressions: issues move with ``issue_nodes``.
+        """
+        starts: Dict[int, int] = {}
+        ends: Dict[int, int] = {}
+        for (old_start, _, old_end), (new_start, _, new_end) in zip(old_positions, self.positions):
+            starts.setdefault(old_start, new_start)
+            ends.setdefault(old_end, new_end)
+        return starts, ends
+
+    def issue_nodes(self, issues: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """Index into ``positions`` of the node each issue is about, or None if not known.
+
+        Issues are matched by their line and column. Nodes starting at the
+        same place start at the same token, so they move together and any
+        of them will do.
+        """
+        first: Dict[Tuple[int, int], int] = {}
+        for index, (line, column, _) in enumerate(self.positions):
+            first.setdefault((line, column), index)
+        return [first.get((issue['line'], issue['column'])) if 'column' in issue else None
+                for issue in issues]
@@ -2,7 +2,10 @@
 import ast
 import json
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Set
+
+from ast_pipeline import NodeVisitor, iter_nodes, parse, safe_unparse, walk
+from recovery import Recovery, recover
 
 class FlowchartGenerator:
     """Generate flowcharts from problems or code"""
@@ -83,141 +86,141 @@ class FlowchartGenerator:
             'title': 'Problem Solution Flowchart'
         }
     
-    def generate_from_code(self, code: str) -> Dict[str, Any]:
-        """Generate flowchart from Python code"""
-        # Reset counter for new flowchart
-        self.node_id_counter = 0
+    def generate_from_code(self, code: str, tree: Optional[ast.AST] = None,
+                           recovery: Optional[Recovery] = None) -> Dict[str, Any]:
+        """Generate flowchart from Python code (or its already parsed tree)
         
+        Code with syntax errors gets a partial flowchart of the statements
+        that parse, followed by one error node per syntax error; code past
+        the walk's budgets (see ast_pipeline.walk) is charted as far as the
+        walk got. Pass ``recovery`` when the caller has already run
+        recovery.recover.
+        """
         try:
-            tree = ast.parse(code)
-            nodes = []
-            edges = []
-            
-            # Start node
-            start_id = self.generate_node_id()
-            nodes.append({
-                'id': start_id,
-                'type': 'start',
-                'label': 'Start',
-                'x': 100,
-                'y': 50
-            })
-            
-            # Process AST nodes
-            prev_id = start_id
-            y_pos = 150
+            if recovery is None:
+                if tree is None:
+                    tree = parse(code)
+                builder = self.code_flowchart_builder()
+                if walk(tree, [builder]).truncated:
+                    return builder.flowchart(title='Code Flow Diagram (partial)')
+                return builder.flowchart()
+        except SyntaxError:
+            recovery = recover(code)
+        
+        if recovery.tree is None:
+            return self._generate_error_flowchart(f"Syntax Error: {recovery.errors[0]['message']}")
+        builder = CodeFlowchartBuilder(skip_lines=recovery.skipped_lines)
+        walk(recovery.tree, [builder])
+        for error in recovery.errors:
+            builder.add_error(error['line'], error['message'])
+        return builder.flowchart(title='Code Flow Diagram (partial)')
+    
+    def code_flowchart_builder(self) -> 'CodeFlowchartBuilder':
+        """Return a builder to register on a shared AST walk"""
+        return CodeFlowchartBuilder()
+    
+    def map_line_profile(self, flowchart: Dict[str, Any], lines: List[Dict[str, Any]],
+                         total_time: float) -> Dict[str, Dict[str, Any]]:
+        """Map per-line profile numbers onto the nodes of a code flowchart
+        
+        A node's hits are those of its header line (calls, for a function
+        definition) and its time is the summed time of all the lines it
+        spans. ``share`` is that time as a fraction of ``total_time``, for
+        heat-mapping the flowchart.
+        """
+        by_line = {entry['line']: entry for entry in lines}
+        mapped = {}
+        
+        for node in flowchart.get('nodes', []):
+            if 'line' not in node:
+                continue
+            header = by_line.get(node['line'], {})
+            spent = sum(
+                by_line[line].get('time', 0.0)
+                for line in range(node['line'], node['end_line'] + 1)
+                if line in by_line
+            )
+            mapped[node['id']] = {
+                'hits': header.get('calls', header.get('hits', 0)),
+                'time': round(spent, 6),
+                'share': round(min(spent / total_time, 1.0), 3) if total_time else 0.0
+            }
+        
+        return mapped
+    
+    def annotate_coverage(self, code: str, flowchart: Dict[str, Any],
+                          coverage: Dict[str, Any], tree: Optional[ast.AST] = None) -> Dict[str, Any]:
+        """Turn recorded line transitions into branch and loop counts for a code flowchart
+        
+        Returns per-node counts (true/false for decisions, entries and
+        iterations for loops, calls for functions) and a weight for every
+        edge: how often execution reached the node the edge leads to.
+        """
+        arcs = coverage.get('arcs', [])
+        calls = dict(coverage.get('calls', []))
+        statements = {
+            node.lineno: node for node in iter_nodes(tree if tree is not None else parse(code))
+            if isinstance(node, (ast.If, ast.For, ast.While, ast.FunctionDef, ast.ClassDef))
+        }
+        
+        def arcs_into(line, outside):
+            """Transitions into line coming from lines outside the given span"""
+            return sum(count for start, end, count in arcs
+                       if end == line and not outside[0] <= start <= outside[1])
+        
+        def span(node):
+            return (node.lineno, node.end_lineno)
+        
+        nodes = {}
+        for node in flowchart.get('nodes', []):
+            statement = statements.get(node.get('line'))
+            if statement is None:
+                continue
+            first = statement.body[0] if hasattr(statement, 'body') and statement.body else None
             
-            for node in ast.walk(tree):
-                if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
-                    node_id = self.generate_node_id()
-                    label = f"Define {node.name}"
-                    
-                    nodes.append({
-                        'id': node_id,
-                        'type': 'process',
-                        'label': label,
-                        'x': 100,
-                        'y': y_pos
-                    })
-                    
-                    edges.append({
-                        'from': prev_id,
-                        'to': node_id,
-                        'label': ''
-                    })
-                    
-                    prev_id = node_id
-                    y_pos += 100
-                
-                elif isinstance(node, ast.If):
-                    node_id = self.generate_node_id()
-                    condition = ast.unparse(node.test) if hasattr(ast, 'unparse') else 'condition'
-                    
-                    nodes.append({
-                        'id': node_id,
-                        'type': 'decision',
-                        'label': f"If {condition}",
-                        'x': 100,
-                        'y': y_pos
-                    })
-                    
-                    edges.append({
-                        'from': prev_id,
-                        'to': node_id,
-                        'label': ''
-                    })
-                    
-                    prev_id = node_id
-                    y_pos += 100
-                
-                elif isinstance(node, ast.For):
-                    node_id = self.generate_node_id()
-                    target = ast.unparse(node.target) if hasattr(ast, 'unparse') else 'item'
-                    iter_obj = ast.unparse(node.iter) if hasattr(ast, 'unparse') else 'iterable'
-                    
-                    nodes.append({
-                        'id': node_id,
-                        'type': 'loop',
-                        'label': f"For {target} in {iter_obj}",
-                        'x': 100,
-                        'y': y_pos
-                    })
-                    
-                    edges.append({
-                        'from': prev_id,
-                        'to': node_id,
-                        'label': ''
-                    })
-                    
-                    prev_id = node_id
-                    y_pos += 100
-                
-                elif isinstance(node, ast.While):
-                    node_id = self.generate_node_id()
-                    condition = ast.unparse(node.test) if hasattr(ast, 'unparse') else 'condition'
-                    
-                    nodes.append({
-                        'id': node_id,
-                        'type': 'loop',
-                        'label': f"While {condition}",
-                        'x': 100,
-                        'y': y_pos
-                    })
-                    
-                    edges.append({
-                        'from': prev_id,
-                        'to': node_id,
-                        'label': ''
-                    })
-                    
-                    prev_id = node_id
-                    y_pos += 100
+            if isinstance(statement, ast.If):
+                test_lines = (statement.lineno, statement.test.end_lineno)
+                if first is None or first.lineno <= test_lines[1]:
+                    continue  # Body shares a line with the test: branches are indistinguishable
+                true_count = false_count = 0
+                for start, end, count in arcs:
+                    if test_lines[0] <= start <= test_lines[1] and not test_lines[0] <= end <= test_lines[1]:
+                        if end == first.lineno:
+                            true_count += count
+                        else:
+                            false_count += count
+                nodes[node['id']] = {
+                    'executions': true_count + false_count,
+                    'true': true_count,
+                    'false': false_count
+                }
             
-            # End node
-            end_id = self.generate_node_id()
-            nodes.append({
-                'id': end_id,
-                'type': 'end',
-                'label': 'End',
-                'x': 100,
-                'y': y_pos
-            })
+            elif isinstance(statement, (ast.For, ast.While)):
+                if first is None or first.lineno == statement.lineno:
+                    continue
+                nodes[node['id']] = {
+                    'executions': arcs_into(statement.lineno, span(statement)),
+                    'iterations': arcs_into(first.lineno, span(first))
+                }
             
-            edges.append({
-                'from': prev_id,
-                'to': end_id,
-                'label': ''
-            })
+            elif isinstance(statement, ast.FunctionDef):
+                first_line = min([d.lineno for d in statement.decorator_list] + [statement.lineno])
+                nodes[node['id']] = {'executions': calls.get(first_line, 0)}
             
-            return {
-                'nodes': nodes,
-                'edges': edges,
-                'title': 'Code Flow Diagram'
+            else:
+                nodes[node['id']] = {'executions': arcs_into(statement.lineno, span(statement))}
+        
+        edges = [
+            {
+                'from': edge['from'],
+                'to': edge['to'],
+                'weight': nodes[edge['to']]['executions'] if edge['to'] in nodes else None
             }
-            
-        except SyntaxError as e:
-            # Return error flowchart
-            return self._generate_error_flowchart(f"Syntax Error: {str(e)}")
+            for edge in flowchart.get('edges', [])
+        ]
+        
+        # Counts are partial when tracing hit its event budget
+        return {'nodes': nodes, 'edges': edges, 'truncated': bool(coverage.get('truncated'))}
     
     def _analyze_problem_steps(self, problem: str) -> List[str]:
         """Analyze problem and extract logical steps"""
@@ -280,3 +283,112 @@ class FlowchartGenerator:
             'edges': [],
             'title': 'Error in Code'
         }
+
+
+class CodeFlowchartBuilder(NodeVisitor):
+    """Build a code flowchart from the nodes of one AST walk
+    
+    Definitions, ifs and loops become one node each, chained in walk
+    order between Start and End. The builder keeps its own node ids, so
+    builders for different requests can run at the same time.
+    """
+    
+    node_types = (ast.FunctionDef, ast.ClassDef, ast.If, ast.For, ast.While)
+    
+    def __init__(self, skip_lines: Optional[Set[int]] = None):
+        self.node_id_counter = 0
+        self.nodes = []
+        self.edges = []
+        # Lines whose statements are stand-ins for broken code (see recovery)
+        self.skip_lines = skip_lines or set()
+        
+        # Start node
+        self.prev_id = self.generate_node_id()
+        self.nodes.append({
+            'id': self.prev_id,
+            'type': 'start',
+            'label': 'Start',
+            'x': 100,
+            'y': 50
+        })
+        self.y_pos = 150
+    
+    def generate_node_id(self):
+        """Generate unique node ID"""
+        self.node_id_counter += 1
+        return f"node_{self.node_id_counter}"
+    
+    def visit(self, node: ast.AST):
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            self._add('process', f"Define {node.name}", node)
+        elif isinstance(node, ast.If):
+            condition = safe_unparse(node.test) if hasattr(ast, 'unparse') else 'condition'
+            self._add('decision', f"If {condition}", node)
+        elif isinstance(node, ast.For):
+            target = safe_unparse(node.target) if hasattr(ast, 'unparse') else 'item'
+            iter_obj = safe_unparse(node.iter) if hasattr(ast, 'unparse') else 'iterable'
+            self._add('loop', f"For {target} in {iter_obj}", node)
+        elif isinstance(node, ast.While):
+            condition = safe_unparse(node.test) if hasattr(ast, 'unparse') else 'condition'
+            self._add('loop', f"While {condition}", node)
+    
+    def add_error(self, line: int, message: str):
+        """Add a node for a syntax error to the chain"""
+        self._append({
+            'type': 'error',
+            'label': f"Syntax Error: {message}",
+            'line': line,
+            'end_line': line
+        })
+    
+    def _add(self, node_type: str, label: str, node: ast.AST):
+        if node.lineno in self.skip_lines:
+            return
+        self._append({
+            'type': node_type,
+            'label': label,
+            'line': node.lineno,
+            'end_line': node.end_lineno
+        })
+    
+    def _append(self, fields: Dict[str, Any]):
+        node_id = self.generate_node_id()
+        
+        self.nodes.append({
+            'id': node_id,
+            **fields,
+            'x': 100,
+            'y': self.y_pos
+        })
+        
+        self.edges.append({
+            'from': self.prev_id,
+            'to': node_id,
+            'label': ''
+        })
+        
+        self.prev_id = node_id
+        self.y_pos += 100
+    
+    def flowchart(self, title: str = 'Code Flow Diagram') -> Dict[str, Any]:
+        """Close the chart with an End node and return it"""
+        end_id = self.generate_node_id()
+        nodes = self.nodes + [{
+            'id': end_id,
+            'type': 'end',
+            'label': 'End',
+            'x': 100,
+            'y': self.y_pos
+        }]
+        
+        edges = self.edges + [{
+            'from': self.prev_id,
+            'to': end_id,
+            'label': ''
+        }]
+        
+        return {
+            'nodes': nodes,
+            'edges': edges,
+            'title': title
+        }
@@ -0,0 +1,109 @@
+# Grader Module - Run one submission against many test cases
+import time
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+# Upper bound on test cases accepted in one grading request
+MAX_TEST_CASES = 50
+
+
+class Grader:
+    """Grade a submission against test cases, running cases in parallel on the sandbox pool"""
+
+    def __init__(self, code_executor, max_parallel: Optional[int] = None):
+        self.code_executor = code_executor
+        if max_parallel is None:
+            max_parallel = code_executor.pool.size if code_executor.pool else 1
+        # Shared by all requests; the sandbox pool itself caps real concurrency
+        self._threads = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='grader')
+
+    def validate(self, test_cases: Any) -> Optional[str]:
+        """Return an error message if the test cases are malformed"""
+        if not isinstance(test_cases, list) or not test_cases:
+            return 'test_cases must be a non-empty list'
+        if len(test_cases) > MAX_TEST_CASES:
+            return f'Too many test cases (maximum is {MAX_TEST_CASES})'
+
+        for i, case in enumerate(test_cases, 1):
+            if not isinstance(case, dict):
+                return f'Test case {i} must be an object'
+            if 'expected_output' not in case and 'expected_return' not in case:
+                return f'Test case {i} needs expected_output or expected_return'
+            if 'stdin' in case and not isinstance(case['stdin'], str):
+                return f'Test case {i}: stdin must be a string'
+            call = case.get('call')
+            if call is not None:
+                if not isinstance(call, dict) or not isinstance(call.get('function'), str):
+                    return f'Test case {i}: call needs a function name'
+                if not isinstance(call.get('args', []), list) or not isinstance(call.get('kwargs', {}), dict):
+                    return f'Test case {i}: call args must be a list and kwargs an object'
+            elif 'expected_return' in case:
+                return f'Test case {i}: expected_return requires a call'
+        return None
+
+    def grade(self, code: str, test_cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run every test case and return per-case results plus a summary"""
+        start_time = time.perf_counter()
+
+        # Compile once up front so the parallel cases all hit the code cache
+        try:
+            self.code_executor.compile_code(code)
+        except SyntaxError:
+            pass  # Each case reports the compile error
+
+        futures = [
+            self._threads.submit(self._run_case, code, i, case)
+            for i, case in enumerate(test_cases)
+        ]
+        cases = [future.result() for future in futures]
+        passed = sum(1 for case in cases if case['passed'])
+
+        return {
+            'passed': passed,
+            'total': len(cases),
+            'all_passed': passed == len(cases),
+            'cases': cases,
+            'execution_time': round(time.perf_counter() - start_time, 3)
+        }
+
+    def _run_case(self, code: str, index: int, case: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.code_executor.execute_code(code, stdin=case.get('stdin'), call=case.get('call'),
+                                                 coverage=False)
+
+        checks = []
+        diff = None
+
+        if 'expected_output' in case:
+            expected = _normalize_output(case['expected_output'])
+            actual = _normalize_output(result.get('output') or '')
+            checks.append(expected == actual)
+            if expected != actual:
+                diff = ''.join(difflib.unified_diff(
+                    expected.splitlines(keepends=True),
+                    actual.splitlines(keepends=True),
+                    fromfile='expected', tofile='actual'
+                ))
+
+        if 'expected_return' in case:
+            checks.append(result.get('success') and result.get('return_value') == case['expected_return'])
+
+        return {
+            'name': case.get('name', f'Test {index + 1}'),
+            'passed': bool(result.get('success')) and all(checks),
+            'execution_time': result.get('execution_time', 0),
+            'output': result.get('output', ''),
+            'error': result.get('error'),
+            'limit_exceeded': result.get('limit_exceeded'),
+            'return_value': result.get('return_value'),
+            'expected_return': case.get('expected_return'),
+            'diff': diff
+        }
+
+
+def _normalize_output(text: str) -> str:
+    """Ignore trailing whitespace on each line and trailing blank lines"""
+    lines = [line.rstrip() for line in str(text).splitlines()]
+    while lines and not lines[-1]:
+        lines.pop()
+    return '\n'.join(lines) + '\n' if lines else ''
@@ -0,0 +1,333 @@
+# Incremental Analysis Module - Re-analyze only the top-level statements that changed
+import os
+import ast
+import hashlib
+import threading
+from typing import Callable, Dict, List, Any, Optional, Sequence, Set, Tuple
+
+from cache import LRUCache
+from flowchart_generator import CodeFlowchartBuilder
+from scopes import SymbolSummary, collect_symbols, resolve_symbols
+from antipatterns import AntipatternSummary, collect_antipatterns, resolve_antipatterns
+from ast_pipeline import measure, parse, walk
+from recovery import recover
+
+
+class VersionMismatch(Exception):
+    """Raised when edits are based on a document version the server does not have"""
+
+
+class DocumentRejected(Exception):
+    """Raised when a document, as edited, is over the limits it is admitted under"""
+
+    def __init__(self, reasons: List[Dict[str, Any]]):
+        super().__init__(reasons[0]['message'])
+        self.reasons = reasons
+
+
+class Segment:
+    """A run of lines holding top-level statements, plus the blank and comment lines before them"""
+
+    def __init__(self, segment_id: str, start: int, end: int, analysis: Dict[str, Any]):
+        self.id = segment_id
+        self.start = start  # first line, 1-based
+        self.end = end  # last line, inclusive
+        self.analysis = analysis  # issues and flowchart fragment, lines relative to start
+
+
+class Document:
+    """The server's copy of one client's editor contents"""
+
+    def __init__(self):
+        self.version = None
+        self.lines: List[str] = []
+        self.segments: List[Segment] = []  # cover every line, in order
+        self.syntax_error: Optional[Dict[str, Any]] = None
+        self.syntax_errors: List[Dict[str, Any]] = []  # every one recovery finds
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+
+def apply_edits(lines: List[str], edits: List[Dict[str, Any]]) -> List[str]:
+    """Apply editor changes in order and return the new lines.
+
+    Each edit is a CodeMirror change: ``{'from': {'line', 'ch'}, 'to':
+    {'line', 'ch'}, 'text': [lines]}`` with 0-based positions. Raises
+    ValueError for edits that do not fit the document.
+    """
+    lines = list(lines) or ['']
+    for edit in edits:
+        try:
+            start_line, start_ch = int(edit['from']['line']), int(edit['from']['ch'])
+            end_line, end_ch = int(edit['to']['line']), int(edit['to']['ch'])
+            text = [str(part) for part in edit['text']] or ['']
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Malformed edit')
+        if not 0 <= start_line <= end_line < len(lines):
+            raise ValueError('Edit is outside the document')
+
+        text[0] = lines[start_line][:start_ch] + text[0]
+        text[-1] = text[-1] + lines[end_line][end_ch:]
+        lines[start_line:end_line + 1] = text
+    return lines
+
+
+class IncrementalAnalyzer:
+    """Keep each client's document and re-check only what an edit touched.
+
+    The document is split into segments, one per top-level statement. After
+    an edit only the segments overlapping the changed lines are re-parsed
+    (widened to their neighbours, then to the whole file, if that part does
+    not parse on its own) and checked with the executor's rules; the other
+    segments keep their results and just move. Segment results are also
+    cached by content, so re-typing a statement seen before costs a parse
+    and no checks. Checks that span segments (undefined names, and slow
+    patterns that hinge on types assigned earlier) are resolved from
+    per-segment summaries without re-reading any code. While the document
+    has syntax errors, every edit re-parses it with recovery.recover: the
+    segments that parse are charted and checked as usual, and those holding
+    lines recovery skipped chart what is left plus a node per syntax error.
+    ``analyze`` returns the changes as a delta.
+    """
+
+    def __init__(self, code_executor, max_documents: Optional[int] = None, cache_size: Optional[int] = None):
+        self.rules = code_executor.rules
+        if max_documents is None:
+            max_documents = int(os.environ.get('ANALYSIS_MAX_DOCUMENTS', 500))
+        if cache_size is None:
+            cache_size = int(os.environ.get('ANALYSIS_CACHE_SIZE', 4096))
+        self.documents = LRUCache(max_entries=max_documents)
+        self.segment_cache = LRUCache(max_entries=cache_size)
+        self._lock = threading.Lock()
+
+    def analyze(self, client: str, version: int, code: Optional[str] = None,
+                edits: Optional[List[Dict[str, Any]]] = None,
+                base_version: Optional[int] = None,
+                admit: Optional[Callable[[str], List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+        """Bring the client's document to ``version`` and return what changed.
+
+        Send the full ``code`` to (re)start a document, or the ``edits``
+        made since ``base_version``. Raises VersionMismatch when the server
+        does not have ``base_version`` (the client should resend the code).
+        ``admit`` is given the new text, edits applied, and returns the
+        reasons to reject it; if there are any the document is left as it
+        was and DocumentRejected is raised.
+        """
+        with self._lock:
+            document = self.documents.get(client)
+            if document is None:
+                document = Document()
+                self.documents.put(client, document)
+
+        with document.lock:
+            if code is not None:
+                lines = code.split('\n')
+            elif document.version is None or document.version != base_version:
+                raise VersionMismatch('Document is out of date, send the full code')
+            else:
+                lines = apply_edits(document.lines, edits or [])
+
+            if admit is not None:
+                reasons = admit('\n'.join(lines))
+                if reasons:
+                    raise DocumentRejected(reasons)
+
+            delta = self._update(document, lines)
+            document.version = version
+            delta['version'] = version
+            return delta
+
+    def _update(self, document: Document, lines: List[str]) -> Dict[str, Any]:
+        old_lines, segments = document.lines, document.segments
+        delta = {'removed': [], 'added': [], 'moved': [], 'reparsed_lines': 0}
+
+        if document.version is not None and lines == old_lines:
+            delta['order'] = [segment.id for segment in segments]
+            delta['syntax_error'] = document.syntax_error
+            delta['syntax_errors'] = document.syntax_errors
+            delta['program_issues'] = self._program_issues(document)
+            return delta
+
+        # Lines unchanged at the start and end of the document
+        limit = min(len(old_lines), len(lines))
+        prefix = 0
+        while prefix < limit and old_lines[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old_lines[-1 - suffix] == lines[-1 - suffix]:
+            suffix += 1
+        shift = len(lines) - len(old_lines)
+
+        attempts = []
+        if segments and not document.syntax_error:
+            # Changed old lines (1-based); a pure insertion touches the segment it lands in
+            first_changed = min(prefix + 1, len(old_lines))
+            last_changed = max(len(old_lines) - suffix, first_changed)
+            first = next(i for i, s in enumerate(segments) if s.end >= first_changed)
+            last = next(i for i, s in enumerate(segments) if s.end >= last_changed)
+            attempts.append((first, last))
+            if first > 0 or last < len(segments) - 1:
+                attempts.append((max(first - 1, 0), min(last + 1, len(segments) - 1)))
+
+        tree = None
+        for first, last in attempts:
+            start, end = segments[first].start, segments[last].end + shift
+            try:
+                tree = parse('\n'.join(lines[start - 1:end]))
+                break
+            except SyntaxError:
+                tree = None
+
+        syntax_error = None
+        syntax_errors = []
+        skipped_lines: Set[int] = set()
+        if tree is None:
+            # The edit changed how the surrounding code parses; start over
+            first, last = 0, len(segments) - 1
+            start, end = 1, len(lines)
+            try:
+                tree = parse('\n'.join(lines))
+            except SyntaxError as e:
+                syntax_error = {
+                    'type': 'syntax_error',
+                    'line': e.lineno or 1,
+                    'message': str(e),
+                    'severity': 'error'
+                }
+                recovery = recover('\n'.join(lines))
+                syntax_errors = recovery.errors
+                skipped_lines = recovery.skipped_lines
+                tree = recovery.tree or ast.Module(body=[], type_ignores=[])
+
+        removed = segments[first:last + 1]
+        delta['removed'] = [segment.id for segment in removed]
+        added = self._segments_for(document, tree, lines[start - 1:end], start, syntax_errors, skipped_lines)
+        delta['reparsed_lines'] = end - start + 1
+        delta['added'] = [self._describe(segment) for segment in added]
+
+        following = segments[last + 1:]
+        if shift:
+            for segment in following:
+                segment.start += shift
+                segment.end += shift
+                delta['moved'].append({'id': segment.id, 'start_line': segment.start, 'end_line': segment.end})
+
+        document.lines = lines
+        document.segments = segments[:first] + added + following
+        document.syntax_error = syntax_error
+        document.syntax_errors = syntax_errors
+        delta['order'] = [segment.id for segment in document.segments]
+        delta['syntax_error'] = syntax_error
+        delta['syntax_errors'] = syntax_errors
+        delta['program_issues'] = self._program_issues(document)
+        return delta
+
+    def _program_issues(self, document: Document) -> List[Dict[str, Any]]:
+        """Issues that depend on more than one segment, from the segments' symbol summaries"""
+        if document.syntax_error:
+            return []
+        issues = resolve_symbols((segment.analysis['symbols'], segment.start - 1)
+                                 for segment in document.segments)
+        issues += resolve_antipatterns((segment.analysis['antipatterns'], segment.start - 1)
+                                       for segment in document.segments)
+        issues.sort(key=lambda issue: issue['line'])
+        return issues
+
+    def _segments_for(self, document: Document, tree: ast.Module, lines: List[str], offset: int,
+                      syntax_errors: Sequence[Dict[str, Any]] = (),
+                      skipped_lines: Set[int] = frozenset()) -> List[Segment]:
+        """Split a parsed run of lines into segments and analyze each one.
+
+        For a tree from recovery.recover, pass its ``syntax_errors`` and
+        ``skipped_lines`` (document line numbers); each goes to the segment
+        holding its line.
+        """
+        groups: List[Tuple[int, int, List[ast.stmt]]] = []  # first line, last line, statements
+        for statement in tree.body:
+            first = min([statement.lineno] + [d.lineno for d in getattr(statement, 'decorator_list', [])])
+            if groups and first <= groups[-1][1]:
+                # Statements sharing a line (a; b) stay together
+                groups[-1][2].append(statement)
+                groups[-1] = (groups[-1][0], max(groups[-1][1], statement.end_lineno), groups[-1][2])
+            else:
+                groups.append((first, statement.end_lineno, [statement]))
+
+        if not groups:
+            groups.append((1, len(lines), []))
+
+        segments = []
+        start = 1
+        for i, (_, last, statements) in enumerate(groups):
+            # Trailing blank and comment lines go with the last statement
+            end = len(lines) if i == len(groups) - 1 else last
+            # Recovery's line numbers, relative to the segment
+            shift = offset + start - 2
+            errors = [dict(error, line=error['line'] - shift) for error in syntax_errors
+                      if start <= error['line'] - offset + 1 <= end]
+            skipped = {line - shift for line in skipped_lines if start <= line - offset + 1 <= end}
+            segments.append(self._segment(document, lines[start - 1:end], statements, start, offset,
+                                          errors, skipped))
+            start = end + 1
+        return segments
+
+    def _segment(self, document: Document, lines: List[str], statements: List[ast.stmt],
+                 start: int, offset: int, syntax_errors: Sequence[Dict[str, Any]] = (),
+                 skipped_lines: Set[int] = frozenset()) -> Segment:
+        text = '\n'.join(lines)
+        if syntax_errors or skipped_lines:
+            # Part of it is recovery's stand-ins: chart the rest, add the errors
+            # and check nothing more, as analyze_code does for code that does not parse
+            module = ast.Module(body=statements, type_ignores=[])
+            ast.increment_lineno(module, 1 - start)
+            builder = CodeFlowchartBuilder(skip_lines=skipped_lines)
+            walk(module, [builder])
+            for error in syntax_errors:
+                builder.add_error(error['line'], error['message'])
+            analysis = {'issues': list(syntax_errors), 'nodes': builder.nodes[1:], 'edges': builder.edges[1:],
+                        'symbols': SymbolSummary(), 'antipatterns': AntipatternSummary()}
+        else:
+            key = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+            analysis = self.segment_cache.get(key)
+            if analysis is None:
+                module = ast.Module(body=statements, type_ignores=[])
+                ast.increment_lineno(module, 1 - start)
+                builder = CodeFlowchartBuilder()
+                size = measure(module)
+                issues = self.rules.run(text, module, [builder], whole_program=False, size=size)
+                # Drop the builder's Start node and the edge from it; a segment too
+                # deep to walk whole binds and needs nothing as far as the checks know
+                analysis = {'issues': issues, 'nodes': builder.nodes[1:], 'edges': builder.edges[1:],
+                            'symbols': SymbolSummary() if size.truncated else collect_symbols(module),
+                            'antipatterns': AntipatternSummary() if size.truncated else collect_antipatterns(module)}
+                self.segment_cache.put(key, analysis)
+
+        document.next_id += 1
+        first_line = offset + start - 1
+        return Segment(f's{document.next_id}', first_line, first_line + len(lines) - 1, analysis)
+
+    def _describe(self, segment: Segment) -> Dict[str, Any]:
+        """A segment's issues and flowchart fragment with document line numbers and ids"""
+        shift = segment.start - 1
+
+        def node_id(local_id):
+            return f'{segment.id}_{local_id}'
+
+        analysis = segment.analysis
+        return {
+            'id': segment.id,
+            'start_line': segment.start,
+            'end_line': segment.end,
+            'issues': [dict(issue, line=issue['line'] + shift) for issue in analysis['issues']],
+            'nodes': [dict(node, id=node_id(node['id']), line=node['line'] + shift,
+                           end_line=node['end_line'] + shift)
+                      for node in analysis['nodes']],
+            'edges': [dict(edge, **{'from': node_id(edge['from']), 'to': node_id(edge['to'])})
+                      for edge in analysis['edges']]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return document and segment cache counters"""
+        return {
+            'documents': len(self.documents),
+            'segment_cache': self.segment_cache.stats()
+        }
@@ -0,0 +1,227 @@
+# Job Queue Module - Asynchronous code execution with fair per-client scheduling
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue (or the client's share) is full"""
+
+
+class Job:
+    """One submitted execution and everything it has produced so far"""
+
+    def __init__(self, client: str, code: str):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.code = code
+        self.status = 'queued'  # queued -> running -> done
+        self.output: List[str] = []  # stdout chunks in arrival order, for subscribers
+        self.result: Optional[Dict[str, Any]] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.changed = threading.Condition()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result
+        }
+
+
+class JobQueue:
+    """Run submitted code in the background, sharing workers fairly between clients.
+
+    Each client has its own FIFO of pending jobs. Dispatcher threads (one
+    per sandbox worker) take jobs from the clients in round-robin order, so
+    a client that submits many slow programs only ever delays others by
+    one job per turn. The total number of pending jobs and the number per
+    client are capped; finished jobs are kept for ``retention`` seconds so
+    clients can poll for them.
+    """
+
+    def __init__(self, code_executor, workers: Optional[int] = None, max_depth: Optional[int] = None,
+                 max_per_client: Optional[int] = None, retention: Optional[float] = None):
+        self.code_executor = code_executor
+        if workers is None:
+            workers = code_executor.pool.size if code_executor.pool else 1
+        self.workers = workers
+        if max_depth is None:
+            max_depth = int(os.environ.get('JOB_QUEUE_DEPTH', 100))
+        if max_per_client is None:
+            max_per_client = int(os.environ.get('JOB_QUEUE_PER_CLIENT', 10))
+        if retention is None:
+            retention = float(os.environ.get('JOB_RETENTION', 300))
+        self.max_depth = max_depth
+        self.max_per_client = max_per_client
+        self.retention = retention
+
+        self._pending = OrderedDict()  # client -> deque of jobs, in round-robin order
+        self._depth = 0
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Condition()
+        self._closed = False
+        self.jobs_submitted = 0
+        self.jobs_rejected = 0
+        self.jobs_completed = 0
+
+        self._threads = [
+            threading.Thread(target=self._dispatch, name=f'job-dispatcher-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, code: str, client: str) -> Job:
+        """Queue code for execution and return its job right away"""
+        with self._lock:
+            self._purge_finished()
+            pending = self._pending.get(client)
+            if self._depth >= self.max_depth:
+                self.jobs_rejected += 1
+                raise QueueFull('Server is busy, please try again in a moment')
+            if pending is not None and len(pending) >= self.max_per_client:
+                self.jobs_rejected += 1
+                raise QueueFull(f'Too many pending jobs (maximum is {self.max_per_client})')
+
+            job = Job(client, code)
+            if pending is None:
+                # New clients join at the end of the rotation
+                pending = self._pending[client] = deque()
+            pending.append(job)
+            self._depth += 1
+            self._jobs[job.id] = job
+            self.jobs_submitted += 1
+            self._lock.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> Optional[int]:
+        """Number of jobs that will start before this one, or None once it has started"""
+        with self._lock:
+            if job.status != 'queued':
+                return None
+            queues = [list(jobs) for jobs in self._pending.values()]
+            ahead = 0
+            # Replay the round-robin order until we reach the job
+            for turn in range(max((len(jobs) for jobs in queues), default=0)):
+                for jobs in queues:
+                    if turn < len(jobs):
+                        if jobs[turn] is job:
+                            return ahead
+                        ahead += 1
+            return None
+
+    def events(self, job: Job, heartbeat: Optional[float] = None) -> Iterator[Tuple[str, Any]]:
+        """Yield a job's output from the start, then its result.
+
+        Yields ``('stdout', text)`` chunks, ``('heartbeat', None)`` after
+        every ``heartbeat`` seconds without news, and finally
+        ``('result', dict)``. Subscribing never affects the job itself.
+        """
+        sent = 0
+        while True:
+            with job.changed:
+                if sent == len(job.output) and job.status != 'done':
+                    job.changed.wait(heartbeat)
+                chunks = job.output[sent:]
+                done = job.status == 'done'
+            sent += len(chunks)
+
+            for chunk in chunks:
+                yield 'stdout', chunk
+            if done:
+                yield 'result', job.result
+                return
+            if not chunks:
+                yield 'heartbeat', None
+
+    def _next_job(self) -> Optional[Job]:
+        with self._lock:
+            while not self._pending and not self._closed:
+                self._lock.wait()
+            if self._closed:
+                return None
+
+            # Take one job from the client at the front, then send it to the back
+            client, pending = self._pending.popitem(last=False)
+            job = pending.popleft()
+            if pending:
+                self._pending[client] = pending
+            self._depth -= 1
+
+        with job.changed:
+            job.status = 'running'
+            job.started_at = time.time()
+            job.changed.notify_all()
+        return job
+
+    def _dispatch(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            result = None
+            try:
+                for kind, payload in self.code_executor.execute_code_stream(job.code):
+                    if kind == 'stdout':
+                        with job.changed:
+                            job.output.append(payload)
+                            job.changed.notify_all()
+                    elif kind == 'result':
+                        result = payload
+            except Exception as e:
+                result = {
+                    'success': False,
+                    'error': str(e),
+                    'output': '',
+                    'execution_time': 0
+                }
+
+            with job.changed:
+                job.result = result
+                job.status = 'done'
+                job.finished_at = time.time()
+                job.changed.notify_all()
+            with self._lock:
+                self.jobs_completed += 1
+
+    def _purge_finished(self):
+        """Forget finished jobs older than the retention period (lock held)"""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue counters"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queued': self._depth,
+                'clients_waiting': len(self._pending),
+                'max_depth': self.max_depth,
+                'max_per_client': self.max_per_client,
+                'jobs_submitted': self.jobs_submitted,
+                'jobs_rejected': self.jobs_rejected,
+                'jobs_completed': self.jobs_completed
+            }
+
+    def shutdown(self):
+        """Stop the dispatchers once their current jobs finish"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
@@ -0,0 +1,283 @@
+# Kernels Module - Persistent per-session namespaces for cell-by-cell execution
+import os
+import copy
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from sandbox import run_code, current_address_space, limit_exceeded_result
+from sandbox_pool import SandboxWorker, WorkerCrashed, WorkerTimeout, KILL_GRACE_SECONDS, _default_context
+
+# Most variable names reported back after each cell
+MAX_VARIABLES_REPORTED = 200
+
+
+def _kernel_main(conn, memory_bytes: Optional[int]):
+    """Kernel process loop: run every cell in one namespace that lives as long as the process"""
+    exec_globals = {}
+    baseline = current_address_space()
+
+    def used_memory() -> Optional[int]:
+        if baseline is None:
+            return None
+        return max(current_address_space() - baseline, 0)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if job is None:
+            break
+
+        budget = copy.copy(job.pop('budget'))
+        used = used_memory()
+        if memory_bytes and used is not None:
+            # The cap covers everything the kernel holds, not just this cell
+            budget.memory_bytes = memory_bytes - used
+
+        if budget.memory_bytes is not None and budget.memory_bytes <= 0:
+            budget.memory_bytes = memory_bytes
+            result = limit_exceeded_result('memory', budget)
+            result['kernel_exhausted'] = True
+        else:
+            result = run_code(enforce_process_limits=True, budget=budget, exec_globals=exec_globals, **job)
+            if memory_bytes and (used_memory() or 0) > memory_bytes:
+                # Allocation reused freed address space; the kernel is over its cap all the same
+                result['kernel_exhausted'] = True
+
+        result['kernel'] = {
+            'memory_bytes': used_memory(),
+            'variables': sorted(name for name in exec_globals if not name.startswith('__'))[:MAX_VARIABLES_REPORTED]
+        }
+        conn.send(('result', result))
+
+    conn.close()
+
+
+class KernelLimitReached(Exception):
+    """Raised when every kernel slot is taken by a kernel that is running a cell"""
+
+
+class Kernel:
+    """A dedicated sandbox process whose globals survive between cells"""
+
+    def __init__(self, owner: str, context, memory_bytes: Optional[int]):
+        self.owner = owner
+        self.context = context
+        self.memory_bytes = memory_bytes
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.cells_run = 0
+        self.closed = False
+        self.lock = threading.Lock()  # one cell at a time
+        self._start()
+
+    def _start(self):
+        self.worker = SandboxWorker(self.context, target=_kernel_main, args=(self.memory_bytes,))
+
+    def restart(self):
+        """Replace the process, dropping all state"""
+        self.worker.kill()
+        self._start()
+        self.cells_run = 0
+
+    def shutdown(self):
+        self.closed = True
+        self.worker.stop()
+
+
+class KernelManager:
+    """One kernel per session, bounded in number, memory and idle time.
+
+    Running a cell in a session's kernel reuses everything earlier cells
+    defined, so expensive setup only runs once. When all ``max_kernels``
+    slots are taken the least recently used idle kernel is evicted; kernels
+    idle for ``idle_timeout`` seconds are shut down by a reaper thread.
+    Each kernel process may hold at most ``memory_bytes`` more than it
+    started with; a kernel that runs out is restarted.
+    """
+
+    def __init__(self, code_executor, max_kernels: Optional[int] = None,
+                 idle_timeout: Optional[float] = None, memory_bytes: Optional[int] = None,
+                 context=None):
+        self.code_executor = code_executor
+        if max_kernels is None:
+            max_kernels = int(os.environ.get('KERNEL_MAX', 20))
+        if idle_timeout is None:
+            idle_timeout = float(os.environ.get('KERNEL_IDLE_TIMEOUT', 600))
+        if memory_bytes is None:
+            memory_bytes = int(os.environ.get('KERNEL_MEMORY_MB', 512)) * 1024 * 1024
+        self.max_kernels = max_kernels
+        self.idle_timeout = idle_timeout
+        self.memory_bytes = memory_bytes
+        self.context = context or _default_context()
+
+        self._kernels = OrderedDict()  # owner -> Kernel, least recently used first
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.kernels_started = 0
+        self.kernels_evicted = 0
+        self.kernels_restarted = 0
+
+        self._reaper = threading.Thread(target=self._reap, name='kernel-reaper', daemon=True)
+        self._reaper.start()
+        atexit.register(self.shutdown)
+
+    def execute(self, owner: str, code: str) -> Dict[str, Any]:
+        """Run a cell in the owner's kernel, starting one if needed"""
+        try:
+            compiled = self.code_executor.compile_code(code)
+        except SyntaxError as e:
+            return self.code_executor._compile_error_result(e)
+        if compiled is None:
+            return {
+                'success': False,
+                'error': 'Code contains potentially dangerous imports',
+                'output': '',
+                'execution_time': 0
+            }
+
+        budget = self.code_executor.budget
+        job = {
+            'code': compiled.marshalled,
+            'budget': budget
+        }
+        timeout = budget.wall_time + KILL_GRACE_SECONDS if budget.wall_time else None
+
+        while True:
+            kernel, created = self._kernel_for(owner)
+            with kernel.lock:
+                if kernel.closed:
+                    continue  # Evicted between lookup and lock; get a fresh one
+
+                start_time = time.perf_counter()
+                restarted = False
+                try:
+                    result = kernel.worker.run(job, timeout=timeout)
+                except WorkerTimeout:
+                    elapsed = round(time.perf_counter() - start_time, 3)
+                    result = limit_exceeded_result('wall_time', budget, usage={'wall_time': elapsed})
+                    restarted = True
+                except WorkerCrashed:
+                    result = {
+                        'success': False,
+                        'error': 'Kernel crashed while running the code',
+                        'output': '',
+                        'execution_time': round(time.perf_counter() - start_time, 3)
+                    }
+                    restarted = True
+
+                if restarted or result.pop('kernel_exhausted', False):
+                    kernel.restart()
+                    with self._lock:
+                        self.kernels_restarted += 1
+                    restarted = True
+                else:
+                    kernel.cells_run += 1
+                kernel.last_used = time.monotonic()
+
+            result.setdefault('kernel', {})
+            # Tell the client when earlier definitions are gone
+            result['kernel'].update({'new': created, 'restarted': restarted, 'cells_run': kernel.cells_run})
+            return result
+
+    def reset(self, owner: str) -> bool:
+        """Shut down the owner's kernel; the next cell starts from scratch"""
+        with self._lock:
+            kernel = self._kernels.pop(owner, None)
+        if kernel is None:
+            return False
+        with kernel.lock:
+            kernel.shutdown()
+        return True
+
+    def _kernel_for(self, owner: str):
+        with self._lock:
+            kernel = self._kernels.get(owner)
+            if kernel is not None:
+                self._kernels.move_to_end(owner)
+                return kernel, False
+            self._check_room()
+
+        # Starting a process is slow; other sessions keep using the manager meanwhile
+        kernel = Kernel(owner, self.context, self.memory_bytes)
+        evicted = []
+        try:
+            with self._lock:
+                existing = self._kernels.get(owner)
+                if existing is not None:
+                    # Another request from this session got there first
+                    self._kernels.move_to_end(owner)
+                    evicted.append(kernel)
+                    return existing, False
+
+                while len(self._kernels) >= self.max_kernels:
+                    evicted.append(self._kernels.pop(self._check_room()))
+                    self.kernels_evicted += 1
+
+                self._kernels[owner] = kernel
+                self.kernels_started += 1
+        except KernelLimitReached:
+            evicted.append(kernel)
+            raise
+        finally:
+            for old in evicted:
+                with old.lock:
+                    old.shutdown()
+        return kernel, True
+
+    def _check_room(self) -> Optional[str]:
+        """The idle kernel to evict when every slot is taken (call with the lock held)"""
+        if len(self._kernels) < self.max_kernels:
+            return None
+        idle = next((key for key, k in self._kernels.items() if not k.lock.locked()), None)
+        if idle is None:
+            raise KernelLimitReached('All kernels are busy, please try again in a moment')
+        return idle
+
+    def evict_idle(self) -> int:
+        """Shut down kernels unused for longer than the idle timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            expired = [owner for owner, kernel in self._kernels.items()
+                       if kernel.last_used < cutoff and not kernel.lock.locked()]
+            kernels = [self._kernels.pop(owner) for owner in expired]
+            self.kernels_evicted += len(kernels)
+
+        for kernel in kernels:
+            with kernel.lock:
+                kernel.shutdown()
+        return len(kernels)
+
+    def _reap(self):
+        interval = max(min(self.idle_timeout / 4, 60), 1)
+        while not self._stopped.wait(interval):
+            self.evict_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return kernel counters"""
+        with self._lock:
+            kernels = list(self._kernels.values())
+        return {
+            'kernels': len(kernels),
+            'busy': sum(1 for kernel in kernels if kernel.lock.locked()),
+            'max_kernels': self.max_kernels,
+            'idle_timeout': self.idle_timeout,
+            'memory_bytes': self.memory_bytes,
+            'kernels_started': self.kernels_started,
+            'kernels_evicted': self.kernels_evicted,
+            'kernels_restarted': self.kernels_restarted
+        }
+
+    def shutdown(self):
+        """Stop the reaper and every kernel"""
+        self._stopped.set()
+        with self._lock:
+            kernels = list(self._kernels.values())
+            self._kernels.clear()
+        for kernel in kernels:
+            kernel.shutdown()
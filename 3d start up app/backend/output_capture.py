@@ -0,0 +1,133 @@
+# Output Capture Module - Per-execution output buffers for sandboxed code
+import io
+from collections import deque
+from typing import Callable, Optional
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised inside the student program when its output budget runs out.
+
+    Derives from BaseException so ``except Exception`` in student code
+    cannot swallow it.
+    """
+
+
+def _clip_bytes(text: str, size: int, from_end: bool = False) -> str:
+    """Clip text to at most ``size`` UTF-8 bytes without splitting a character"""
+    data = text.encode('utf-8', 'replace')
+    if len(data) <= size:
+        return text
+    data = data[-size:] if from_end else data[:size]
+    return data.decode('utf-8', 'ignore')
+
+
+class OutputCapture:
+    """Bounded text buffer owned by a single execution.
+
+    Student code never sees ``sys.stdout``; its ``print`` writes straight
+    into this buffer, so concurrent executions cannot mix their output.
+
+    At most ``limit`` bytes are stored: the first part of the output (the
+    head) plus a rolling window over the most recent output (the tail).
+    Everything in between is counted but dropped. With ``stop_on_limit``
+    the program is stopped as soon as it goes over the limit instead, so
+    only the head is kept.
+
+    An optional ``listener`` is called with output as it is written, for
+    streaming; it sees at most ``limit`` bytes.
+    """
+
+    def __init__(self, limit: int, stop_on_limit: bool = True, tail_bytes: Optional[int] = None,
+                 listener: Optional[Callable[[str], None]] = None):
+        self.limit = limit
+        self.stop_on_limit = stop_on_limit
+        self.listener = listener
+        if stop_on_limit:
+            tail_bytes = 0
+        self.tail_limit = min(limit // 4 if tail_bytes is None else tail_bytes, limit)
+        self.head_limit = limit - self.tail_limit
+
+        self.total_bytes = 0
+        self._head = io.StringIO()
+        self._head_bytes = 0
+        self._tail = deque()
+        self._tail_bytes = 0
+
+    @property
+    def stored_bytes(self) -> int:
+        return self._head_bytes + min(self._tail_bytes, self.tail_limit)
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > self.stored_bytes
+
+    def write(self, text: str) -> int:
+        size = len(text.encode('utf-8', 'replace'))
+
+        if self.listener and self.total_bytes < self.limit:
+            self.listener(_clip_bytes(text, self.limit - self.total_bytes))
+
+        if self.stop_on_limit and self.total_bytes + size > self.limit:
+            # Keep what still fits, then stop the program
+            text = _clip_bytes(text, self.limit - self.total_bytes)
+            self._store(text, len(text.encode('utf-8', 'replace')))
+            self.total_bytes += size
+            raise OutputLimitExceeded()
+
+        self.total_bytes += size
+        self._store(text, size)
+        return len(text)
+
+    def _store(self, text: str, size: int):
+        room = self.head_limit - self._head_bytes
+        if room > 0:
+            if size <= room:
+                self._head.write(text)
+                self._head_bytes += size
+                return
+            head_part = _clip_bytes(text, room)
+            self._head.write(head_part)
+            self._head_bytes += len(head_part.encode('utf-8', 'replace'))
+            text = text[len(head_part):]
+            size = len(text.encode('utf-8', 'replace'))
+
+        if not self.tail_limit or not text:
+            return
+
+        if size > self.tail_limit:
+            text = _clip_bytes(text, self.tail_limit, from_end=True)
+            size = len(text.encode('utf-8', 'replace'))
+
+        self._tail.append((text, size))
+        self._tail_bytes += size
+        # Drop whole chunks that have scrolled out of the tail window
+        while self._tail_bytes - self._tail[0][1] >= self.tail_limit:
+            self._tail_bytes -= self._tail.popleft()[1]
+
+    def flush(self):
+        pass
+
+    def getvalue(self) -> str:
+        head = self._head.getvalue()
+        tail = ''.join(text for text, _ in self._tail)
+        if self._tail_bytes > self.tail_limit:
+            tail = _clip_bytes(tail, self.tail_limit, from_end=True)
+
+        omitted = self.total_bytes - self.stored_bytes
+        if omitted > 0:
+            return f"{head}\n... ({omitted} bytes of output omitted) ...\n{tail}"
+        return head + tail
+
+    def make_print(self) -> Callable:
+        """Return a ``print`` replacement that writes into this buffer"""
+        def sandbox_print(*args, sep=' ', end='\n', file=None, flush=False):
+            if sep is None:
+                sep = ' '
+            if end is None:
+                end = '\n'
+            if not isinstance(sep, str) or not isinstance(end, str):
+                raise TypeError('sep and end must be None or a string')
+            text = sep.join(str(arg) for arg in args) + end
+            (file if file is not None else self).write(text)
+
+        return sandbox_print
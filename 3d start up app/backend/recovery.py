@@ -0,0 +1,302 @@
+# Recovery Module - Report every syntax error in a program, and parse what is left
+import re
+import io
+import ast
+import textwrap
+import tokenize
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from ast_pipeline import TooComplex, parse
+
+# Syntax errors reported for one program at most
+MAX_SYNTAX_ERRORS = 20
+
+# Stand-ins for a broken block header, by keyword; they keep the block under the header valid
+HEADER_STAND_INS = {
+    'if': 'if True:',
+    'elif': 'elif True:',
+    'else': 'else:',
+    'for': 'for _ in ():',
+    'while': 'while False:',
+    'with': 'if True:',
+    'try': 'try:',
+    'except': 'except Exception:',
+    'finally': 'finally:',
+    'match': 'match None:',
+    'case': 'case None:',
+}
+
+DEFINITION = re.compile(r'(async\s+)?(def|class)\s+(\w+)')
+HEADER_LINE = re.compile(r'on line (\d+)')
+
+# Tokens that neither start nor end a statement
+LAYOUT_TOKENS = (tokenize.COMMENT, tokenize.NL, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER)
+
+
+class Recovery:
+    """What recover() found: the syntax errors and a tree of everything else"""
+
+    def __init__(self, errors: List[Dict[str, Any]], tree: Optional[ast.Module], skipped_lines: Set[int]):
+        self.errors = errors  # syntax_error issues, in line order
+        self.tree = tree  # None if the program could not be repaired
+        self.skipped_lines = skipped_lines  # lines blanked or replaced by a stand-in
+
+
+class _Statement:
+    """A logical line as the tokenizer saw it"""
+
+    def __init__(self, start: int, end: int, unclosed: Optional[Tuple[str, int]] = None):
+        self.start = start
+        self.end = end
+        self.unclosed = unclosed  # (bracket, line) of a bracket never closed
+
+
+def _statements(lines: List[str]) -> List[_Statement]:
+    """Split lines into statements with the tokenizer, carrying on past its errors.
+
+    A statement normally ends at its NEWLINE token. One that leaves a
+    bracket open ends before the next line starting at or left of its own
+    indentation (other than a closing bracket), which is where the student
+    most likely moved on; tokenizing starts afresh there, and after lines
+    the tokenizer rejects.
+    """
+    statements = []
+    first_row = 1
+    while first_row <= len(lines):
+        # Blank lines in front keep the row numbers of the whole program
+        text = '\n' * (first_row - 1) + '\n'.join(lines[first_row - 1:]) + '\n'
+        start = None
+        indent = previous_row = 0
+        brackets: List[Tuple[str, int]] = []
+        restart = None
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(text).readline):
+                if token.type in LAYOUT_TOKENS:
+                    continue
+                row, col = token.start
+                if token.type == tokenize.NEWLINE:
+                    if start is not None:
+                        statements.append(_Statement(start, row))
+                    start = None
+                    brackets = []
+                    continue
+                if brackets and row > previous_row and col <= indent and token.string not in (')', ']', '}'):
+                    statements.append(_Statement(start, previous_row, brackets[0]))
+                    restart = row
+                    break
+                if start is None:
+                    start, indent = row, col
+                if token.type == tokenize.OP and token.string in ('(', '[', '{'):
+                    brackets.append((token.string, row))
+                elif token.type == tokenize.OP and token.string in (')', ']', '}') and brackets:
+                    brackets.pop()
+                previous_row = token.end[0]
+        except tokenize.TokenError:
+            # End of file inside a bracket or a string
+            if start is not None:
+                statements.append(_Statement(start, len(lines), brackets[0] if brackets else None))
+        except SyntaxError as e:
+            # Inconsistent dedent; start again from the offending line
+            if start is not None:
+                statements.append(_Statement(start, previous_row))
+            restart = max(e.lineno or 0, first_row + 1)
+        if restart is None:
+            break
+        first_row = restart
+    return statements
+
+
+def _statement_at(lines: List[str], lineno: int) -> _Statement:
+    for statement in _statements(lines):
+        if statement.start <= lineno <= statement.end:
+            return statement
+    return _Statement(lineno, lineno)
+
+
+def _too_complex_at(lines: List[str]) -> Optional[_Statement]:
+    """The first statement too deeply nested to parse on its own, or None.
+
+    Block headers are tried with a ``pass`` body; statements that only
+    make sense inside their block, such as ``else:``, fail with an
+    ordinary SyntaxError and are passed over.
+    """
+    for statement in _statements(lines):
+        text = textwrap.dedent('\n'.join(lines[statement.start - 1:statement.end]))
+        if text.rstrip().endswith(':'):
+            text = text.rstrip() + ' pass'
+        try:
+            parse(text)
+        except TooComplex:
+            return statement
+        except SyntaxError:
+            pass
+    return None
+
+
+def _stand_in(line: str) -> Optional[str]:
+    """A valid header to put in place of a broken one, or None if the line is no header"""
+    stripped = line.strip()
+    definition = DEFINITION.match(stripped)
+    if definition:
+        prefix = definition.group(1) or ''
+        if definition.group(2) == 'def':
+            return f'{prefix}def {definition.group(3)}():'
+        return f'class {definition.group(3)}:'
+    words = stripped.replace(':', ' ').split()
+    if words and words[0] == 'async' and len(words) > 1:
+        words = words[1:]
+    return HEADER_STAND_INS.get(words[0]) if words else None
+
+
+def _indentation(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _neutralize(lines: List[str], start: int, end: int, blank: bool = False):
+    """Replace a statement with ``pass``, or a broken header with its stand-in, keeping the line count"""
+    indentation = _indentation(lines[start - 1])
+    stand_in = _stand_in(lines[start - 1])
+    for row in range(start, end + 1):
+        lines[row - 1] = ''
+    if blank:
+        return
+    if stand_in is None:
+        lines[start - 1] = indentation + 'pass'
+        return
+
+    lines[start - 1] = indentation + stand_in
+    following = next((line for line in lines[end:] if line.strip()), '')
+    if len(_indentation(following)) <= len(indentation):
+        lines[start - 1] += ' pass'  # Its block was part of the broken statement
+
+
+def _dedent_block(lines: List[str], lineno: int, unexpected: bool) -> bool:
+    """Dedent a wrongly indented line and the block under it; False if there is no better indentation.
+
+    An unexpected indent moves to the indentation of the line before it,
+    an unindent that matches no outer level to the nearest one below it.
+    """
+    width = len(_indentation(lines[lineno - 1]))
+    target = None
+    for row in range(lineno - 1, 0, -1):
+        line = lines[row - 1]
+        if line.strip() and not line.lstrip().startswith('#'):
+            indentation = len(_indentation(line))
+            if unexpected or indentation < width:
+                target = indentation
+                break
+    if target is None:
+        target = 0
+    if target >= width:
+        return False
+
+    shift = width - target
+    for row in range(lineno, len(lines) + 1):
+        line = lines[row - 1]
+        if not line.strip():
+            continue
+        if len(_indentation(line)) < width:
+            break
+        lines[row - 1] = line[shift:]
+    return True
+
+
+def _follows_skipped(lines: List[str], lineno: int, skipped: Set[int]) -> bool:
+    """True if the nearest non-blank line before ``lineno`` was neutralized"""
+    row = lineno - 1
+    while row >= 1 and row not in skipped and not lines[row - 1].strip():
+        row -= 1
+    return row in skipped
+
+
+def _issue(lineno: int, message: str) -> Dict[str, Any]:
+    return {
+        'type': 'syntax_error',
+        'line': lineno,
+        'message': message,
+        'severity': 'error'
+    }
+
+
+def recover(code: str) -> Recovery:
+    """Parse code that has syntax errors, reporting each of them.
+
+    The tokenizer first finds statements that leave a bracket open and
+    cuts them off where the next statement starts. Then, each time the
+    parser stops, the error is recorded and the statement it is in is
+    neutralized: a broken block header becomes a stand-in that keeps its
+    block valid and any other statement becomes ``pass``. Line numbers
+    never change, so the errors and the tree match the student's code.
+    Indentation errors caused by an earlier repair are not reported. Code
+    nested too deeply for Python to parse comes with no line number; the
+    statement at fault is found by parsing the statements one at a time.
+    """
+    lines = code.split('\n')
+    errors = []
+    skipped: Set[int] = set()
+
+    for statement in _statements(lines):
+        if statement.unclosed and len(errors) < MAX_SYNTAX_ERRORS:
+            bracket, row = statement.unclosed
+            errors.append(_issue(row, f"'{bracket}' was never closed (<unknown>, line {row})"))
+            _neutralize(lines, statement.start, statement.end)
+            skipped.update(range(statement.start, statement.end + 1))
+
+    tree = None
+    attempts = set()  # (start, end) of statements already neutralized
+    reported = set()
+    for _ in range(MAX_SYNTAX_ERRORS * 2):
+        try:
+            tree = parse('\n'.join(lines))
+            break
+        except SyntaxError as e:
+            error = e
+        lineno = min(max(error.lineno or 1, 1), len(lines))
+
+        header = HEADER_LINE.search(error.msg)
+        if isinstance(error, TooComplex):
+            statement = _too_complex_at(lines)
+            if statement is None:
+                # Only the program as a whole is too deep; nothing to cut out
+                if len(errors) < MAX_SYNTAX_ERRORS:
+                    errors.append(_issue(lineno, str(error)))
+                break
+            lineno = statement.start
+            error = TooComplex(error.msg, ('<unknown>', lineno, 1, lines[lineno - 1]))
+            _neutralize(lines, statement.start, statement.end)
+            skipped.update(range(statement.start, statement.end + 1))
+        elif error.msg.startswith('expected an indented block') and header:
+            # The header is fine, its block is missing
+            statement = _statement_at(lines, int(header.group(1)))
+            if lines[statement.end - 1].rstrip().endswith(':') and (statement.start, statement.end) not in attempts:
+                lines[statement.end - 1] = lines[statement.end - 1].rstrip() + ' pass'
+            else:
+                _neutralize(lines, statement.start, statement.end)
+                skipped.update(range(statement.start, statement.end + 1))
+            attempts.add((statement.start, statement.end))
+        elif isinstance(error, IndentationError) and (lineno, 'shift') not in attempts \
+                and _dedent_block(lines, lineno, unexpected='unexpected indent' in error.msg):
+            # Moved back in line with the code around it; nothing is lost
+            attempts.add((lineno, 'shift'))
+            if _follows_skipped(lines, lineno, skipped):
+                continue
+        else:
+            statement = _statement_at(lines, lineno)
+            span = (statement.start, statement.end)
+            if (span, 'blank') in attempts:
+                break  # Blanking it did not help either
+            # An unexpected indent is not fixed by a stand-in at the same indentation
+            blank = span in attempts or (isinstance(error, IndentationError) and 'unexpected indent' in error.msg)
+            _neutralize(lines, statement.start, statement.end, blank=blank)
+            attempts.add((span, 'blank') if blank else span)
+            repaired = isinstance(error, IndentationError) and _follows_skipped(lines, statement.start, skipped)
+            skipped.update(range(statement.start, statement.end + 1))
+            if repaired:
+                continue
+
+        if len(errors) < MAX_SYNTAX_ERRORS and (lineno, error.msg) not in reported:
+            reported.add((lineno, error.msg))
+            errors.append(_issue(lineno, str(error)))
+
+    errors.sort(key=lambda issue: issue['line'])
+    return Recovery(errors, tree, skipped)
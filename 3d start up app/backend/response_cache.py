@@ -0,0 +1,44 @@
+# Response Cache Module - Serialized analysis responses addressed by a hash of their input
+import os
+import json
+import hashlib
+from typing import Any, Dict, Iterable, Optional
+
+from cache import LRUCache
+
+# Bump when analysis or flowchart output changes, so ETags handed out before no longer match
+ANALYZER_VERSION = 3
+
+
+class ResponseCache:
+    """JSON response bodies keyed by their ETag.
+
+    The ETag is a hash of the endpoint, the request payload and the
+    analyzer version (including the names of the active rules), so equal
+    requests get equal tags and a client holding a tag can be answered
+    with 304 without recomputing anything.
+    """
+
+    def __init__(self, rules: Iterable[str] = (), max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        if max_entries is None:
+            max_entries = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('RESPONSE_CACHE_MB', 16)) * 1024 * 1024
+        self.version = f"{ANALYZER_VERSION}:{','.join(rules)}"
+        self.cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes, sizeof=len)
+
+    def etag(self, endpoint: str, payload: Dict[str, Any]) -> str:
+        """Content hash identifying the response to ``payload`` at ``endpoint``"""
+        key = json.dumps([endpoint, self.version, payload], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key.encode('utf-8', 'surrogatepass')).hexdigest()[:32]
+
+    def get(self, etag: str) -> Optional[str]:
+        """Return the cached response body, or None"""
+        return self.cache.get(etag)
+
+    def put(self, etag: str, body: str):
+        self.cache.put(etag, body)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.cache.stats(), version=self.version)
@@ -0,0 +1,283 @@
+# Rules Module - Pluggable code analysis rules dispatched by AST node type
+import ast
+import time
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Sequence, Type
+
+from ast_pipeline import MAX_DEPTH, MAX_NODES, NodeVisitor, TreeSize, measure, walk
+from scopes import collect_symbols, resolve_symbols
+from antipatterns import find_antipatterns
+
+
+class Rule:
+    """One analysis check.
+
+    AST rules list the node classes they inspect in ``node_types`` and
+    implement ``check``; the engine calls them only for those nodes, so a
+    rule costs nothing on the rest of the tree. Line rules set
+    ``node_types`` to ``None`` and implement ``check_line`` instead. Both
+    return a list of issue dicts (empty when the code is fine); an AST
+    rule's issues give the ``line`` and ``column`` of the node they are
+    about. Rules are shared between requests, so they must not keep
+    per-run state.
+
+    ``whole_program`` rules need the entire module to decide anything and
+    are skipped when only part of a program is analyzed. ``recursive``
+    rules descend the tree themselves, using Python recursion, and are
+    skipped for trees past the walk's budgets (see ast_pipeline.walk).
+    """
+
+    name = ''
+    node_types: Optional[tuple] = ()
+    whole_program = False
+    recursive = False
+
+    def check(self, node: ast.AST) -> List[Dict[str, Any]]:
+        return []
+
+    def check_line(self, lineno: int, line: str) -> List[Dict[str, Any]]:
+        return []
+
+
+# Rule classes, in the order their issues are reported
+RULES: List[Type[Rule]] = []
+
+
+def register(rule_class: Type[Rule]) -> Type[Rule]:
+    """Class decorator adding a rule to the default registry"""
+    RULES.append(rule_class)
+    return rule_class
+
+
+@register
+class InfiniteLoopRule(Rule):
+    """while True (basic pattern)"""
+
+    name = 'potential_infinite_loop'
+    node_types = (ast.While,)
+
+    def check(self, node):
+        if isinstance(node.test, ast.Constant) and node.test.value is True:
+            return [{
+                'type': 'potential_infinite_loop',
+                'line': node.lineno,
+                'column': node.col_offset,
+                'message': 'Potential infinite loop detected (while True without break)',
+                'severity': 'warning'
+            }]
+        return []
+
+
+@register
+class DivisionByZeroRule(Rule):
+    """Division by a literal zero"""
+
+    name = 'division_by_zero'
+    node_types = (ast.BinOp,)
+
+    def check(self, node):
+        if isinstance(node.op, ast.Div) and isinstance(node.right, ast.Constant) and node.right.value == 0:
+            return [{
+                'type': 'division_by_zero',
+                'line': node.lineno,
+                'column': node.col_offset,
+                'message': 'Division by zero detected',
+                'severity': 'error'
+            }]
+        return []
+
+
+@register
+class UndefinedNameRule(Rule):
+    """Names read before they are assigned, or never assigned at all (see scopes)"""
+
+    name = 'undefined_name'
+    node_types = (ast.Module,)
+    whole_program = True
+    recursive = True
+
+    def check(self, node):
+        return resolve_symbols([(collect_symbols(node), 0)])
+
+
+@register
+class PerformanceRule(Rule):
+    """Correct but slow patterns in loops, each with a faster alternative (see antipatterns)"""
+
+    name = 'performance'
+    node_types = (ast.Module,)
+    whole_program = True  # types are guessed from assignments anywhere before the loop
+    recursive = True
+
+    def check(self, node):
+        return find_antipatterns(node)
+
+
+@register
+class LineTooLongRule(Rule):
+    """Lines over 100 characters"""
+
+    name = 'line_too_long'
+    node_types = None
+
+    def check_line(self, lineno, line):
+        if len(line) > 100:
+            return [{
+                'type': 'line_too_long',
+                'line': lineno,
+                'message': f'Line too long ({len(line)} characters)',
+                'severity': 'style'
+            }]
+        return []
+
+
+@register
+class TrailingWhitespaceRule(Rule):
+    """Spaces or tabs at the end of a line"""
+
+    name = 'trailing_whitespace'
+    node_types = None
+
+    def check_line(self, lineno, line):
+        if line.endswith(' ') or line.endswith('\t'):
+            return [{
+                'type': 'trailing_whitespace',
+                'line': lineno,
+                'message': 'Trailing whitespace detected',
+                'severity': 'style'
+            }]
+        return []
+
+
+class _TimedRule(NodeVisitor):
+    """Runs one AST rule on the shared walk, timing every call"""
+
+    def __init__(self, rule: Rule, issues: List[Dict[str, Any]], timing: List[float]):
+        self.node_types = rule.node_types
+        self.check = rule.check
+        self.issues = issues
+        self.timing = timing  # [calls, seconds, issues]
+
+    def visit(self, node):
+        start = time.perf_counter()
+        found = self.check(node)
+        self.timing[1] += time.perf_counter() - start
+        self.timing[0] += 1
+        if found:
+            self.timing[2] += len(found)
+            self.issues.extend(found)
+
+
+def _partial_issue(size: TreeSize) -> Dict[str, Any]:
+    """Note that the AST rules only saw part of the tree"""
+    if size.truncated == 'depth':
+        reason = f'is nested more than {MAX_DEPTH} levels deep'
+    else:
+        reason = f'has more than {MAX_NODES} syntax nodes'
+    return {
+        'type': 'analysis_partial',
+        'line': 1,
+        'message': f'The program {reason}; only part of it was checked, and some checks were skipped',
+        'severity': 'info'
+    }
+
+
+class RuleEngine:
+    """Run a set of rules over code, recording time spent in each.
+
+    AST rules share one walk of the tree (see ast_pipeline.walk) and are
+    only called for their node types; their issues come first, in walk
+    order. Line rules follow, ordered by line. Per-rule call counts and
+    times accumulate across runs and are reported by ``stats``.
+    """
+
+    def __init__(self, rules: Optional[Iterable[Rule]] = None):
+        self.rules = [rule_class() for rule_class in RULES] if rules is None else list(rules)
+        self._lock = threading.Lock()
+        self._totals = {rule.name: [0, 0.0, 0] for rule in self.rules}
+        self.runs = 0
+
+    def run(self, code: str, tree: ast.AST, visitors: Sequence[NodeVisitor] = (),
+            whole_program: bool = True, size: Optional[TreeSize] = None) -> List[Dict[str, Any]]:
+        """Return every issue found; extra ``visitors`` ride along on the walk.
+
+        Pass ``whole_program=False`` when ``code`` is only part of a program.
+        """
+        return self.run_tree(tree, visitors, whole_program, size) + self.run_lines(code)
+
+    def run_tree(self, tree: ast.AST, visitors: Sequence[NodeVisitor] = (),
+                 whole_program: bool = True, size: Optional[TreeSize] = None) -> List[Dict[str, Any]]:
+        """Return the issues found by the AST rules, in walk order.
+
+        A tree past the walk's budgets is analyzed only as far as the walk
+        gets, without the recursive rules, and the issues end with an
+        ``analysis_partial`` note saying so. Pass ``size`` when the caller
+        has already measured the tree (see ast_pipeline.measure).
+        """
+        if size is None:
+            size = measure(tree)
+        timings = {}
+        issues = []
+        ast_rules = []
+        for rule in self.rules:
+            if rule.node_types is not None and (whole_program or not rule.whole_program) \
+                    and not (rule.recursive and size.truncated):
+                timings[rule.name] = [0, 0.0, 0]  # calls, seconds, issues
+                ast_rules.append(_TimedRule(rule, issues, timings[rule.name]))
+        walk(tree, [*ast_rules, *visitors])
+        self._record(timings)
+        if size.truncated:
+            issues.append(_partial_issue(size))
+        return issues
+
+    def run_lines(self, code: str) -> List[Dict[str, Any]]:
+        """Return the issues found by the line rules, ordered by line.
+
+        These depend on the raw text, so unlike the AST rules they change
+        when only the formatting of the code does.
+        """
+        timings = {}
+        issues = []
+        lines = code.split('\n')
+        for rule in self.rules:
+            if rule.node_types is not None:
+                continue
+            found = []
+            start = time.perf_counter()
+            for lineno, line in enumerate(lines, 1):
+                result = rule.check_line(lineno, line)
+                if result:
+                    found.extend(result)
+            timings[rule.name] = [len(lines), time.perf_counter() - start, len(found)]
+            issues.extend(found)
+        # Stable sort keeps rule order within a line
+        issues.sort(key=lambda issue: issue['line'])
+        self._record(timings, run=False)
+        return issues
+
+    def _record(self, timings: Dict[str, List], run: bool = True):
+        """Add one run's per-rule timings to the totals"""
+        with self._lock:
+            if run:
+                self.runs += 1
+            for name, timing in timings.items():
+                total = self._totals[name]
+                for i, value in enumerate(timing):
+                    total[i] += value
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-rule call counts, total time and issues found"""
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'rules': [
+                    {
+                        'name': rule.name,
+                        'node_types': [cls.__name__ for cls in rule.node_types] if rule.node_types is not None else None,
+                        'calls': self._totals[rule.name][0],
+                        'time': round(self._totals[rule.name][1], 6),
+                        'issues': self._totals[rule.name][2]
+                    }
+                    for rule in self.rules
+                ]
+            }
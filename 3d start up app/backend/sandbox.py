@@ -0,0 +1,644 @@
+# Sandbox Module - Restricted execution of student code
+import io
+import sys
+import json
+import time
+import marshal
+import ctypes
+import signal
+import threading
+import traceback
+import tracemalloc
+from typing import Dict, Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from output_capture import OutputCapture, OutputLimitExceeded
+from tracing import LineTracer, COVERAGE_MAX_EVENTS
+from complexity import run_benchmark
+
+# Builtins exposed to student programs
+SAFE_BUILTINS = {
+    'print': print,
+    'len': len,
+    'range': range,
+    'str': str,
+    'int': int,
+    'float': float,
+    'list': list,
+    'dict': dict,
+    'tuple': tuple,
+    'set': set,
+    'bool': bool,
+    'abs': abs,
+    'max': max,
+    'min': min,
+    'sum': sum,
+    'sorted': sorted,
+    'reversed': reversed,
+    'enumerate': enumerate,
+    'zip': zip,
+    'map': map,
+    'filter': filter,
+    'any': any,
+    'all': all,
+    'round': round,
+    'pow': pow,
+    'divmod': divmod,
+    'isinstance': isinstance,
+    'type': type,
+    'hasattr': hasattr,
+    'getattr': getattr,
+    'setattr': setattr,
+    'chr': chr,
+    'ord': ord,
+}
+
+# Filename student code is compiled under, so tracebacks and tools can tell it apart
+STUDENT_FILENAME = '<student_code>'
+
+# Longest repr of a function's return value reported back
+MAX_REPR_LENGTH = 1000
+
+# Source lines reported in the allocation breakdown
+TOP_ALLOCATIONS = 5
+
+# Above this much tracemalloc bookkeeping a snapshot is too slow to take after the run
+MAX_SNAPSHOT_OVERHEAD = 16 * 1024 * 1024
+
+# Once a limit has been hit it is raised again this often (seconds) while student code still runs
+LIMIT_REPEAT_INTERVAL = 0.05
+
+LIMIT_MESSAGES = {
+    'wall_time': 'Time limit exceeded ({limit}s wall clock)',
+    'cpu_time': 'CPU time limit exceeded ({limit}s)',
+    'memory': 'Memory limit exceeded ({limit} bytes)',
+    'output': 'Output limit exceeded ({limit} bytes)',
+    'instructions': 'Instruction budget exceeded ({limit} lines executed)',
+}
+
+
+class ExecutionBudget:
+    """Resource limits applied to a single execution"""
+
+    def __init__(self, wall_time: float = 10, cpu_time: float = 5,
+                 memory_bytes: Optional[int] = 256 * 1024 * 1024, output_bytes: int = 10000,
+                 stop_on_output_limit: bool = True, instructions: Optional[int] = None):
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.memory_bytes = memory_bytes
+        self.output_bytes = output_bytes
+        # When False the program keeps running and only the head and tail of its output are kept
+        self.stop_on_output_limit = stop_on_output_limit
+        # Lines of student code the program may execute; unlike time this does not depend on load
+        self.instructions = instructions
+
+    def limit_for(self, name: str):
+        return {
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'memory': self.memory_bytes,
+            'output': self.output_bytes,
+            'instructions': self.instructions,
+        }[name]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'memory_bytes': self.memory_bytes,
+            'output_bytes': self.output_bytes,
+            'stop_on_output_limit': self.stop_on_output_limit,
+            'instructions': self.instructions
+        }
+
+
+class BudgetExceeded(BaseException):
+    """Raised inside the student program when a budget runs out.
+
+    Derives from BaseException so ``except Exception`` in student code
+    cannot swallow it.
+    """
+
+    def __init__(self, limit: str):
+        super().__init__(limit)
+        self.limit = limit
+
+
+def limit_exceeded_result(limit: str, budget: ExecutionBudget, output: str = '',
+                          usage: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build the result dict for an execution stopped by a budget"""
+    return {
+        'success': False,
+        'error': LIMIT_MESSAGES[limit].format(limit=budget.limit_for(limit)),
+        'output': output,
+        'execution_time': (usage or {}).get('wall_time', 0),
+        'limit_exceeded': limit,
+        'usage': usage or {}
+    }
+
+
+def _in_student_code(frame) -> bool:
+    while frame is not None:
+        if frame.f_code.co_filename == STUDENT_FILENAME:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def current_address_space() -> Optional[int]:
+    """Virtual memory size of this process in bytes (Linux only)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * resource.getpagesize()
+
+
+class _ProcessLimits:
+    """Arm wall-clock, CPU and address-space limits for the current process.
+
+    Only used inside sandbox workers: the signals and rlimits apply to the
+    whole process, so they must never be armed inside the web server.
+
+    A limit raises BudgetExceeded in the student program, which a bare
+    ``except:`` can swallow. So the first limit hit is recorded in
+    ``exceeded`` and raised again every LIMIT_REPEAT_INTERVAL seconds for
+    as long as student code is on the stack; the run is reported as over
+    that limit even if every raise was caught.
+    """
+
+    def __init__(self, budget: ExecutionBudget):
+        self.budget = budget
+        self.exceeded: Optional[str] = None
+        self._saved_as = None
+
+    def exceed(self, limit: str):
+        """Record a limit as hit and keep raising it; returns the error to raise now"""
+        if self.exceeded is None:
+            self.exceeded = limit
+            if hasattr(signal, 'setitimer'):
+                signal.setitimer(signal.ITIMER_PROF, 0)
+                signal.setitimer(signal.ITIMER_REAL, LIMIT_REPEAT_INTERVAL, LIMIT_REPEAT_INTERVAL)
+        return BudgetExceeded(self.exceeded)
+
+    def _on_alarm(self, signum, frame):
+        if self.exceeded is None:
+            raise self.exceed('wall_time')
+        if not _in_student_code(frame):
+            # The program is done; what is running now is the sandbox cleaning up
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            return
+        raise BudgetExceeded(self.exceeded)
+
+    def _on_cpu_time(self, signum, frame):
+        raise self.exceed('cpu_time')
+
+    def __enter__(self):
+        if hasattr(signal, 'setitimer'):
+            signal.signal(signal.SIGALRM, self._on_alarm)
+            signal.signal(signal.SIGPROF, self._on_cpu_time)
+            if self.budget.wall_time:
+                signal.setitimer(signal.ITIMER_REAL, self.budget.wall_time)
+            if self.budget.cpu_time:
+                signal.setitimer(signal.ITIMER_PROF, self.budget.cpu_time)
+
+        if resource and self.budget.memory_bytes:
+            baseline = current_address_space()
+            if baseline is not None:
+                self._saved_as = resource.getrlimit(resource.RLIMIT_AS)
+                hard = self._saved_as[1]
+                soft = baseline + self.budget.memory_bytes
+                if hard != resource.RLIM_INFINITY:
+                    soft = min(soft, hard)
+                resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+        return self
+
+    def __exit__(self, *exc_info):
+        if hasattr(signal, 'setitimer'):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        if self._saved_as is not None:
+            resource.setrlimit(resource.RLIMIT_AS, self._saved_as)
+        return False
+
+
+def _student_code_above(frame, owner) -> bool:
+    """Whether student code is running above ``owner`` on the stack ending at ``frame``"""
+    student = False
+    while frame is not None:
+        if frame is owner:
+            return student
+        if frame.f_code.co_filename == STUDENT_FILENAME:
+            student = True
+        frame = frame.f_back
+    return False
+
+
+class _ThreadLimits:
+    """Enforce the wall-clock limit on the current thread, for runs outside sandbox workers.
+
+    Signals and rlimits would hit the whole web server, so a timer thread
+    raises BudgetExceeded in the thread running the student program
+    instead (PyThreadState_SetAsyncExc). As with _ProcessLimits, the first
+    limit hit is raised again every LIMIT_REPEAT_INTERVAL seconds while
+    student code is on that thread's stack. A thread cannot be killed the
+    way a worker can, so a program that catches every raise in a loop is
+    only stopped in a worker. CPU time and memory are not limited, and a
+    program blocked in one long call into C is only stopped when it
+    returns.
+    """
+
+    def __init__(self, budget: ExecutionBudget):
+        self.budget = budget
+        self.exceeded: Optional[str] = None
+        self._thread_id = None
+        self._owner = None  # the frame that entered the limits; student code runs above it
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def exceed(self, limit: str):
+        """Record a limit as hit and keep raising it; returns the error to raise now"""
+        with self._lock:
+            if self.exceeded is None:
+                self.exceeded = limit
+                self._schedule(LIMIT_REPEAT_INTERVAL)
+        return BudgetExceeded(self.exceeded)
+
+    def _schedule(self, delay: float):
+        if self._owner is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            frame = sys._current_frames().get(self._thread_id)
+            if self._owner is None or not _student_code_above(frame, self._owner):
+                return  # The program is done; what is running now is the sandbox cleaning up
+            if self.exceeded is None:
+                self.exceeded = 'wall_time'
+            limit = self.exceeded
+
+            class _Exceeded(BudgetExceeded):
+                # Raised as a class, so it cannot be given its limit as an argument
+                def __init__(self):
+                    super().__init__(limit)
+
+            _Exceeded.__name__ = _Exceeded.__qualname__ = 'BudgetExceeded'
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self._thread_id),
+                                                       ctypes.py_object(_Exceeded))
+            self._schedule(LIMIT_REPEAT_INTERVAL)
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._owner = sys._getframe(1)
+        if self.budget.wall_time:
+            with self._lock:
+                self._schedule(self.budget.wall_time)
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._owner = None
+            if self._timer is not None:
+                self._timer.cancel()
+        return False
+
+
+class _NoLimits:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _max_rss_bytes() -> Optional[int]:
+    if not resource:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def _resident_bytes() -> Optional[int]:
+    """Resident set size of this process in bytes (Linux only)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * resource.getpagesize()
+
+
+def _reset_peak_resident() -> bool:
+    """Restart the kernel's peak resident set size at the current size (Linux 4.0+)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def _peak_resident_bytes() -> Optional[int]:
+    """Peak resident set size since the last reset, in bytes (Linux only)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class _MemoryTracer:
+    """Measure the memory a single execution uses.
+
+    The peak is how far the process's resident set grew above its size at
+    the start of the run. The kernel keeps that high-water mark, so it
+    costs nothing while the program runs; where it cannot be reset for
+    the run, the lifetime ``ru_maxrss`` is used when the run raised it,
+    and the peak is None otherwise.
+
+    With ``allocations`` tracemalloc also records the number of live
+    blocks and the top allocating lines, with the peak taken from its
+    count instead. Only one frame is recorded per allocation, but it still
+    makes allocation-heavy programs several times slower, so it is only
+    done on request. Like the process limits this is process-wide, so it
+    is only used inside sandbox workers. The report is taken on exit,
+    while the program's globals are still alive.
+    """
+
+    def __init__(self, enabled: bool, allocations: bool = False):
+        self.enabled = enabled
+        self.allocations = enabled and allocations and not tracemalloc.is_tracing()
+        self._report: Dict[str, Any] = {}
+        self._start_resident = None
+        self._start_max_rss = None
+        self._peak_reset = False
+
+    def __enter__(self):
+        if self.allocations:
+            tracemalloc.start(1)
+        elif self.enabled:
+            self._start_resident = _resident_bytes()
+            self._start_max_rss = _max_rss_bytes()
+            self._peak_reset = _reset_peak_resident()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.allocations:
+            try:
+                self._report = self._measure()
+            except MemoryError:
+                pass
+            finally:
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+        elif self.enabled:
+            self._report = {'peak_memory_bytes': self._peak_resident_growth()}
+        return False
+
+    def _peak_resident_growth(self) -> Optional[int]:
+        if self._start_resident is None:
+            return None
+        if self._peak_reset:
+            peak = _peak_resident_bytes()
+        else:
+            peak = _max_rss_bytes()
+            if peak is None or peak <= (self._start_max_rss or 0):
+                return None  # The lifetime peak was reached before this run
+        return None if peak is None else max(0, peak - self._start_resident)
+
+    def report(self) -> Dict[str, Any]:
+        return self._report
+
+    def _measure(self) -> Dict[str, Any]:
+        _, peak = tracemalloc.get_traced_memory()
+        report = {'peak_memory_bytes': peak, 'allocated_blocks': None, 'top_allocations': []}
+        if tracemalloc.get_tracemalloc_memory() > MAX_SNAPSHOT_OVERHEAD:
+            return report
+
+        snapshot = tracemalloc.take_snapshot()
+        # Grouping is much slower while every allocation is still being traced
+        tracemalloc.stop()
+        stats = [stat for stat in snapshot.statistics('lineno')
+                 if stat.traceback[0].filename == STUDENT_FILENAME]
+        report['allocated_blocks'] = sum(stat.count for stat in stats)
+        report['top_allocations'] = [
+            {
+                'line': stat.traceback[0].lineno,
+                'size_bytes': stat.size,
+                'blocks': stat.count
+            }
+            for stat in stats[:TOP_ALLOCATIONS]
+        ]
+        return report
+
+
+def _make_input(stdin: str, capture: OutputCapture) -> Callable:
+    """Return an ``input`` replacement that reads lines from the given text"""
+    lines = io.StringIO(stdin)
+
+    def sandbox_input(prompt=''):
+        if prompt:
+            capture.write(str(prompt))
+        line = lines.readline()
+        if not line:
+            raise EOFError('EOF when reading a line')
+        return line[:-1] if line.endswith('\n') else line
+
+    return sandbox_input
+
+
+def _to_json_value(value):
+    """Return value if it survives a JSON round trip, otherwise None"""
+    try:
+        return json.loads(json.dumps(value))
+    except (TypeError, ValueError, RecursionError):
+        return None
+
+
+def run_code(code, budget: Optional[ExecutionBudget] = None,
+             enforce_process_limits: bool = False,
+             on_output: Optional[Callable[[str], None]] = None,
+             stdin: Optional[str] = None,
+             call: Optional[Dict[str, Any]] = None,
+             trace_memory: bool = False,
+             profile: bool = False,
+             coverage: bool = False,
+             exec_globals: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Execute code with restricted builtins and return the result dict.
+
+    ``code`` may be source text, a compiled code object, or a code object
+    serialized with ``marshal`` (as sent to sandbox workers). Output is
+    always capped at ``budget.output_bytes``, wall-clock time at
+    ``budget.wall_time``, and lines executed when ``budget.instructions``
+    is set. CPU and memory limits are only armed when
+    ``enforce_process_limits`` is set, which sandbox workers do for every
+    job; without it the wall-clock limit is kept by a timer thread (see
+    _ThreadLimits). ``on_output`` receives stdout text as the program
+    produces it.
+
+    ``stdin`` makes ``input()`` available, reading from the given text.
+    ``call`` (``{'function': name, 'args': [...], 'kwargs': {...}}``) calls
+    a function defined by the program after it has run; its return value
+    is reported as ``return_value`` (JSON values only) and ``return_repr``.
+    With a ``'benchmark'`` entry the function is instead timed at growing
+    input sizes and the timings reported as ``benchmark`` (see
+    complexity.run_benchmark).
+
+    With ``enforce_process_limits`` ``usage`` includes the run's peak
+    memory; ``trace_memory`` adds the number of live blocks the program
+    allocated and its top allocating lines, traced with tracemalloc (see
+    _MemoryTracer).
+
+    ``profile`` records hit counts and cumulative time for every line of
+    the program and reports them as ``profile`` (see tracing.LineTracer).
+    ``coverage`` records transitions between lines, from which branch and
+    loop counts are derived, within a fixed budget of line events.
+
+    ``exec_globals`` runs the code in an existing namespace (a kernel's),
+    so definitions from earlier runs stay visible.
+    """
+    budget = budget or ExecutionBudget()
+
+    if isinstance(code, bytes):
+        code = marshal.loads(code)
+
+    # Output goes to a buffer owned by this execution, never to sys.stdout
+    stdout_capture = OutputCapture(budget.output_bytes, stop_on_limit=budget.stop_on_output_limit,
+                                   listener=on_output)
+
+    limits = _ProcessLimits(budget) if enforce_process_limits else _ThreadLimits(budget)
+    memory = _MemoryTracer(enforce_process_limits, allocations=trace_memory)
+    tracer = None
+
+    def exceed_instructions():
+        # The limits keep raising it after a raise is caught
+        raise limits.exceed('instructions')
+
+    if profile or coverage or budget.instructions:
+        # An explicit profile is always recorded in full; counting alone records nothing
+        if profile:
+            max_events = None
+        else:
+            max_events = COVERAGE_MAX_EVENTS if coverage else 0
+        tracer = LineTracer(STUDENT_FILENAME, timing=profile, arcs=coverage, max_events=max_events,
+                            limit=budget.instructions, on_limit=exceed_instructions,
+                            process_wide=enforce_process_limits)
+
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+
+    def usage() -> Dict[str, Any]:
+        stats = {
+            'wall_time': round(time.perf_counter() - start_time, 3),
+            'cpu_time': round(time.process_time() - start_cpu, 3),
+            'max_rss_bytes': _max_rss_bytes(),
+            'output_bytes': stdout_capture.total_bytes
+        }
+        if budget.instructions:
+            stats['instructions'] = min(tracer.events, budget.instructions)
+        stats.update(memory.report())
+        return stats
+
+    try:
+        # Create a restricted execution environment
+        if exec_globals is None:
+            exec_globals = {}
+        # Functions keep the builtins dict they were defined with, so a
+        # reused namespace has its builtins updated in place for this run
+        builtins = exec_globals.get('__builtins__')
+        if not isinstance(builtins, dict):
+            builtins = exec_globals['__builtins__'] = {}
+        builtins.clear()
+        builtins.update(SAFE_BUILTINS, print=stdout_capture.make_print())
+        if stdin is not None:
+            builtins['input'] = _make_input(stdin, stdout_capture)
+        if isinstance(code, str):
+            code = compile(code, STUDENT_FILENAME, 'exec')
+
+        # Execute the code
+        returned = {}
+        try:
+            # The limits are left first, so a late raise cannot cut the tracer's cleanup short
+            with memory, tracer or _NoLimits(), limits:
+                exec(code, exec_globals)
+                if call:
+                    function = exec_globals.get(call['function'])
+                    if not callable(function):
+                        raise NameError(f"function '{call['function']}' is not defined")
+                    if 'benchmark' in call:
+                        returned = {'benchmark': run_benchmark(function, call['benchmark'])}
+                    else:
+                        value = function(*call.get('args', []), **call.get('kwargs', {}))
+                        # repr() may run student code, so it stays inside the limits
+                        returned = {
+                            'return_value': _to_json_value(value),
+                            'return_repr': repr(value)[:MAX_REPR_LENGTH]
+                        }
+        except MemoryError:
+            if not enforce_process_limits:
+                raise
+            raise BudgetExceeded('memory')
+
+        execution_time = time.perf_counter() - start_time
+
+        result = {
+            'success': True,
+            'output': stdout_capture.getvalue(),
+            'error': None,
+            'execution_time': round(execution_time, 3),
+            'output_truncated': stdout_capture.truncated,
+            'limit_exceeded': None,
+            'usage': usage()
+        }
+        result.update(returned)
+
+    except OutputLimitExceeded:
+        result = limit_exceeded_result('output', budget, stdout_capture.getvalue(), usage())
+        result['output_truncated'] = True
+
+    except BudgetExceeded as e:
+        result = limit_exceeded_result(e.limit, budget, stdout_capture.getvalue(), usage())
+
+    except Exception as e:
+        execution_time = time.perf_counter() - start_time
+        result = {
+            'success': False,
+            'error': str(e),
+            'output': stdout_capture.getvalue(),
+            'execution_time': round(execution_time, 3),
+            'traceback': traceback.format_exc(),
+            'output_truncated': stdout_capture.truncated,
+            'limit_exceeded': None,
+            'usage': usage()
+        }
+
+    # The student code may have caught every raise; running past the limit still counts
+    exceeded = limits.exceeded or (tracer is not None and tracer.exceeded and 'instructions')
+    if exceeded and not result.get('limit_exceeded'):
+        result = limit_exceeded_result(exceeded, budget, stdout_capture.getvalue(), usage())
+
+    # Reported even when a limit stopped the program: that is when it matters most
+    if profile:
+        result['profile'] = {'lines': tracer.line_stats()}
+    if coverage:
+        result['coverage'] = {
+            'arcs': tracer.arc_stats(),
+            'calls': sorted([line, count] for line, count in tracer.calls.items()),
+            'events': tracer.events,
+            'truncated': tracer.truncated
+        }
+    return result
@@ -0,0 +1,322 @@
+# Sandbox Pool Module - Pre-started worker processes for code execution
+import os
+import time
+import queue
+import atexit
+import threading
+import multiprocessing
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from sandbox import run_code, limit_exceeded_result
+
+# Extra time a worker gets to report its own timeout before it is killed
+KILL_GRACE_SECONDS = 1.0
+
+# How often streamed output is forwarded to the parent, and the largest batch
+STREAM_FLUSH_INTERVAL = 0.05
+STREAM_MAX_CHUNK = 4096
+
+# How often a streaming caller hears from the pool while the program is silent
+HEARTBEAT_INTERVAL = 1.0
+
+
+class _StreamEmitter:
+    """Batch streamed output inside a worker and forward it from a background thread.
+
+    Forwarding every print as its own message would flood the pipe, while
+    flushing only on write would hold back output from a program that
+    prints once and then computes for a long time. The main thread never
+    sends itself: a budget signal arriving mid-send would corrupt the pipe.
+    """
+
+    def __init__(self, conn, send_lock: threading.Lock):
+        self.conn = conn
+        self.send_lock = send_lock
+        self._chunks = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, text: str):
+        with self._lock:
+            self._chunks.append(text)
+
+    def _flush_locked(self):
+        if not self._chunks:
+            return
+        text = ''.join(self._chunks)
+        self._chunks = []
+        with self.send_lock:
+            for start in range(0, len(text), STREAM_MAX_CHUNK):
+                self.conn.send(('stdout', text[start:start + STREAM_MAX_CHUNK]))
+
+    def _run(self):
+        while not self._stopped.wait(STREAM_FLUSH_INTERVAL):
+            with self._lock:
+                self._flush_locked()
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        with self._lock:
+            self._flush_locked()
+
+
+def _worker_main(conn):
+    """Worker process loop: run jobs received over the pipe until told to stop"""
+    send_lock = threading.Lock()
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        if job is None:
+            break
+
+        emitter = _StreamEmitter(conn, send_lock) if job.pop('stream', False) else None
+        try:
+            result = run_code(enforce_process_limits=True,
+                              on_output=emitter.write if emitter else None, **job)
+        finally:
+            if emitter:
+                emitter.close()
+
+        with send_lock:
+            conn.send(('result', result))
+
+    conn.close()
+
+
+def _default_context():
+    """Fork workers where possible so they start warm; spawn elsewhere"""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+class WorkerCrashed(Exception):
+    """Raised when a sandbox worker dies while running a job"""
+
+
+class WorkerTimeout(Exception):
+    """Raised when a sandbox worker does not answer before its deadline"""
+
+
+class SandboxWorker:
+    """A single sandbox process that executes jobs sent over a pipe"""
+
+    def __init__(self, context, target=None, args=()):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=target or _worker_main, args=(child_conn,) + tuple(args),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def events(self, job: Dict[str, Any], timeout: Optional[float] = None,
+               heartbeat: Optional[float] = None) -> Iterator[Tuple[str, Any]]:
+        """Send a job to the worker and yield its events until the result arrives.
+
+        Yields ``('stdout', text)`` chunks for streaming jobs, ``('heartbeat',
+        None)`` after every ``heartbeat`` seconds of silence, and finally
+        ``('result', dict)``.
+        """
+        self.runs += 1
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            self.conn.send(job)
+            while True:
+                wait = heartbeat
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise WorkerTimeout()
+                    wait = min(wait, remaining) if wait else remaining
+                if wait is not None and not self.conn.poll(wait):
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise WorkerTimeout()
+                    yield 'heartbeat', None
+                    continue
+                kind, payload = self.conn.recv()
+                yield kind, payload
+                if kind == 'result':
+                    return
+        except (EOFError, OSError, BrokenPipeError) as e:
+            raise WorkerCrashed(str(e) or 'worker exited unexpectedly')
+
+    def run(self, job: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send a job to the worker and wait up to ``timeout`` seconds for its result"""
+        for kind, payload in self.events(job, timeout=timeout):
+            if kind == 'result':
+                return payload
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it does not"""
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+    def kill(self):
+        """Kill the worker immediately"""
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class SandboxPool:
+    """Pool of pre-started sandbox workers shared by all request threads"""
+
+    def __init__(self, size: Optional[int] = None, max_runs_per_worker: int = 100,
+                 acquire_timeout: float = 30, context=None):
+        self.size = size or os.cpu_count() or 2
+        self.max_runs_per_worker = max_runs_per_worker
+        self.acquire_timeout = acquire_timeout
+        self.context = context or _default_context()
+
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.workers_started = 0
+        self.workers_recycled = 0
+        self.workers_crashed = 0
+        self.workers_killed = 0
+
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+        atexit.register(self.shutdown)
+
+    def _spawn(self) -> SandboxWorker:
+        with self._lock:
+            self.workers_started += 1
+        return SandboxWorker(self.context)
+
+    def _acquire(self) -> SandboxWorker:
+        worker = self._idle.get(timeout=self.acquire_timeout)
+        if not worker.is_alive():
+            # Died while idle - replace it before handing it out
+            with self._lock:
+                self.workers_crashed += 1
+            worker.stop()
+            worker = self._spawn()
+        return worker
+
+    def _release(self, worker: SandboxWorker):
+        if self._closed:
+            worker.stop()
+            return
+
+        if worker.runs >= self.max_runs_per_worker:
+            with self._lock:
+                self.workers_recycled += 1
+            worker.stop()
+            worker = self._spawn()
+
+        self._idle.put(worker)
+
+    def stream(self, job: Dict[str, Any], heartbeat: Optional[float] = None) -> Iterator[Tuple[str, Any]]:
+        """Run a job on the next free worker, yielding its events.
+
+        The last event is always ``('result', dict)``. If the caller stops
+        iterating early (e.g. the client disconnected) the worker is killed
+        and replaced so the abandoned program does not keep running.
+        """
+        start_time = time.perf_counter()
+
+        try:
+            worker = self._acquire()
+        except queue.Empty:
+            yield 'result', {
+                'success': False,
+                'error': 'Server is busy, please try again in a moment',
+                'output': '',
+                'execution_time': 0
+            }
+            return
+
+        budget = job.get('budget')
+        timeout = budget.wall_time + KILL_GRACE_SECONDS if budget and budget.wall_time else None
+        finished = False
+
+        try:
+            for kind, payload in worker.events(job, timeout=timeout, heartbeat=heartbeat):
+                if kind == 'result':
+                    finished = True
+                yield kind, payload
+        except WorkerTimeout:
+            # Stuck somewhere the in-worker alarm cannot interrupt (e.g. a C call)
+            finished = True
+            with self._lock:
+                self.workers_killed += 1
+            worker.kill()
+            worker = self._spawn()
+            elapsed = round(time.perf_counter() - start_time, 3)
+            yield 'result', limit_exceeded_result('wall_time', budget, usage={'wall_time': elapsed})
+        except WorkerCrashed:
+            finished = True
+            with self._lock:
+                self.workers_crashed += 1
+            worker.stop()
+            worker = self._spawn()
+            yield 'result', {
+                'success': False,
+                'error': 'Execution worker crashed while running the code',
+                'output': '',
+                'execution_time': round(time.perf_counter() - start_time, 3)
+            }
+        finally:
+            if not finished:
+                # Abandoned mid-run: the worker is still busy with the job
+                with self._lock:
+                    self.workers_killed += 1
+                worker.kill()
+                worker = self._spawn()
+            self._release(worker)
+
+    def run(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a job on the next free worker and return its result dict"""
+        events = self.stream(job)
+        try:
+            for kind, payload in events:
+                if kind == 'result':
+                    return payload
+        finally:
+            events.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters"""
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'max_runs_per_worker': self.max_runs_per_worker,
+            'workers_started': self.workers_started,
+            'workers_recycled': self.workers_recycled,
+            'workers_crashed': self.workers_crashed,
+            'workers_killed': self.workers_killed
+        }
+
+    def shutdown(self):
+        """Stop all idle workers; busy workers stop when released"""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
@@ -0,0 +1,415 @@
+# Scopes Module - Symbol tables for undefined-name and use-before-assignment detection
+import ast
+import builtins
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+# Names that resolve without being assigned in the student's code
+IMPLICIT_NAMES = frozenset(dir(builtins)) | {
+    '__name__', '__file__', '__doc__', '__builtins__', '__spec__',
+    '__loader__', '__package__', '__annotations__', '__class__'
+}
+
+
+class SymbolSummary:
+    """What one module (or one top-level segment of it) binds and needs.
+
+    ``bound`` holds module-level names it assigns; ``pending`` the names
+    its module-level code reads before assigning them itself, as ``(name,
+    (line, column))``; ``deferred`` the global names read inside
+    functions, which only need to exist by the time the function is
+    called. ``issues`` are problems that can be decided inside the module
+    alone, such as a local variable read before its assignment.
+    """
+
+    def __init__(self):
+        self.bound: Set[str] = set()
+        self.global_bound: Set[str] = set()  # assigned via ``global`` inside functions
+        self.pending: List[Tuple[str, Tuple[int, int]]] = []
+        self.deferred: List[Tuple[str, Tuple[int, int]]] = []
+        self.issues: List[Dict[str, Any]] = []
+        self.star_import = False
+
+
+class _Scope:
+    def __init__(self, kind: str, parent: Optional['_Scope']):
+        self.kind = kind  # module, function, class or comprehension
+        self.parent = parent
+        self.bindings: Dict[str, int] = {}  # name -> order of first binding
+        self.loads: List[Tuple[str, Tuple[int, int], int, bool]] = []  # name, position, order, in a loop
+        self.free: List[Tuple[str, Tuple[int, int]]] = []  # unresolved names from nested functions
+        self.declared_global: Set[str] = set()
+        self.declared_nonlocal: Set[str] = set()
+        self.loop_depth = 0
+
+
+class _SymbolCollector(ast.NodeVisitor):
+    """One pass over a module in evaluation order, resolving each name as its scope closes.
+
+    Every load is recorded once in its scope and looked up once when the
+    scope ends (when all of the scope's bindings are known), so the pass
+    is linear in the size of the tree plus the nesting depth of free names.
+    """
+
+    def __init__(self):
+        self.summary = SymbolSummary()
+        self.order = 0
+        self.scope = _Scope('module', None)
+        self.module = self.scope
+
+    # Scope bookkeeping
+
+    def _tick(self) -> int:
+        self.order += 1
+        return self.order
+
+    def _bind(self, name: str):
+        scope = self.scope
+        if name in scope.declared_global and scope is not self.module:
+            self.summary.global_bound.add(name)
+            return
+        if name in scope.declared_nonlocal:
+            return
+        scope.bindings.setdefault(name, self._tick())
+        if scope is self.module:
+            self.summary.bound.add(name)
+
+    def _load(self, name: str, position: Tuple[int, int]):
+        scope = self.scope
+        if scope is self.module:
+            # Module code runs top to bottom, so this can be decided now
+            if name not in scope.bindings:
+                self.summary.pending.append((name, position, scope.loop_depth > 0))
+            return
+        scope.loads.append((name, position, self._tick(), scope.loop_depth > 0))
+
+    def _enter(self, kind: str):
+        self.scope = _Scope(kind, self.scope)
+
+    def _exit(self):
+        scope, parent = self.scope, self.scope.parent
+        self.scope = parent
+
+        if scope.kind in ('class', 'comprehension'):
+            # Run right away: unresolved reads happen in the enclosing scope
+            for name, position, order, in_loop in scope.loads:
+                first = scope.bindings.get(name)
+                if first is not None and first < order:
+                    continue
+                if name in scope.declared_global:
+                    self._global_read(name, position)
+                elif scope.kind == 'comprehension' and parent.kind == 'class':
+                    self._free(parent, name, position)  # Class names are not visible here
+                elif parent is self.module:
+                    if name not in parent.bindings:
+                        self.summary.pending.append((name, position, in_loop or parent.loop_depth > 0))
+                else:
+                    parent.loads.append((name, position, order, in_loop or parent.loop_depth > 0))
+            # Class bodies are not visible from the functions inside them
+            target = parent
+            for name, position in scope.free:
+                if scope.kind == 'comprehension' and name in scope.bindings:
+                    continue
+                self._free(target, name, position)
+            return
+
+        reported = set()
+        for name, position, order, in_loop in scope.loads:
+            if name in scope.declared_global:
+                self._global_read(name, position)
+            elif name in scope.declared_nonlocal:
+                self._free(parent, name, position)
+            elif name in scope.bindings:
+                if scope.bindings[name] > order and not in_loop and name not in reported:
+                    reported.add(name)
+                    self.summary.issues.append(_used_before_assignment(name, position))
+            else:
+                self._free(parent, name, position)
+        for name, position in scope.free:
+            if name not in scope.bindings:
+                self._free(parent, name, position)
+
+    def _free(self, scope: _Scope, name: str, position: Tuple[int, int]):
+        """A name read by a function that it does not define itself"""
+        while scope.kind == 'class':
+            scope = scope.parent
+        if scope is self.module:
+            self._global_read(name, position)
+        else:
+            scope.free.append((name, position))
+
+    def _global_read(self, name: str, position: Tuple[int, int]):
+        if name not in IMPLICIT_NAMES:
+            self.summary.deferred.append((name, position))
+
+    def visit_statement(self, node: ast.stmt):
+        """Visit one top-level statement"""
+        start = len(self.summary.pending)
+        self.visit(node)
+        # A read inside a loop may see an assignment made later in the same loop
+        pending = self.summary.pending
+        pending[start:] = [
+            (name, position, in_loop) for name, position, in_loop in pending[start:]
+            if not (in_loop and name in self.module.bindings)
+        ]
+
+    def finish(self) -> SymbolSummary:
+        self.summary.pending = [
+            (name, position) for name, position, _ in self.summary.pending if name not in IMPLICIT_NAMES
+        ]
+        return self.summary
+
+    # Names
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self._load(node.id, (node.lineno, node.col_offset))
+        elif isinstance(node.ctx, ast.Store):
+            self._bind(node.id)
+
+    def visit_Global(self, node):
+        self.scope.declared_global.update(node.names)
+
+    def visit_Nonlocal(self, node):
+        self.scope.declared_nonlocal.update(node.names)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._bind(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                self.summary.star_import = True
+            else:
+                self._bind(alias.asname or alias.name)
+
+    # Statements, visited in evaluation order
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_AugAssign(self, node):
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self._load(node.target.id, (node.target.lineno, node.target.col_offset))
+        self.visit(node.target)
+
+    def visit_AnnAssign(self, node):
+        self.visit(node.annotation)
+        if node.value is not None:
+            self.visit(node.value)
+            self.visit(node.target)
+        elif not isinstance(node.target, ast.Name):
+            self.visit(node.target)
+        elif self.scope.kind == 'function':
+            self._bind(node.target.id)  # Makes the name local without assigning it
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self.scope.loop_depth += 1
+        self.visit(node.target)
+        for statement in node.body:
+            self.visit(statement)
+        self.scope.loop_depth -= 1
+        for statement in node.orelse:
+            self.visit(statement)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        self.scope.loop_depth += 1
+        self.visit(node.test)
+        for statement in node.body:
+            self.visit(statement)
+        self.scope.loop_depth -= 1
+        for statement in node.orelse:
+            self.visit(statement)
+
+    def visit_ExceptHandler(self, node):
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name:
+            self._bind(node.name)
+        for statement in node.body:
+            self.visit(statement)
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._visit_signature(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+        self._bind(node.name)
+
+        self._enter('function')
+        self._bind_arguments(node.args)
+        for statement in node.body:
+            self.visit(statement)
+        self._exit()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self._visit_signature(node.args, annotations=False)
+        self._enter('function')
+        self._bind_arguments(node.args)
+        self.visit(node.body)
+        self._exit()
+
+    def visit_ClassDef(self, node):
+        for expression in node.decorator_list + node.bases + node.keywords:
+            self.visit(expression)
+
+        self._enter('class')
+        for statement in node.body:
+            self.visit(statement)
+        self._exit()
+        self._bind(node.name)
+
+    def _visit_signature(self, args: ast.arguments, annotations: bool = True):
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        if annotations:
+            for arg in _all_arguments(args):
+                if arg.annotation is not None:
+                    self.visit(arg.annotation)
+
+    def _bind_arguments(self, args: ast.arguments):
+        for arg in _all_arguments(args):
+            self._bind(arg.arg)
+
+    # Comprehensions get their own scope; the first iterable is evaluated outside it
+
+    def _visit_comprehension(self, node, *elements):
+        generators = node.generators
+        self.visit(generators[0].iter)
+        self._enter('comprehension')
+        for i, generator in enumerate(generators):
+            if i:
+                self.visit(generator.iter)
+            self.visit(generator.target)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for element in elements:
+            self.visit(element)
+        self._exit()
+
+    def visit_ListComp(self, node):
+        self._visit_comprehension(node, node.elt)
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._visit_comprehension(node, node.key, node.value)
+
+    def visit_NamedExpr(self, node):
+        self.visit(node.value)
+        # Binds in the nearest enclosing scope that is not a comprehension
+        scope = self.scope
+        while scope.kind == 'comprehension':
+            scope = scope.parent
+        current, self.scope = self.scope, scope
+        self._bind(node.target.id)
+        self.scope = current
+
+    # Pattern matching captures
+
+    def visit_MatchAs(self, node):
+        self.generic_visit(node)
+        if node.name:
+            self._bind(node.name)
+
+    def visit_MatchStar(self, node):
+        if node.name:
+            self._bind(node.name)
+
+    def visit_MatchMapping(self, node):
+        self.generic_visit(node)
+        if node.rest:
+            self._bind(node.rest)
+
+
+def _all_arguments(args: ast.arguments) -> List[ast.arg]:
+    arguments = args.posonlyargs + args.args + args.kwonlyargs
+    if args.vararg:
+        arguments.append(args.vararg)
+    if args.kwarg:
+        arguments.append(args.kwarg)
+    return arguments
+
+
+def _used_before_assignment(name: str, position: Tuple[int, int]) -> Dict[str, Any]:
+    return {
+        'type': 'used_before_assignment',
+        'line': position[0],
+        'column': position[1],
+        'message': f"Variable '{name}' is used before it is assigned",
+        'severity': 'error'
+    }
+
+
+def _undefined(name: str, position: Tuple[int, int]) -> Dict[str, Any]:
+    return {
+        'type': 'undefined_name',
+        'line': position[0],
+        'column': position[1],
+        'message': f"Name '{name}' is not defined",
+        'severity': 'error'
+    }
+
+
+def collect_symbols(tree: ast.Module) -> SymbolSummary:
+    """Build the symbol summary of a parsed module in one pass"""
+    collector = _SymbolCollector()
+    for statement in tree.body:
+        collector.visit_statement(statement)
+    return collector.finish()
+
+
+def resolve_symbols(summaries: Iterable[Tuple[SymbolSummary, int]]) -> List[Dict[str, Any]]:
+    """Turn the summaries of a module's parts, in source order, into issues.
+
+    Each summary comes with the line offset of its part. A module-level
+    read is fine if an earlier part (or earlier code in the same part)
+    assigned the name; a read inside a function is fine if any part does.
+    Each name is reported once, at its first problem.
+    """
+    summaries = list(summaries)
+    everywhere, via_global = set(), set()
+    for summary, _ in summaries:
+        everywhere |= summary.bound
+        via_global |= summary.global_bound
+    # Set by a function call whose timing we cannot follow; trust it
+    everywhere |= via_global
+    if any(summary.star_import for summary, _ in summaries):
+        # Any name could have come from the star import
+        return sorted((dict(issue, line=issue['line'] + offset)
+                       for summary, offset in summaries for issue in summary.issues),
+                      key=lambda issue: issue['line'])
+
+    issues = []
+    reported = set()
+    seen = set()
+    for summary, offset in summaries:
+        for issue in summary.issues:
+            issues.append(dict(issue, line=issue['line'] + offset))
+        for name, (line, column) in summary.pending:
+            if name in seen or name in reported or name in via_global:
+                continue
+            reported.add(name)
+            if name in everywhere:
+                issues.append(_used_before_assignment(name, (line + offset, column)))
+            else:
+                issues.append(_undefined(name, (line + offset, column)))
+        seen |= summary.bound
+
+    for summary, offset in summaries:
+        for name, (line, column) in summary.deferred:
+            if name not in everywhere and name not in reported:
+                reported.add(name)
+                issues.append(_undefined(name, (line + offset, column)))
+
+    issues.sort(key=lambda issue: issue['line'])
+    return issues
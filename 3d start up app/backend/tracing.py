@@ -0,0 +1,231 @@
+# Tracing Module - Line-level tracing of student programs
+import sys
+import time
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+# sys.monitoring (Python 3.12+) has far cheaper per-event dispatch than sys.settrace
+_monitoring = getattr(sys, 'monitoring', None)
+
+# Line events coverage may record per run. Each costs roughly 1us under
+# sys.settrace (well under with sys.monitoring), so coverage adds at most
+# about a tenth of a second before tracing switches itself off.
+COVERAGE_MAX_EVENTS = 100000
+
+
+class LineTracer:
+    """Record how often each line of the student program runs, and optionally how long.
+
+    Only frames running code compiled under ``filename`` are traced; library
+    code and the sandbox itself run untraced. Time is cumulative: a line is
+    charged from its line event until the next event in the same frame, so
+    the calls it makes are included. Recursive frames are only timed in the
+    outermost call, so a recursive function's time is not counted twice.
+
+    With ``arcs`` every transition between two lines of the same frame is
+    counted as well, which is what branch and loop coverage are derived
+    from. Line 0 stands for entering or leaving the frame.
+
+    After ``max_events`` line events recording stops and ``truncated`` is
+    set; tracing then switches itself off for the rest of the run, so the
+    cost of tracing a long-running program stays bounded.
+
+    ``limit`` is a hard budget of line events: ``events`` keeps counting
+    (tracing stays on) and ``on_limit`` is called, and expected to raise,
+    on every line event once the budget is used up. ``exceeded`` records
+    the overrun, so it is known even if the student code caught every
+    raise. sys.settrace drops a hook that raises, so under it only the
+    first raise comes from here. Counting only the student's own lines
+    makes this budget identical on every run, however busy the machine is.
+
+    With ``process_wide`` (sandbox workers only) sys.monitoring is used when
+    the interpreter has it; otherwise sys.settrace traces the current thread.
+    """
+
+    def __init__(self, filename: str, timing: bool = False, arcs: bool = False,
+                 max_events: Optional[int] = None, limit: Optional[int] = None,
+                 on_limit: Optional[Callable[[], None]] = None, process_wide: bool = False):
+        self.filename = filename
+        self.timing = timing
+        self.max_events = max_events
+        self.limit = limit
+        self.on_limit = on_limit
+        self.hits: Dict[int, int] = {}
+        self.times: Dict[int, float] = {}
+        self.calls: Dict[int, int] = {}  # keyed by the code object's first line
+        self.arcs: Optional[Dict[Tuple[int, int], int]] = {} if arcs else None
+        self.events = 0
+        self.truncated = False
+        self.exceeded = False
+        self._stack = []  # [previous line, started, code, timed] per active student frame
+        self._depth: Dict[Any, int] = {}  # active frames per code object
+        self._use_monitoring = process_wide and _monitoring is not None
+        self._previous_trace = None
+        self._attached = False
+
+    def __enter__(self):
+        if self._use_monitoring:
+            try:
+                _monitoring.use_tool_id(_monitoring.PROFILER_ID, 'student-line-tracer')
+            except ValueError:
+                self._use_monitoring = False
+
+        if self._use_monitoring:
+            events = _monitoring.events
+            for event, callback in self._monitoring_callbacks():
+                _monitoring.register_callback(_monitoring.PROFILER_ID, event, callback)
+            # Locations disabled during an earlier run may belong to reused code
+            _monitoring.restart_events()
+            _monitoring.set_events(
+                _monitoring.PROFILER_ID,
+                events.PY_START | events.PY_RESUME | events.PY_THROW | events.LINE
+                | events.PY_RETURN | events.PY_YIELD | events.PY_UNWIND
+            )
+        else:
+            self._previous_trace = sys.gettrace()
+            sys.settrace(self._trace_call)
+        self._attached = True
+        return self
+
+    def __exit__(self, *exc_info):
+        self._detach()
+        if self._use_monitoring:
+            for event, _ in self._monitoring_callbacks():
+                _monitoring.register_callback(_monitoring.PROFILER_ID, event, None)
+            _monitoring.free_tool_id(_monitoring.PROFILER_ID)
+
+        # Frames still open (e.g. stopped by a budget) are charged up to now
+        while self._stack:
+            self._leave()
+        return False
+
+    def _detach(self):
+        """Stop receiving events; safe to call from inside an event handler"""
+        if not self._attached:
+            return
+        self._attached = False
+        if self._use_monitoring:
+            _monitoring.set_events(_monitoring.PROFILER_ID, 0)
+        else:
+            sys.settrace(self._previous_trace)
+
+    # Event handlers shared by both backends
+
+    def _enter(self, code):
+        if code.co_name != '<module>':
+            first_line = code.co_firstlineno
+            self.calls[first_line] = self.calls.get(first_line, 0) + 1
+        depth = self._depth.get(code, 0)
+        self._depth[code] = depth + 1
+        self._stack.append([None, 0.0, code, self.timing and depth == 0])
+
+    def _line(self, lineno: int) -> bool:
+        """Record a line event; returns False once tracing has been switched off"""
+        self.events += 1
+        if self.limit is not None and self.events > self.limit:
+            self.exceeded = True
+            self.on_limit()
+
+        if self.truncated:
+            return True  # Still attached only to enforce the limit
+        if self.max_events is not None and self.events > self.max_events:
+            self.truncated = True
+            if self.limit is None:
+                self._detach()
+                return False
+            return True
+
+        self.hits[lineno] = self.hits.get(lineno, 0) + 1
+        if not self._stack:
+            return True
+        frame = self._stack[-1]
+        if self.arcs is not None:
+            arc = (frame[0] or 0, lineno)
+            self.arcs[arc] = self.arcs.get(arc, 0) + 1
+        if frame[3]:
+            now = time.perf_counter()
+            if frame[0] is not None:
+                self.times[frame[0]] = self.times.get(frame[0], 0.0) + now - frame[1]
+            frame[1] = now
+        frame[0] = lineno
+        return True
+
+    def _leave(self):
+        if not self._stack:
+            return
+        line, started, code, timed = self._stack.pop()
+        self._depth[code] -= 1
+        if line is not None:
+            if timed:
+                self.times[line] = self.times.get(line, 0.0) + time.perf_counter() - started
+            if self.arcs is not None and not self.truncated:
+                self.arcs[(line, 0)] = self.arcs.get((line, 0), 0) + 1
+
+    # sys.settrace backend
+
+    def _trace_call(self, frame, event, arg):
+        if frame.f_code.co_filename != self.filename:
+            return None
+        self._enter(frame.f_code)
+        return self._trace_local
+
+    def _trace_local(self, frame, event, arg):
+        if event == 'line':
+            if not self._line(frame.f_lineno):
+                return None
+        elif event == 'return':
+            self._leave()
+        return self._trace_local
+
+    # sys.monitoring backend
+
+    def _monitoring_callbacks(self):
+        events = _monitoring.events
+        return [
+            (events.PY_START, self._monitor_start),
+            (events.PY_RESUME, self._monitor_start),
+            (events.PY_THROW, self._monitor_throw),
+            (events.LINE, self._monitor_line),
+            (events.PY_RETURN, self._monitor_leave),
+            (events.PY_YIELD, self._monitor_leave),
+            (events.PY_UNWIND, self._monitor_unwind),
+        ]
+
+    def _monitor_start(self, code, offset):
+        if code.co_filename != self.filename:
+            return _monitoring.DISABLE
+        self._enter(code)
+
+    def _monitor_throw(self, code, offset, exception):
+        # Cannot be disabled, so non-student code is skipped by hand
+        if code.co_filename == self.filename:
+            self._enter(code)
+
+    def _monitor_line(self, code, lineno):
+        if code.co_filename != self.filename:
+            return _monitoring.DISABLE
+        self._line(lineno)
+
+    def _monitor_leave(self, code, offset, value):
+        if code.co_filename != self.filename:
+            return _monitoring.DISABLE
+        self._leave()
+
+    def _monitor_unwind(self, code, offset, exception):
+        if code.co_filename == self.filename:
+            self._leave()
+
+    def line_stats(self) -> List[Dict[str, Any]]:
+        """Per-line hits (plus calls for function definitions and time when timed)"""
+        stats = []
+        for line in sorted(set(self.hits) | set(self.calls)):
+            entry = {'line': line, 'hits': self.hits.get(line, 0)}
+            if line in self.calls:
+                entry['calls'] = self.calls[line]
+            if self.timing:
+                entry['time'] = round(self.times.get(line, 0.0), 6)
+            stats.append(entry)
+        return stats
+
+    def arc_stats(self) -> List[List[int]]:
+        """``[from_line, to_line, count]`` for every line transition seen"""
+        return [[start, end, count] for (start, end), count in sorted((self.arcs or {}).items())]
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/analyze_code: separate parses and walks vs. the shared AST pipeline
+
+The separate side is a copy of the analyzer and code flowchart passes as they
+were before the shared pipeline: two parses, one ast.walk for the flowchart
+and two for the checks. The shared side parses once and runs the same four
+checks and the flowchart builder on one walk, so both sides do the same work.
+On the generated sources below (100 to 30k lines) the shared pipeline
+measured about 1.3-1.6x faster from run to run, with no clear trend by size.
+
+That speedup leaves out the rules added since. The undefined-name and
+performance rules still make their own passes over the tree (see scopes and
+antipatterns), so /api/analyze_code, which runs every rule, costs more than
+either side. The last column times the shared pipeline with every rule, as
+the route runs it (without its caches), and is not part of the speedup.
+
+Usage: python benchmark_analysis.py [repeats]
+"""
+
+import ast
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from code_executor import CodeExecutor
+from flowchart_generator import FlowchartGenerator
+from rules import RuleEngine, InfiniteLoopRule, DivisionByZeroRule, LineTooLongRule, TrailingWhitespaceRule
+
+
+def make_source(functions):
+    """A student-style program with the given number of functions"""
+    parts = []
+    for i in range(functions):
+        parts.append(
+            f"def step_{i}(values, limit={i}):\n"
+            f"    total = 0\n"
+            f"    for value in values:\n"
+            f"        if value % 3 == 0 and value > limit:\n"
+            f"            total += value * 2\n"
+            f"        elif value:\n"
+            f"            total -= value / 2\n"
+            f"    while total > 100:\n"
+            f"        total = total // 2\n"
+            f"    return [v + total for v in values if v]\n"
+        )
+    parts.append("print(step_0(list(range(10))))\n")
+    return '\n'.join(parts)
+
+
+# The separate passes, as they were
+
+def _chart_node(nodes, edges, prev_id, node_type, label, y_pos):
+    node_id = f"node_{len(nodes) + 1}"
+    nodes.append({'id': node_id, 'type': node_type, 'label': label, 'x': 100, 'y': y_pos})
+    edges.append({'from': prev_id, 'to': node_id, 'label': ''})
+    return node_id
+
+
+def separate_flowchart(code):
+    """FlowchartGenerator.generate_from_code: its own parse and ast.walk"""
+    tree = ast.parse(code)
+    nodes = [{'id': 'node_1', 'type': 'start', 'label': 'Start', 'x': 100, 'y': 50}]
+    edges = []
+    prev_id = 'node_1'
+    y_pos = 150
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            prev_id = _chart_node(nodes, edges, prev_id, 'process', f"Define {node.name}", y_pos)
+        elif isinstance(node, ast.If):
+            prev_id = _chart_node(nodes, edges, prev_id, 'decision', f"If {ast.unparse(node.test)}", y_pos)
+        elif isinstance(node, ast.For):
+            label = f"For {ast.unparse(node.target)} in {ast.unparse(node.iter)}"
+            prev_id = _chart_node(nodes, edges, prev_id, 'loop', label, y_pos)
+        elif isinstance(node, ast.While):
+            prev_id = _chart_node(nodes, edges, prev_id, 'loop', f"While {ast.unparse(node.test)}", y_pos)
+        else:
+            continue
+        y_pos += 100
+    _chart_node(nodes, edges, prev_id, 'end', 'End', y_pos)
+    nodes[-1]['type'] = 'end'
+    return {'nodes': nodes, 'edges': edges, 'title': 'Code Flow Diagram'}
+
+
+def separate_analysis(code):
+    """CodeExecutor.analyze_code: its own parse, one ast.walk per _check_* method, then the lines"""
+    tree = ast.parse(code)
+    issues = []
+    for node in ast.walk(tree):
+        # _check_syntax_issues looked at every loaded name and found nothing
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            pass
+    for node in ast.walk(tree):
+        if isinstance(node, ast.While):
+            if isinstance(node.test, ast.Constant) and node.test.value is True:
+                issues.append({'type': 'potential_infinite_loop', 'line': node.lineno,
+                               'message': 'Potential infinite loop detected (while True without break)',
+                               'severity': 'warning'})
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div):
+            if isinstance(node.right, ast.Constant) and node.right.value == 0:
+                issues.append({'type': 'division_by_zero', 'line': node.lineno,
+                               'message': 'Division by zero detected', 'severity': 'error'})
+    for i, line in enumerate(code.split('\n'), 1):
+        if len(line) > 100:
+            issues.append({'type': 'line_too_long', 'line': i,
+                           'message': f'Line too long ({len(line)} characters)', 'severity': 'style'})
+        if line.endswith(' ') or line.endswith('\t'):
+            issues.append({'type': 'trailing_whitespace', 'line': i,
+                           'message': 'Trailing whitespace detected', 'severity': 'style'})
+    return issues
+
+
+def separate_passes(executor, generator, code):
+    """What the route used to do: one parse and one walk per consumer"""
+    return separate_flowchart(code), separate_analysis(code)
+
+
+def shared_pipeline(executor, generator, code):
+    """What the route does now, with the same checks: one parse, one walk"""
+    tree = ast.parse(code)
+    builder = generator.code_flowchart_builder()
+    errors = executor.analyze_code(code, tree=tree, visitors=[builder])
+    return builder.flowchart(), errors
+
+
+def every_rule(executor, generator, code):
+    """What the route does now: one parse and one walk, then the rules' own passes"""
+    return shared_pipeline(executor, generator, code)
+
+
+def same_results(before, after):
+    """Both sides chart the same nodes and report the same issues"""
+    def chart(flowchart):
+        return [(node['type'], node['label']) for node in flowchart['nodes']]
+
+    def issues(errors):
+        return sorted((issue['type'], issue['line']) for issue in errors)
+
+    return chart(before[0]) == chart(after[0]) and issues(before[1]) == issues(after[1])
+
+
+def best_of(func, repeats, *args):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    executor = CodeExecutor(pool_size=0)
+    executor.rules = RuleEngine([InfiniteLoopRule(), DivisionByZeroRule(),
+                                 LineTooLongRule(), TrailingWhitespaceRule()])
+    route = CodeExecutor(pool_size=0)
+    generator = FlowchartGenerator()
+
+    print("Same four checks on both sides; 'all rules' is the route's full rule set, not in the speedup")
+    print(f"{'lines':>8} {'separate (ms)':>14} {'shared (ms)':>12} {'speedup':>8} {'all rules (ms)':>15}")
+    for functions in (10, 100, 1000, 3000):
+        code = make_source(functions)
+        assert same_results(separate_passes(executor, generator, code), shared_pipeline(executor, generator, code))
+        before = best_of(separate_passes, repeats, executor, generator, code)
+        after = best_of(shared_pipeline, repeats, executor, generator, code)
+        full = best_of(every_rule, repeats, route, generator, code)
+        print(f"{code.count(chr(10)):>8} {before * 1000:>14.1f} {after * 1000:>12.1f} {before / after:>7.2f}x "
+              f"{full * 1000:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
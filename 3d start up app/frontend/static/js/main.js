@@ -153,7 +153,7 @@ function initializeEventListeners() {
     if (helpBtn) helpBtn.addEventListener('click', showHelpModal);
 }
 
-// Execute Python code
+// Execute Python code, streaming output as the program produces it
 async function executeCode() {
     if (!codeEditor) return;
     
@@ -166,7 +166,7 @@ async function executeCode() {
     showLoading(true);
     
     try {
-        const response = await fetch('/api/execute_code', {
+        const response = await fetch('/api/execute_code/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -174,18 +174,32 @@ async function executeCode() {
             body: JSON.stringify({ code: code })
         });
         
-        const result = await response.json();
+        if (!response.ok || !response.body) {
+            // Streaming not available on this server - wait for the whole run
+            await executeCodeBuffered(code);
+            return;
+        }
+        
+        showLoading(false);
+        const streamOutput = startStreamingOutput();
+        let finalResult = null;
+        
+        await readServerSentEvents(response, (event, data) => {
+            if (event === 'stdout') {
+                streamOutput.textContent += data.text;
+            } else if (event === 'done') {
+                finalResult = data.result;
+            }
+        });
+        
+        if (!finalResult) {
+            throw new Error('Stream ended before the program finished');
+        }
         
-        if (result.success) {
-            displayOutput(result.result);
+        displayOutput(finalResult);
+        if (finalResult.success) {
             showNotification('Code executed successfully!', 'success');
         } else {
-            displayOutput({
-                success: false,
-                error: result.error,
-                output: '',
-                execution_time: 0
-            });
             showNotification('Code execution failed!', 'error');
         }
     } catch (error) {
@@ -202,6 +216,129 @@ async function executeCode() {
     }
 }
 
+// Execute Python code and wait for the complete result
+async function executeCodeBuffered(code) {
+    const response = await fetch('/api/execute_code', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ code: code })
+    });
+    
+    const result = await response.json();
+    
+    if (result.success) {
+        displayOutput(result.result);
+        showNotification('Code executed successfully!', 'success');
+    } else {
+        displayOutput({
+            success: false,
+            error: result.error,
+            output: '',
+            execution_time: 0
+        });
+        showNotification('Code execution failed!', 'error');
+    }
+}
+
+// Responses to analysis requests by URL and body, with the ETag the server tagged them with
+const taggedResponses = new Map();
+const TAGGED_RESPONSES_MAX = 50;
+
+// POST JSON; when we already hold the response the server answers 304 and it is reused
+async function postJSONWithETag(url, payload) {
+    const body = JSON.stringify(payload);
+    const key = url + '\n' + body;
+    const known = taggedResponses.get(key);
+    
+    const headers = {
+        'Content-Type': 'application/json',
+    };
+    if (known) {
+        headers['If-None-Match'] = known.etag;
+    }
+    
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: headers,
+        body: body
+    });
+    
+    let result;
+    if (response.status === 304 && known) {
+        result = known.result;
+    } else {
+        result = await response.json();
+    }
+    
+    const etag = response.headers.get('ETag');
+    taggedResponses.delete(key);
+    if (etag) {
+        taggedResponses.set(key, { etag: etag, result: result });
+        if (taggedResponses.size > TAGGED_RESPONSES_MAX) {
+            taggedResponses.delete(taggedResponses.keys().next().value);
+        }
+    }
+    return result;
+}
+
+// Read a text/event-stream response, calling onEvent(event, data) per event
+async function readServerSentEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            });
+            
+            // Comment-only frames are keep-alives
+            if (data) {
+                onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+}
+
+// Show a live output panel and return the element output is appended to
+function startStreamingOutput() {
+    const outputContainer = document.getElementById('output-container');
+    const pre = document.createElement('pre');
+    pre.className = 'output-content';
+    
+    if (outputContainer) {
+        outputContainer.innerHTML = `
+            <div class="output-success">
+                <div class="output-header">
+                    <i class="fas fa-spinner fa-spin"></i>
+                    <span>Running...</span>
+                </div>
+            </div>
+        `;
+        outputContainer.firstElementChild.appendChild(pre);
+    }
+    
+    return pre;
+}
+
 // Display code output
 function displayOutput(result) {
     const outputContainer = document.getElementById('output-container');
@@ -41,15 +41,7 @@ async function generateFlowchartFromProblem() {
     showLoading(true);
     
     try {
-        const response = await fetch('/api/generate_flowchart', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ problem: problem })
-        });
-        
-        const result = await response.json();
+        const result = await postJSONWithETag('/api/generate_flowchart', { problem: problem });
         
         if (result.success) {
             // Render the flowchart
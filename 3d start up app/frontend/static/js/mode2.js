@@ -38,35 +38,151 @@ function initializeMode2() {
     // Auto-analyze on code change (debounced)
     if (codeEditor) {
         let analysisTimeout;
-        codeEditor.on('change', function() {
+        codeEditor.on('change', function(editor, change) {
+            // Keep every edit so auto-analysis only sends what changed
+            incrementalAnalysis.edits.push({ from: change.from, to: change.to, text: change.text });
             clearTimeout(analysisTimeout);
             analysisTimeout = setTimeout(autoAnalyze, 2000); // 2 second delay
         });
     }
 }
 
-async function analyzeCode() {
-    if (!codeEditor) return;
-    
-    const code = codeEditor.getValue().trim();
-    if (!code || code === '# Write your Python code here') {
-        showNotification('Please write some code first!', 'warning');
+// The server keeps a copy of the document; auto-analysis sends it edits and gets back
+// per-statement results (segments) for the parts that changed
+const incrementalAnalysis = {
+    version: 0,
+    synced: false,
+    inFlight: false,
+    edits: [],
+    segments: new Map(),
+    order: [],
+    programIssues: [],
+    syntaxError: null,
+    syntaxErrors: []
+};
+
+async function analyzeIncrementally() {
+    const state = incrementalAnalysis;
+    if (state.inFlight) {
+        setTimeout(analyzeIncrementally, 500);
         return;
     }
     
-    showLoading(true);
+    const edits = state.edits;
+    state.edits = [];
+    const body = state.synced
+        ? { version: state.version + 1, base_version: state.version, edits: edits }
+        : { version: state.version + 1, code: codeEditor.getValue() };
     
+    state.inFlight = true;
     try {
-        const response = await fetch('/api/analyze_code', {
+        const response = await fetch('/api/analyze_code/incremental', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ code: code })
+            body: JSON.stringify(body)
         });
         
         const result = await response.json();
         
+        if (!result.success) {
+            // Out of sync with the server; the next round sends the whole document
+            state.synced = false;
+            if (result.resync) {
+                state.inFlight = false;
+                return analyzeIncrementally();
+            }
+            return;
+        }
+        
+        state.version = result.version;
+        state.synced = true;
+        applyAnalysisDelta(result);
+        
+        if (state.syntaxError) {
+            // Every syntax error the server found, one error node each
+            const syntaxErrors = state.syntaxErrors.length ? state.syntaxErrors : [state.syntaxError];
+            renderFlowchart({
+                nodes: syntaxErrors.map((error, i) => ({ id: `error_node_${i}`, type: 'error', label: `Syntax Error: ${error.message}`, x: 100, y: 100 + i * 100 })),
+                edges: [],
+                title: 'Error in Code'
+            });
+            displayErrors(syntaxErrors);
+        } else {
+            renderFlowchart(assembleFlowchart());
+            displayErrors(state.programIssues.concat(state.order.flatMap(id => state.segments.get(id).issues)));
+        }
+    } catch (error) {
+        console.error('Error analyzing code:', error);
+        state.synced = false;
+    } finally {
+        state.inFlight = false;
+    }
+}
+
+function applyAnalysisDelta(delta) {
+    const segments = incrementalAnalysis.segments;
+    
+    delta.removed.forEach(id => segments.delete(id));
+    delta.added.forEach(segment => segments.set(segment.id, segment));
+    
+    // Statements after an edit only shift up or down
+    delta.moved.forEach(move => {
+        const segment = segments.get(move.id);
+        const shift = move.start_line - segment.start_line;
+        segment.start_line = move.start_line;
+        segment.end_line = move.end_line;
+        segment.issues = segment.issues.map(issue => ({ ...issue, line: issue.line + shift }));
+        segment.nodes = segment.nodes.map(node => ({ ...node, line: node.line + shift, end_line: node.end_line + shift }));
+    });
+    
+    incrementalAnalysis.order = delta.order;
+    incrementalAnalysis.programIssues = delta.program_issues;
+    incrementalAnalysis.syntaxError = delta.syntax_error;
+    incrementalAnalysis.syntaxErrors = delta.syntax_errors || [];
+}
+
+function assembleFlowchart() {
+    // Chain the segments' flowchart fragments between Start and End
+    const nodes = [{ id: 'start', type: 'start', label: 'Start', x: 100, y: 50 }];
+    const edges = [];
+    let previous = 'start';
+    let y = 150;
+    
+    incrementalAnalysis.order.forEach(id => {
+        const segment = incrementalAnalysis.segments.get(id);
+        if (!segment.nodes.length) return;
+        
+        segment.nodes.forEach(node => {
+            nodes.push({ ...node, x: 100, y: y });
+            y += 100;
+        });
+        edges.push({ from: previous, to: segment.nodes[0].id, label: '' });
+        edges.push(...segment.edges);
+        previous = segment.nodes[segment.nodes.length - 1].id;
+    });
+    
+    nodes.push({ id: 'end', type: 'end', label: 'End', x: 100, y: y });
+    edges.push({ from: previous, to: 'end', label: '' });
+    
+    return { nodes: nodes, edges: edges, title: 'Code Flow Diagram' };
+}
+
+async function analyzeCode() {
+    if (!codeEditor) return;
+    
+    const code = codeEditor.getValue().trim();
+    if (!code || code === '# Write your Python code here') {
+        showNotification('Please write some code first!', 'warning');
+        return;
+    }
+    
+    showLoading(true);
+    
+    try {
+        const result = await postJSONWithETag('/api/analyze_code', { code: code });
+        
         if (result.success) {
             // Render the flowchart
             renderFlowchart(result.flowchart);
@@ -120,6 +236,7 @@ function displayErrors(errors) {
             <div class="error-content">
                 <div class="error-type">${error.type.replace(/_/g, ' ')}</div>
                 <div class="error-message">${error.message}</div>
+                ${error.suggestion ? `<div class="error-suggestion">${error.suggestion}</div>` : ''}
                 ${error.line ? `<div class="error-line">Line ${error.line}</div>` : ''}
             </div>
         `;
@@ -142,7 +259,8 @@ function getErrorIcon(severity) {
     const icons = {
         error: 'exclamation-circle',
         warning: 'exclamation-triangle',
-        style: 'info-circle'
+        style: 'info-circle',
+        info: 'tachometer-alt'
     };
     return icons[severity] || 'info-circle';
 }
@@ -194,6 +312,9 @@ function provideAnalysisFeedback(flowchartData, errors) {
         if (errorCounts.style) {
             feedback += `• ${errorCounts.style} style suggestion(s)\n`;
         }
+        if (errorCounts.info) {
+            feedback += `• ${errorCounts.info} speed-up tip(s)\n`;
+        }
         
         feedback += `\nClick on any error above to jump to that line in your code!`;
     } else {
@@ -214,7 +335,7 @@ function autoAnalyze() {
     
     const code = codeEditor.getValue().trim();
     if (code && code !== '# Write your Python code here' && code.length > 10) {
-        analyzeCode();
+        analyzeIncrementally();
     }
 }
 
@@ -0,0 +1,853 @@
+#!/usr/bin/env python3
+"""
+Test the sandboxed code executor
+"""
+
+import os
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from code_executor import CodeExecutor
+
+
+def test_pool_returns_result_dict():
+    """Code run on the worker pool returns the usual result dict"""
+    executor = CodeExecutor(pool_size=1)
+    try:
+        result = executor.execute_code('print(sum(range(10)))')
+        assert result['success'] is True
+        assert result['output'] == '45\n'
+        assert result['error'] is None
+        assert 'execution_time' in result
+
+        result = executor.execute_code('x = 1 / 0')
+        assert result['success'] is False
+        assert result['error'] == 'division by zero'
+        assert 'ZeroDivisionError' in result['traceback']
+    finally:
+        executor.pool.shutdown()
+
+
+def test_pool_recycles_and_replaces_workers():
+    """Workers are recycled after max runs and replaced after dying"""
+    executor = CodeExecutor(pool_size=1, max_runs_per_worker=2)
+    pool = executor.pool
+    try:
+        for _ in range(3):
+            assert executor.execute_code('print(1)')['output'] == '1\n'
+        assert pool.stats()['workers_recycled'] == 1
+
+        # Kill the idle worker behind the pool's back
+        worker = pool._idle.get()
+        worker.process.kill()
+        worker.process.join()
+        pool._idle.put(worker)
+
+        assert executor.execute_code('print(2)')['output'] == '2\n'
+        assert pool.stats()['workers_crashed'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_in_process_fallback():
+    """A pool size of zero runs code in-process"""
+    executor = CodeExecutor(pool_size=0)
+    assert executor.pool is None
+    assert executor.execute_code('print("hi")')['output'] == 'hi\n'
+    assert executor.execute_code('import os')['success'] is False
+
+
+def test_budgets_stop_runaway_code():
+    """Wall-clock and output budgets stop the program and report the limit"""
+    executor = CodeExecutor(pool_size=1)
+    executor.budget.wall_time = 0.5
+    executor.budget.output_bytes = 100
+    try:
+        result = executor.execute_code('print("start")\nwhile True:\n    pass')
+        assert result['success'] is False
+        assert result['limit_exceeded'] == 'wall_time'
+        assert result['output'] == 'start\n'
+        assert result['usage']['cpu_time'] > 0
+
+        result = executor.execute_code('for i in range(10**6):\n    print(i)')
+        assert result['limit_exceeded'] == 'output'
+        assert result['output'].startswith('0\n1\n2\n')
+
+        # A bare except cannot swallow the limit: it is raised again until the program stops
+        workers_crashed = executor.pool.stats()['workers_crashed']
+        result = executor.execute_code(
+            'for attempt in range(3):\n    try:\n        while True:\n            pass\n'
+            '    except:\n        print("caught")\nprint("survived")'
+        )
+        assert result['limit_exceeded'] == 'wall_time'
+        assert result['output'] == 'caught\ncaught\ncaught\nsurvived\n'
+        assert result['usage']['cpu_time'] > 0
+        assert executor.pool.stats()['workers_crashed'] == workers_crashed
+
+        # The worker is still usable afterwards
+        assert executor.execute_code('print(1)')['limit_exceeded'] is None
+    finally:
+        executor.pool.shutdown()
+
+
+def test_in_process_runs_keep_the_wall_clock_budget():
+    """Without a pool the wall-clock budget still stops the program, and the thread is reusable"""
+    executor = CodeExecutor(pool_size=0)
+    executor.budget.wall_time = 0.3
+
+    result = executor.execute_code('print("start")\nwhile True:\n    pass')
+    assert result['limit_exceeded'] == 'wall_time'
+    assert result['output'] == 'start\n'
+
+    result = executor.execute_code(
+        'for attempt in range(3):\n    try:\n        while True:\n            pass\n'
+        '    except:\n        print("caught")\nprint("survived")'
+    )
+    assert result['limit_exceeded'] == 'wall_time'
+    assert result['output'] == 'caught\ncaught\ncaught\nsurvived\n'
+
+    result = executor.execute_code('print(1)')
+    assert result['limit_exceeded'] is None and result['output'] == '1\n'
+
+
+def test_concurrent_runs_keep_their_own_output():
+    """In-process runs on different threads never see each other's output"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = CodeExecutor(pool_size=0)
+    code = 'for i in range(200):\n    print("{tag}")'
+
+    with ThreadPoolExecutor(max_workers=8) as threads:
+        results = list(threads.map(
+            lambda tag: (tag, executor.execute_code(code.format(tag=tag))),
+            ['run%d' % n for n in range(16)]
+        ))
+
+    for tag, result in results:
+        assert result['output'] == (tag + '\n') * 200
+
+
+def test_output_keeps_head_and_tail(monkeypatch):
+    """Without stopping, only the head and tail of huge output are kept"""
+    assert CodeExecutor(pool_size=0).budget.stop_on_output_limit is True
+    monkeypatch.setenv('STOP_ON_OUTPUT_LIMIT', '0')
+    executor = CodeExecutor(pool_size=0)
+    executor.budget.output_bytes = 100
+    assert executor.budget.stop_on_output_limit is False
+
+    result = executor.execute_code('for i in range(10000):\n    print(i)')
+    assert result['success'] is True
+    assert result['output_truncated'] is True
+    assert result['usage']['output_bytes'] == sum(len(str(i)) + 1 for i in range(10000))
+    assert result['output'].startswith('0\n1\n2\n')
+    assert result['output'].endswith('9998\n9999\n')
+    assert 'bytes of output omitted' in result['output']
+
+
+def test_stream_yields_output_before_result():
+    """Streaming runs yield stdout chunks and finish with the result dict"""
+    executor = CodeExecutor(pool_size=1)
+    try:
+        events = list(executor.execute_code_stream('print("a")\nprint("b")'))
+        kinds = [kind for kind, _ in events]
+        assert kinds[-1] == 'result'
+        assert ''.join(payload for kind, payload in events if kind == 'stdout') == 'a\nb\n'
+        assert events[-1][1]['output'] == 'a\nb\n'
+
+        # Abandoning a stream stops the program and frees the worker
+        events = executor.execute_code_stream('print("x")\nwhile True:\n    pass')
+        assert next(events) == ('stdout', 'x\n')
+        events.close()
+        assert executor.pool.stats()['workers_killed'] == 1
+        assert executor.execute_code('print(1)')['output'] == '1\n'
+    finally:
+        executor.pool.shutdown()
+
+
+def test_compiled_code_is_cached_by_source():
+    """Re-running the same source reuses the validated code object"""
+    executor = CodeExecutor(pool_size=0)
+    code = 'print(6 * 7)'
+
+    assert executor.execute_code(code)['output'] == '42\n'
+    assert executor.execute_code(code)['output'] == '42\n'
+    assert executor.execute_code('import os')['success'] is False
+    assert executor.execute_code('import os')['success'] is False
+
+    stats = executor.code_cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+
+    result = executor.execute_code('return 1')
+    assert result['success'] is False
+    assert 'outside function' in result['error']
+
+
+def test_lru_cache_evicts_by_count_and_size():
+    """The shared LRU cache evicts least recently used entries first"""
+    from cache import LRUCache
+
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+
+    cache = LRUCache(max_entries=10, max_bytes=10, sizeof=len)
+    cache.put('x', 'abcdef')
+    cache.put('y', 'ghijkl')
+    assert 'x' not in cache and 'y' in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_result_cache_only_holds_deterministic_programs():
+    """Pure programs are served from the result cache; impure ones always run"""
+    executor = CodeExecutor(pool_size=0, cache_results=True)
+
+    first = executor.execute_code('print(sorted([3, 1, 2]))')
+    second = executor.execute_code('print(sorted([3, 1, 2]))')
+    assert 'cached' not in first
+    assert second['cached'] is True
+    assert second['output'] == first['output']
+
+    # Set ordering and object addresses can change between runs
+    for code in ['print({"a", "b"})', 'def f():\n    pass\nprint(f)', 'import random']:
+        executor.execute_code(code)
+        assert 'cached' not in executor.execute_code(code)
+
+    assert CodeExecutor(pool_size=0).result_cache is None
+
+
+def test_grader_runs_cases_with_stdin_and_calls():
+    """Each test case gets its own stdin and can check a function's return value"""
+    from grader import Grader
+
+    executor = CodeExecutor(pool_size=2)
+    grader = Grader(executor)
+    try:
+        code = 'def add(a, b):\n    return a + b\nn = int(input())\nprint(n * 2)\n'
+        cases = [
+            {'stdin': '3\n', 'expected_output': '6'},
+            {'stdin': '4\n', 'expected_output': '9\n'},
+            {'stdin': '1\n', 'call': {'function': 'add', 'args': [1, 2]}, 'expected_return': 3},
+        ]
+        assert grader.validate(cases) is None
+        report = grader.grade(code, cases)
+        assert [case['passed'] for case in report['cases']] == [True, False, True]
+        assert report['passed'] == 2 and report['total'] == 3
+        assert '-9' in report['cases'][1]['diff'] and '+8' in report['cases'][1]['diff']
+
+        # Running out of input is an ordinary failure
+        report = grader.grade(code, [{'stdin': '', 'expected_output': ''}])
+        assert report['cases'][0]['passed'] is False
+        assert 'EOF' in report['cases'][0]['error']
+
+        assert grader.validate([]) is not None
+        assert grader.validate([{'expected_return': 1}]) is not None
+    finally:
+        executor.pool.shutdown()
+
+
+def test_job_queue_round_robins_between_clients():
+    """A client with many queued jobs cannot starve another client"""
+    from job_queue import JobQueue, QueueFull
+
+    # No dispatcher threads, so the schedule can be inspected step by step
+    jobs = JobQueue(CodeExecutor(pool_size=0), workers=0, max_depth=5, max_per_client=3)
+    busy = [jobs.submit('print(1)', 'busy') for _ in range(3)]
+    quiet = jobs.submit('print(2)', 'quiet')
+
+    assert jobs.position(quiet) == 1
+    assert jobs.position(busy[2]) == 3
+    try:
+        jobs.submit('print(3)', 'busy')
+        assert False, 'per-client cap not enforced'
+    except QueueFull:
+        pass
+
+    order = [jobs._next_job() for _ in range(4)]
+    assert order == [busy[0], quiet, busy[1], busy[2]]
+    assert jobs.position(quiet) is None
+
+
+def test_job_queue_runs_jobs_in_background():
+    """Submitted jobs finish on their own and can be subscribed to"""
+    from job_queue import JobQueue
+
+    jobs = JobQueue(CodeExecutor(pool_size=0))
+    try:
+        job = jobs.submit('for i in range(3):\n    print(i)', 'client')
+        events = list(jobs.events(job, heartbeat=0.1))
+        assert events[-1][0] == 'result'
+        assert events[-1][1]['output'] == '0\n1\n2\n'
+        assert ''.join(text for kind, text in events if kind == 'stdout') == '0\n1\n2\n'
+        assert jobs.get(job.id).status == 'done'
+        assert jobs.stats()['jobs_completed'] == 1
+    finally:
+        jobs.shutdown()
+
+
+def test_results_report_memory_usage():
+    """Worker results include peak memory, and on request the lines that allocated most"""
+    executor = CodeExecutor(pool_size=1)
+    code = 'small = 1\nbig = [i * 2 for i in range(50000)]\n'
+    try:
+        usage = executor.execute_code(code)['usage']
+        assert usage['peak_memory_bytes'] > 50000 * 8
+        assert 'top_allocations' not in usage
+
+        usage = executor.execute_code(code, trace_memory=True)['usage']
+        assert usage['peak_memory_bytes'] > 50000 * 8
+        assert usage['allocated_blocks'] > 40000
+        assert usage['top_allocations'][0]['line'] == 2
+    finally:
+        executor.pool.shutdown()
+
+
+def test_profile_maps_line_counts_onto_flowchart():
+    """Profiling reports per-line hits and times, keyed back to flowchart nodes"""
+    code = (
+        'def fib(n):\n'
+        '    if n < 2:\n'
+        '        return n\n'
+        '    return fib(n - 1) + fib(n - 2)\n'
+        'for i in range(5):\n'
+        '    print(fib(i))\n'
+    )
+    result = CodeExecutor(pool_size=0).execute_code(code, profile=True)
+    lines = {entry['line']: entry for entry in result['profile']['lines']}
+    assert lines[1]['calls'] == 19
+    assert lines[2]['hits'] == 19
+    assert lines[5]['hits'] == 6
+    assert lines[6]['hits'] == 5
+
+    # node_2 is "Define fib", node_3 the loop, node_4 the if
+    nodes = result['profile']['nodes']
+    assert nodes['node_2']['hits'] == 19
+    assert nodes['node_3']['hits'] == 6
+    assert nodes['node_4']['hits'] == 19
+    # Recursive calls are timed once, so no node takes more than the whole run
+    assert all(0 <= node['share'] <= 1 for node in nodes.values())
+    assert 'profile' not in CodeExecutor(pool_size=0).execute_code(code)
+
+
+def test_coverage_counts_branches_and_loop_iterations():
+    """Coverage turns line transitions into branch and iteration counts per flowchart node"""
+    code = (
+        'i = 0\n'
+        'while True:\n'
+        '    i += 1\n'
+        '    if i > 3:\n'
+        '        break\n'
+        'for a in range(3):\n'
+        '    for b in range(2):\n'
+        '        pass\n'
+    )
+    executor = CodeExecutor(pool_size=0)
+    assert 'coverage' not in executor.execute_code(code)
+    result = executor.execute_code(code, coverage=True)
+    flowchart = result['coverage']['flowchart']
+    assert flowchart['truncated'] is False
+    # Charting a run does not analyze the code, and the chart is kept with the compiled code
+    assert executor.rules.stats()['runs'] == 0
+    chart = executor.compile_code(code).chart
+    assert executor.execute_code(code, coverage=True)['coverage']['flowchart'] == flowchart
+    assert executor.compile_code(code).chart is chart
+
+    # node_2 while, node_3 outer for, node_4 if, node_5 inner for
+    nodes = flowchart['nodes']
+    assert nodes['node_2'] == {'executions': 1, 'iterations': 4}
+    assert nodes['node_3'] == {'executions': 1, 'iterations': 3}
+    assert nodes['node_4'] == {'executions': 4, 'true': 1, 'false': 3}
+    assert nodes['node_5'] == {'executions': 3, 'iterations': 6}
+    assert {'from': 'node_4', 'to': 'node_5', 'weight': 3} in flowchart['edges']
+
+
+def test_coverage_stops_tracing_after_event_budget(monkeypatch):
+    """Long-running programs fall back to untraced execution"""
+    import sandbox
+    monkeypatch.setattr(sandbox, 'COVERAGE_MAX_EVENTS', 100)
+
+    code = 'total = 0\nfor i in range(1000):\n    total += i\nprint(total)'
+    result = CodeExecutor(pool_size=0).execute_code(code, coverage=True)
+    assert result['output'] == '499500\n'
+    assert result['coverage']['truncated'] is True
+    assert result['coverage']['events'] == 101
+
+
+def test_instruction_budget_is_deterministic():
+    """Programs are stopped after a fixed number of executed lines, not a time"""
+    runaway = 'while True:\n    try:\n        pass\n    except Exception:\n        pass\n'
+    finite = 'total = 0\nfor i in range(100):\n    total += i\n'
+    for pool_size in (0, 1):
+        executor = CodeExecutor(pool_size=pool_size, max_instructions=1000)
+        try:
+            # The budget cannot be caught by student code
+            result = executor.execute_code(runaway)
+            assert result['limit_exceeded'] == 'instructions'
+            assert result['usage']['instructions'] == 1000
+
+            # Nor by a bare except: the overrun is reported, and workers stop the program
+            result = executor.execute_code(
+                'for i in range(100000):\n    try:\n        pass\n    except:\n        pass\nprint("done")'
+            )
+            assert result['limit_exceeded'] == 'instructions'
+            if pool_size:
+                assert 'done' not in result['output']
+
+            # The same program always uses the same budget
+            counts = {executor.execute_code(finite)['usage']['instructions'] for _ in range(3)}
+            assert counts == {202}
+        finally:
+            if executor.pool:
+                executor.pool.shutdown()
+
+
+def test_kernels_keep_globals_between_cells():
+    """Cells in one session see earlier definitions; other sessions do not"""
+    from kernels import KernelManager
+
+    kernels = KernelManager(CodeExecutor(pool_size=0), max_kernels=1, memory_bytes=64 * 1024 * 1024)
+    try:
+        result = kernels.execute('alice', 'data = list(range(10))\ndef total():\n    return sum(data)\n')
+        assert result['success'] is True
+        assert result['kernel']['new'] is True
+        assert result['kernel']['variables'] == ['data', 'total']
+
+        result = kernels.execute('alice', 'print(total())')
+        assert result['output'] == '45\n'
+        assert result['kernel']['new'] is False
+
+        # Only one slot: bob's kernel evicts alice's idle one
+        assert kernels.execute('bob', 'print(total())')['success'] is False
+        assert kernels.stats()['kernels_evicted'] == 1
+        result = kernels.execute('alice', 'print(total())')
+        assert result['success'] is False and result['kernel']['new'] is True
+
+        # The memory cap covers the whole kernel, not one cell
+        results = [kernels.execute('alice', f'big_{i} = [0] * (5 * 1024 * 1024)') for i in range(3)]
+        assert results[0]['success'] is True
+        assert any(r['kernel']['restarted'] or r.get('limit_exceeded') == 'memory' for r in results[1:])
+    finally:
+        kernels.shutdown()
+
+
+def test_kernels_start_outside_the_manager_lock(monkeypatch):
+    """Starting a kernel does not block the manager; a kernel that lost the race is discarded"""
+    import kernels as kernels_module
+    from kernels import KernelManager
+
+    manager = KernelManager(CodeExecutor(pool_size=0), max_kernels=2, memory_bytes=64 * 1024 * 1024)
+    started = []
+
+    class RacingKernel(kernels_module.Kernel):
+        def __init__(self, owner, *args):
+            super().__init__(owner, *args)
+            started.append(self)
+            if len(started) == 1:
+                # Another request from the session arrives while this one starts
+                manager._kernel_for(owner)
+
+    monkeypatch.setattr(kernels_module, 'Kernel', RacingKernel)
+    try:
+        kernel, created = manager._kernel_for('alice')
+        assert created is False and kernel is started[1]
+        assert started[0].closed and not kernel.closed
+        assert manager.stats()['kernels_started'] == 1
+    finally:
+        manager.shutdown()
+
+
+def test_analysis_shares_one_walk_with_flowchart():
+    """The flowchart builder on the analysis walk matches a standalone flowchart"""
+    import ast
+    from flowchart_generator import FlowchartGenerator
+
+    code = (
+        'def f(n):\n'
+        '    while True:\n'
+        '        if n > 1:\n'
+        '            return n / 0\n'
+        'for i in range(3):\n'
+        '    f(i)\n'
+    )
+    executor = CodeExecutor(pool_size=0)
+    generator = FlowchartGenerator()
+
+    builder = generator.code_flowchart_builder()
+    errors = executor.analyze_code(code, tree=ast.parse(code), visitors=[builder])
+    assert builder.flowchart() == generator.generate_from_code(code)
+    assert errors == executor.analyze_code(code)
+    assert [e['type'] for e in errors] == ['potential_infinite_loop', 'division_by_zero']
+
+    assert executor.compile_code('from os import path') is None
+    assert executor.compile_code('import math\nprint(math.pi)').deterministic is False
+    assert executor.compile_code('print(abs(-1))').deterministic is True
+
+
+def test_rule_engine_dispatches_by_node_type_and_times_rules():
+    """Rules only see their node types and report per-rule timings"""
+    import ast
+    from rules import Rule, RuleEngine
+
+    class CountCalls(Rule):
+        name = 'count_calls'
+        node_types = (ast.Call,)
+        seen = []
+
+        def check(self, node):
+            self.seen.append(type(node).__name__)
+            return [{'type': 'call', 'line': node.lineno, 'message': 'call', 'severity': 'style'}]
+
+    code = 'print(len([1, 2]))  \nx = 1 / 0\n'
+    engine = RuleEngine(rules=[CountCalls(), *RuleEngine().rules])
+    issues = engine.run(code, ast.parse(code))
+    assert CountCalls.seen == ['Call', 'Call']
+    # Walk order (breadth-first), then line rules
+    assert [i['type'] for i in issues] == ['call', 'division_by_zero', 'call', 'trailing_whitespace']
+
+    stats = {rule['name']: rule for rule in engine.stats()['rules']}
+    assert stats['count_calls']['calls'] == 2 and stats['count_calls']['issues'] == 2
+    assert stats['division_by_zero']['calls'] == 1 and stats['division_by_zero']['node_types'] == ['BinOp']
+    assert stats['potential_infinite_loop']['calls'] == 0
+    assert stats['trailing_whitespace']['calls'] == 3
+
+
+def test_incremental_analysis_only_rechecks_changed_statements():
+    """Edits re-analyze the touched statement; the rest just move"""
+    from incremental import IncrementalAnalyzer, VersionMismatch
+
+    executor = CodeExecutor(pool_size=0)
+    analyzer = IncrementalAnalyzer(executor)
+    code = 'x = 1\n\nwhile True:\n    break\n\ndef f():\n    return x / 0\n'
+
+    delta = analyzer.analyze('alice', 1, code=code)
+    assert delta['order'] == ['s1', 's2', 's3']
+    issues = [issue for segment in delta['added'] for issue in segment['issues']]
+    assert issues == executor.analyze_code(code)
+
+    # Insert a line at the top: only the first statement is re-parsed
+    edit = {'from': {'line': 0, 'ch': 0}, 'to': {'line': 0, 'ch': 0}, 'text': ['import math', '']}
+    delta = analyzer.analyze('alice', 2, edits=[edit], base_version=1)
+    assert delta['removed'] == ['s1'] and delta['reparsed_lines'] == 2
+    assert [segment['start_line'] for segment in delta['added']] == [1, 2]
+    assert delta['moved'] == [{'id': 's2', 'start_line': 3, 'end_line': 5},
+                              {'id': 's3', 'start_line': 6, 'end_line': 9}]
+
+    # An edit that only parses together with the statement before it
+    edit = {'from': {'line': 5, 'ch': 0}, 'to': {'line': 5, 'ch': 0}, 'text': ['else:', '    pass', '']}
+    delta = analyzer.analyze('alice', 3, edits=[edit], base_version=2)
+    assert delta['syntax_error'] is None and delta['removed'] == ['s2', 's3']
+    assert [node['label'] for segment in delta['added'] for node in segment['nodes']] == ['While True', 'Define f']
+
+    edit = {'from': {'line': 0, 'ch': 0}, 'to': {'line': 0, 'ch': 0}, 'text': ['(']}
+    delta = analyzer.analyze('alice', 4, edits=[edit], base_version=3)
+    assert delta['syntax_error']['type'] == 'syntax_error'
+    # The statements that still parse keep their nodes and checks; the broken one becomes an error node
+    nodes = [(node['type'], node['line']) for segment in delta['added'] for node in segment['nodes']]
+    assert nodes == [('error', 1), ('loop', 4), ('process', 9)]
+    issues = [(issue['type'], issue['line']) for segment in delta['added'] for issue in segment['issues']]
+    assert issues == [('syntax_error', 1), ('potential_infinite_loop', 4), ('division_by_zero', 10)]
+
+    try:
+        analyzer.analyze('alice', 5, edits=[], base_version=3)
+        assert False, 'stale base version accepted'
+    except VersionMismatch:
+        pass
+
+
+def test_undefined_names_follow_python_scoping():
+    """Names are resolved per scope; only real NameErrors are reported"""
+    executor = CodeExecutor(pool_size=0)
+    code = (
+        'print(total)\n'
+        'total = 0\n'
+        'def add(n):\n'
+        '    count += n\n'
+        '    return [total + i for i in range(n)] + [lenght]\n'
+        'class Box:\n'
+        '    size = 3\n'
+        '    def area(self):\n'
+        '        return size * size\n'
+        'for i in range(3):\n'
+        '    if i:\n'
+        '        print(previous)\n'
+        '    previous = i\n'
+    )
+    issues = [(e['type'], e['line'], e['message']) for e in executor.analyze_code(code)
+              if e['type'] in ('undefined_name', 'used_before_assignment')]
+    assert issues == [
+        ('used_before_assignment', 1, "Variable 'total' is used before it is assigned"),
+        ('used_before_assignment', 4, "Variable 'count' is used before it is assigned"),
+        ('undefined_name', 5, "Name 'lenght' is not defined"),
+        ('undefined_name', 9, "Name 'size' is not defined"),
+    ]
+
+    # Incremental analysis resolves names across segments without re-reading them
+    from incremental import IncrementalAnalyzer
+
+    analyzer = IncrementalAnalyzer(executor)
+    delta = analyzer.analyze('bob', 1, code='def f():\n    return limit\n\nprint(f())\n')
+    assert [issue['message'] for issue in delta['program_issues']] == ["Name 'limit' is not defined"]
+    edit = {'from': {'line': 2, 'ch': 0}, 'to': {'line': 2, 'ch': 0}, 'text': ['limit = 3']}
+    delta = analyzer.analyze('bob', 2, edits=[edit], base_version=1)
+    assert delta['program_issues'] == [] and delta['removed'] == ['s2']
+
+
+def test_performance_antipatterns_come_with_suggestions():
+    """Slow-but-correct loop patterns are flagged with a faster alternative"""
+    executor = CodeExecutor(pool_size=0)
+    code = (
+        'seen = []\n'
+        'report = ""\n'
+        'for n in range(100):\n'
+        '    if n not in seen:\n'
+        '        seen.insert(0, n)\n'
+        '    report += str(n)\n'
+        'i = 0\n'
+        'while i < len(report):\n'
+        '    i += 1\n'
+        'for a in seen:\n'
+        '    for b in seen:\n'
+        '        pass\n'
+        'fast = set(seen)\n'
+        'for n in range(100):\n'
+        '    if n in fast:\n'
+        '        seen.append(n)\n'
+    )
+    findings = [e for e in executor.analyze_code(code) if 'suggestion' in e]
+    assert [(e['type'], e['line'], e['severity']) for e in findings] == [
+        ('membership_test_in_loop', 4, 'warning'),
+        ('list_insert_front', 5, 'warning'),
+        ('string_concat_in_loop', 6, 'warning'),
+        ('repeated_len_in_loop', 8, 'info'),
+        ('nested_loop_same_sequence', 11, 'warning'),
+    ]
+    assert 'set(seen)' in findings[0]['suggestion']
+
+    # Only lists are flagged for pop(0), and item assignment keeps a list a list
+    code = (
+        'counts = {}\n'
+        'queue = [1, 2]\n'
+        'queue[0] = 3\n'
+        'while counts:\n'
+        '    counts.pop(0)\n'
+        '    queue.pop(0)\n'
+    )
+    findings = [e for e in executor.analyze_code(code) if 'suggestion' in e]
+    assert [(e['type'], e['line']) for e in findings] == [('list_pop_front', 6)]
+
+    # Lookups are flagged on imported modules, not on methods of objects
+    code = (
+        'import math, os\n'
+        'class Bag:\n'
+        '    def fill(self, obj, paths):\n'
+        '        for p in paths:\n'
+        '            self.items.append(p)\n'
+        '            obj.method()\n'
+        '            os.path.join(p, "x")\n'
+        'for n in range(10):\n'
+        '    math.sqrt(n)\n'
+    )
+    findings = [e for e in executor.analyze_code(code) if 'suggestion' in e]
+    assert [(e['type'], e['line']) for e in findings] == [
+        ('repeated_attribute_lookup', 7), ('repeated_attribute_lookup', 9)
+    ]
+
+    # Incremental analysis finds the same issues when the type is set in an earlier statement
+    from incremental import IncrementalAnalyzer
+
+    code = 'words = ["a", "b"]\nseen = []\ntext = ""\nfor w in words:\n    if w in seen:\n        text += w\n'
+    delta = IncrementalAnalyzer(executor).analyze('bob', 1, code=code)
+    found = [(e['type'], e['line']) for e in delta['program_issues']]
+    assert found == [('membership_test_in_loop', 5), ('string_concat_in_loop', 6)]
+    assert found == [(e['type'], e['line']) for e in executor.analyze_code(code) if 'suggestion' in e]
+
+
+def test_complexity_estimator_fits_growth_class():
+    """Timings at growing sizes are fitted to the right complexity class"""
+    from complexity import ComplexityEstimator, fit_complexity
+
+    estimator = ComplexityEstimator(CodeExecutor(pool_size=0))
+    linear = 'def solve(xs):\n    total = 0\n    for x in xs:\n        total += x\n    return total\n'
+    quadratic = ('def solve(xs):\n    count = 0\n    for a in xs:\n        for b in xs:\n'
+                 '            if a < b:\n                count += 1\n    return count\n')
+    spec = {'function': 'solve', 'inputs': [{'type': 'list'}], 'sizes': [25, 50, 100, 200, 400]}
+    assert estimator.validate(spec) is None
+    assert estimator.validate(dict(spec, inputs=[{'type': 'value', 'value': 3}])) == 'At least one input must grow with n'
+
+    result = estimator.estimate(quadratic, spec)
+    assert result['success'] and result['best_fit'] == 'O(n^2)'
+    assert [point['n'] for point in result['curve']] == spec['sizes']
+    spec['sizes'] = [100, 200, 400, 800, 1600, 3200, 6400]
+    assert estimator.estimate(linear, spec)['best_fit'] in ('O(n)', 'O(n log n)')
+    assert fit_complexity([[n, 1e-6 * n * n] for n in (10, 20, 40, 80)])['best_fit'] == 'O(n^2)'
+    assert fit_complexity([[n, 2e-7] for n in (10, 20, 40, 80)])['best_fit'] == 'O(1)'
+
+
+def test_response_cache_tags_by_content_and_version():
+    """Equal requests share an ETag; a different payload or rule set does not"""
+    from response_cache import ResponseCache
+
+    cache = ResponseCache(rules=['a', 'b'])
+    tag = cache.etag('analyze_code', {'code': 'print(1)'})
+    assert tag == cache.etag('analyze_code', {'code': 'print(1)'})
+    assert tag != cache.etag('analyze_code', {'code': 'print(2)'})
+    assert tag != cache.etag('generate_flowchart', {'code': 'print(1)'})
+    assert tag != ResponseCache(rules=['a']).etag('analyze_code', {'code': 'print(1)'})
+
+    assert cache.get(tag) is None
+    cache.put(tag, '{"success": true}')
+    assert cache.get(tag) == '{"success": true}'
+    assert cache.stats()['hits'] == 1
+
+
+def test_cosmetic_edits_reuse_structural_analysis():
+    """Reformatted code hits the fingerprint cache and gets the fresh line numbers"""
+    import ast
+
+    original = (
+        'def mean(values):\n'
+        '    return sum(values) / len(values)\n'
+        'while True:\n'
+        '    print(total / 0)\n'
+    )
+    reformatted = (
+        '# Average of a list\n'
+        'def mean(values):   \n'
+        '\n'
+        '    return sum(values)/len(values)  # no empty lists\n'
+        '\n'
+        'while True :\n'
+        '    print(total/0)\n'
+    )
+    executor = CodeExecutor(pool_size=0)
+    executor.analyze_with_flowchart(original, ast.parse(original))
+    flowchart, issues = executor.analyze_with_flowchart(reformatted, ast.parse(reformatted))
+    assert executor.analysis_cache.stats()['hits'] == 1
+
+    expected = CodeExecutor(pool_size=0).analyze_with_flowchart(reformatted, ast.parse(reformatted))
+    assert (flowchart, issues) == expected
+    assert ('trailing_whitespace', 2) in [(issue['type'], issue['line']) for issue in issues]
+    assert [node.get('line') for node in flowchart['nodes']] == [None, 2, 6, None]
+
+    # Issues follow the node they are about, not the first node on their old line
+    executor.analyze_with_flowchart('x = 1\nprint(x, y)\n', ast.parse('x = 1\nprint(x, y)\n'))
+    rewrapped = 'x = 1\nprint(x,\n      y)\n'
+    _, issues = executor.analyze_with_flowchart(rewrapped, ast.parse(rewrapped))
+    assert executor.analysis_cache.stats()['hits'] == 2
+    assert [(issue['type'], issue['line'], issue['column']) for issue in issues] == [('undefined_name', 3, 6)]
+
+
+def test_syntax_recovery_reports_every_error_and_a_partial_flowchart():
+    """Each syntax error is reported in one pass; the clean statements still get a flowchart"""
+    from flowchart_generator import FlowchartGenerator
+
+    code = (
+        'def area(w, h):\n'
+        '    return w * h\n'
+        'total = = 0\n'
+        'for size in [1, 2]\n'
+        '    total += area(size, size)\n'
+        'print(total\n'
+        'while total > 10:\n'
+        '        total -= 1\n'
+        '    print(total)\n'
+    )
+    errors = CodeExecutor(pool_size=0).analyze_code(code)
+    assert [(e['type'], e['line']) for e in errors] == [
+        ('syntax_error', 3), ('syntax_error', 4), ('syntax_error', 6), ('syntax_error', 9)
+    ]
+    assert "'(' was never closed" in errors[2]['message']
+
+    flowchart = FlowchartGenerator().generate_from_code(code)
+    labels = [node['label'] for node in flowchart['nodes']]
+    assert flowchart['title'] == 'Code Flow Diagram (partial)'
+    assert 'Define area' in labels and 'While total > 10' in labels
+    assert not any(label.startswith('For') for label in labels)  # its header is broken
+    assert sum(node['type'] == 'error' for node in flowchart['nodes']) == 4
+
+
+def test_deeply_nested_code_gets_a_partial_analysis():
+    """Code too deep to parse or walk whole is reported, not a crash, and the rest is still analyzed"""
+    import ast
+    from flowchart_generator import FlowchartGenerator
+
+    executor = CodeExecutor(pool_size=0)
+    too_deep_to_parse = 'x = 1\ny = ' + '-' * 5000 + 'x\nif x:\n    print(y)\n'
+    errors = executor.analyze_code(too_deep_to_parse)
+    assert [(e['type'], e['line']) for e in errors] == [('syntax_error', 2)]
+    assert 'nested too deeply' in errors[0]['message']
+    flowchart = FlowchartGenerator().generate_from_code(too_deep_to_parse)
+    assert 'If x' in [node['label'] for node in flowchart['nodes']]
+    assert not executor.execute_code(too_deep_to_parse)['success']
+
+    too_deep_to_walk = 'x = ' + ' + '.join(['1'] * 400) + '\nif x > 0:\n    print(x / 0)\n'
+    flowchart, issues = executor.analyze_with_flowchart(too_deep_to_walk, ast.parse(too_deep_to_walk))
+    assert flowchart['title'] == 'Code Flow Diagram (partial)'
+    assert 'analysis_partial' in [issue['type'] for issue in issues]
+    assert 'division_by_zero' in [issue['type'] for issue in issues]
+
+
+def test_admission_rejects_oversized_requests_with_reasons():
+    """Requests over a limit are turned away before parsing, with the limit, value and maximum"""
+    from admission import AdmissionControl
+
+    admission = AdmissionControl(max_body_bytes=1000, max_lines=50, max_nodes=500, max_analysis_seconds=1)
+    assert admission.check_body(1000) == [] and admission.check_body(None) == []
+    assert admission.check_body(1001)[0]['limit'] == 'body_bytes'
+
+    assert admission.check_code('x = 1\n' * 10).admitted
+    too_long = admission.check_code('x = 1\n' * 60)
+    assert [(r['limit'], r['value'], r['max']) for r in too_long.reasons] == [('lines', 61, 50)]
+    too_big = admission.check_code('x = [' + '1, ' * 600 + ']')
+    assert [r['limit'] for r in too_big.reasons] == ['nodes']
+
+    # Code with syntax errors is costed by its lines of recovery, at the rate recorded so far
+    broken = 'x = = 1\n' + 'y = 2\n' * 40
+    assert admission.check_code(broken, analysis=True).admitted
+    admission.record(admission.check_code('x = (\n' + 'y = 2\n' * 40, analysis=True), 10.0)
+    assert admission.check_code(broken, analysis=True).reasons[0]['limit'] == 'analysis_seconds'
+    assert admission.check_code(broken).admitted  # running it is bounded by the sandbox instead
+    assert admission.stats()['rejected'] == {'body_bytes': 1, 'lines': 1, 'nodes': 1, 'analysis_seconds': 1}
+
+
+def test_api_rejects_malformed_bodies_before_admission(monkeypatch):
+    """Bodies that are not JSON objects, and code that is not a string, get a 400"""
+    monkeypatch.setenv('SANDBOX_POOL_SIZE', '0')
+    from app import app
+
+    client = app.test_client()
+    for path in ['/api/analyze_code', '/api/execute_code/stream', '/api/jobs']:
+        response = client.post(path, json={'code': 5})
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'code must be a string'
+    response = client.post('/api/analyze_code/incremental', json=['x = 1'])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Request body must be a JSON object'
+
+
+def test_incremental_edits_are_admitted_like_full_code(monkeypatch):
+    """A document grown by edits is held to the same limits as one sent whole, and left as it was"""
+    monkeypatch.setenv('SANDBOX_POOL_SIZE', '0')
+    import app as app_module
+
+    monkeypatch.setattr(app_module.admission, 'max_lines', 3)
+    client = app_module.app.test_client()
+    response = client.post('/api/analyze_code/incremental', json={'version': 1, 'code': 'x = 1\ny = 2'})
+    assert response.status_code == 200
+
+    grow = {'from': {'line': 1, 'ch': 5}, 'to': {'line': 1, 'ch': 5}, 'text': ['', 'z = 3', 'w = 4']}
+    response = client.post('/api/analyze_code/incremental',
+                           json={'version': 2, 'base_version': 1, 'edits': [grow]})
+    assert response.status_code == 413
+    assert response.get_json()['reasons'][0]['limit'] == 'lines'
+
+    # The server's copy is still version 1
+    fix = {'from': {'line': 0, 'ch': 4}, 'to': {'line': 0, 'ch': 5}, 'text': ['2']}
+    response = client.post('/api/analyze_code/incremental',
+                           json={'version': 2, 'base_version': 1, 'edits': [fix]})
+    assert response.status_code == 200 and response.get_json()['version'] == 2